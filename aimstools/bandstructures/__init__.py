@@ -5,9 +5,11 @@ from aimstools.bandstructures.bandstructure import BandStructure
 from aimstools.bandstructures.regular_bandstructure import RegularBandStructure
 from aimstools.bandstructures.brillouinezone import BrillouineZone
 from aimstools.bandstructures.mulliken_bandstructure import MullikenBandStructure
+from aimstools.bandstructures.series import BandStructureSeries
 
 __all__ = [
     "BandStructure",
+    "BandStructureSeries",
     "BrillouineZone",
     "MullikenBandStructure",
     "RegularBandStructure",
@@ -0,0 +1,152 @@
+from aimstools.misc import *
+
+import numpy as np
+
+
+def get_nearest_band_distances(eigenvalues, degeneracy=1e-3):
+    """Returns the energy difference of every state to the nearest non-degenerate state at the same k-point.
+
+    The states of all k-points are placed on one sorted axis with offsets between the k-points, so that the neighbours
+    of all states are found with a single binary search.
+
+    Args:
+        eigenvalues (array): Eigenvalues of shape (..., nstates).
+        degeneracy (float): Energy differences below this value are considered degenerate.
+
+    Returns:
+        array: Distances of the same shape, inf if there is no other non-degenerate state.
+    """
+    shape = eigenvalues.shape
+    rows = eigenvalues.reshape(-1, shape[-1])
+    order = np.argsort(rows, axis=1)
+    rows = np.take_along_axis(rows, order, axis=1)
+    nrows, nstates = rows.shape
+    span = rows.max() - rows.min() + 4 * degeneracy + 1.0
+    shifted = rows + (np.arange(nrows) * span)[:, None]
+    flat = shifted.ravel()
+    first = (np.arange(nrows) * nstates)[:, None]
+    upper = np.searchsorted(flat, shifted + degeneracy, side="right")
+    lower = np.searchsorted(flat, shifted - degeneracy, side="left") - 1
+    valid_upper = upper < first + nstates
+    valid_lower = lower >= first
+    upper = np.where(
+        valid_upper, flat[np.minimum(upper, flat.size - 1)] - shifted, np.inf
+    )
+    lower = np.where(valid_lower, shifted - flat[np.maximum(lower, 0)], np.inf)
+    nearest = np.empty_like(rows)
+    np.put_along_axis(nearest, order, np.minimum(upper, lower), axis=1)
+    return nearest.reshape(shape)
+
+
+def get_band_statistics(
+    kpoint_axis,
+    eigenvalues,
+    window=None,
+    flat_threshold=0.1,
+    degeneracy=1e-3,
+    fermi_level=0.0,
+    label_coords=None,
+    kpoint_labels=None,
+):
+    """Computes dispersion statistics of all bands and spin channels at once.
+
+    Velocities are finite differences along the k-point axis, where the boundaries of path segments and jumps are excluded.
+    The separation of a band is the median of the energy difference to the nearest non-degenerate band along the path, so that
+    crossings at single k-points and degenerate partners, e.g., Kramers pairs, do not dominate. The flatness is the ratio of bandwidth and separation. Bands with a bandwidth below flat_threshold are marked as flat.
+    Requires pandas, which is listed in requirements.txt, but not in install_requires, so it is only imported when a table is built.
+
+    Args:
+        kpoint_axis (array): K-point axis in 1/Angstrom of shape (nkpoints,).
+        eigenvalues (array): Eigenvalues of shape (nkpoints, nspins, nstates).
+        window (tuple): Energy window (lower, upper) in eV. Only bands that enter the window at some k-point are kept.
+            A single value w corresponds to (-w, w). None keeps all bands.
+        flat_threshold (float): Bandwidth in eV below which a band is considered flat.
+        degeneracy (float): Energy differences in eV below which bands are considered degenerate.
+        fermi_level (float): Fermi level on the energy scale of the eigenvalues, the energy window is relative to it.
+        label_coords (list): Coordinates of the high-symmetry points on the k-point axis.
+        kpoint_labels (list): Labels of the high-symmetry points.
+
+    Returns:
+        DataFrame: One row per band and spin channel with the columns spin, band, min_energy, min_index, min_label,
+        max_energy, max_index, max_label, bandwidth, mean_energy, mean_velocity, max_velocity, separation, flatness and flat.
+        Velocities are in eV Angstrom, energies in eV.
+    """
+    import pandas as pd
+
+    x = np.asarray(kpoint_axis, dtype=float)
+    evs = np.asarray(eigenvalues, dtype=float)
+    nkpoints, nspins, nstates = evs.shape
+    # (nspins, nstates, nkpoints)
+    evs = evs.transpose(1, 2, 0)
+    imin, imax = np.argmin(evs, axis=2), np.argmax(evs, axis=2)
+    emin = np.take_along_axis(evs, imin[..., None], axis=2)[..., 0]
+    emax = np.take_along_axis(evs, imax[..., None], axis=2)[..., 0]
+    dx = np.diff(x)
+    steps = dx > 0
+    if np.any(steps):
+        velocities = np.abs(np.diff(evs, axis=2)[..., steps] / dx[steps])
+        mean_velocity = velocities.mean(axis=2)
+        max_velocity = velocities.max(axis=2)
+    else:
+        mean_velocity = max_velocity = np.full((nspins, nstates), np.nan)
+    nearest = get_nearest_band_distances(evs.transpose(0, 2, 1), degeneracy)
+    separation = np.median(nearest, axis=1)
+    bandwidth = emax - emin
+    with np.errstate(divide="ignore", invalid="ignore"):
+        flatness = bandwidth / separation
+
+    labels = np.full(nkpoints, "", dtype=object)
+    if label_coords is not None and kpoint_labels is not None:
+        for coord, label in zip(label_coords, kpoint_labels):
+            labels[np.isclose(x, coord, atol=1e-6)] = label
+
+    spin, band = np.indices((nspins, nstates))
+    table = pd.DataFrame(
+        {
+            "spin": spin.ravel(),
+            "band": band.ravel(),
+            "min_energy": emin.ravel(),
+            "min_index": imin.ravel(),
+            "min_label": labels[imin.ravel()],
+            "max_energy": emax.ravel(),
+            "max_index": imax.ravel(),
+            "max_label": labels[imax.ravel()],
+            "bandwidth": bandwidth.ravel(),
+            "mean_energy": evs.mean(axis=2).ravel(),
+            "mean_velocity": mean_velocity.ravel(),
+            "max_velocity": max_velocity.ravel(),
+            "separation": separation.ravel(),
+            "flatness": flatness.ravel(),
+            "flat": (bandwidth < flat_threshold).ravel(),
+        }
+    )
+    if window is not None:
+        if not hasattr(window, "__len__"):
+            window = (-abs(window), abs(window))
+        lower, upper = min(window) + fermi_level, max(window) + fermi_level
+        table = table[(table["max_energy"] >= lower) & (table["min_energy"] <= upper)]
+    return table.reset_index(drop=True)
+
+
+def get_band_statistics_table(bandstructures, bandpath=None, **kwargs):
+    """Collects the band statistics of many calculations in one table.
+
+    Args:
+        bandstructures (dict or list): Band structure objects, either as dictionary of names and objects or as list,
+            in which case the output files are used as names.
+        bandpath (str): Band path string, defaults to the calculated band path of every calculation.
+        **kwargs: Passed to :func:`get_band_statistics`.
+
+    Returns:
+        DataFrame: Table with an additional column calculation.
+    """
+    import pandas as pd
+
+    if not isinstance(bandstructures, dict):
+        bandstructures = {str(bs.outputfile): bs for bs in bandstructures}
+    tables = [
+        bs.get_band_statistics(bandpath=bandpath, **kwargs).assign(calculation=name)
+        for name, bs in bandstructures.items()
+    ]
+    table = pd.concat(tables, ignore_index=True)
+    return table[["calculation"] + [c for c in table.columns if c != "calculation"]]
@@ -4,6 +4,7 @@ from aimstools.bandstructures.base import BandStructureBaseClass
 from aimstools.bandstructures.regular_bandstructure import RegularBandStructure
 from aimstools.bandstructures.brillouinezone import BrillouineZone
 from aimstools.bandstructures.mulliken_bandstructure import MullikenBandStructure
+from aimstools.bandstructures.soc_comparison import compare_spectra
 
 from matplotlib.lines import Line2D
 
@@ -30,6 +31,9 @@ class BandStructure:
 
     >>> bs.get_properties()
 
+    The band structures are only read in when they are accessed for the first time, so that, e.g., :func:`get_properties` does not parse the
+    mulliken band files.
+
     Args:
         outputfile (str): Path to output file or output directory.
         mulliken_outputfile (str, optional): Path to output file or output directory for mulliken band structure, if different from band structure.
@@ -39,23 +43,29 @@ class BandStructure:
     def __init__(self, outputfile, mulliken_outputfile=None) -> None:
         self.outputfile = outputfile
         self.mulliken_outputfile = mulliken_outputfile or outputfile
-        self._bs = None
-        self._bs_soc = None
-        self._bs_mlk = None
         self._set_classes()
 
     def _set_classes(self):
+        # The band structures are only read in on first access, since parsing mulliken band files can be expensive.
         self.base = BandStructureBaseClass(outputfile=self.outputfile)
         self.soc = self.base.control["include_spin_orbit"]
+        self._classes = LazyObjects()
         if "band structure" in self.base.tasks:
-            self._bs = RegularBandStructure(outputfile=self.outputfile, soc=False)
+            self._classes.register(
+                "zora",
+                lambda: RegularBandStructure(outputfile=self.outputfile, soc=False),
+            )
             if self.soc:
-                self._bs_soc = RegularBandStructure(
-                    outputfile=self.outputfile, soc=True
+                self._classes.register(
+                    "soc",
+                    lambda: RegularBandStructure(outputfile=self.outputfile, soc=True),
                 )
         if "mulliken-projected band structure" in self.base.tasks:
-            self._bs_mlk = MullikenBandStructure(
-                outputfile=self.mulliken_outputfile, soc=self.soc
+            self._classes.register(
+                "mulliken",
+                lambda: MullikenBandStructure(
+                    outputfile=self.mulliken_outputfile, soc=self.soc
+                ),
             )
 
     def __repr__(self):
@@ -66,17 +76,17 @@ class BandStructure:
     @property
     def bandstructure_zora(self):
         """ Returns :class:`~aimstools.bandstructures.regular_bandstructure` without spin-orbit coupling."""
-        return self._bs
+        return self._classes.get("zora")
 
     @property
     def bandstructure_soc(self):
         """ Returns :class:`~aimstools.bandstructures.regular_bandstructure` with spin-orbit coupling."""
-        return self._bs_soc
+        return self._classes.get("soc")
 
     @property
     def bandstructure_mulliken(self):
         """ Returns :class:`~aimstools.bandstructures.mulliken_bandstructure`."""
-        return self._bs_mlk
+        return self._classes.get("mulliken")
 
     def plot(
         self,
@@ -107,11 +117,11 @@ class BandStructure:
             i += 1
             ax_bs = fig.add_subplot(1, ncols, i)
             if self.soc == False:
-                bs = self._bs
+                bs = self.bandstructure_zora
                 ax_bs = bs.plot(axes=ax_bs, color=scalar_bands_color, **kwargs)
             if self.soc:
-                bs = self._bs
-                bs_soc = self._bs_soc
+                bs = self.bandstructure_zora
+                bs_soc = self.bandstructure_soc
                 ax_bs = bs.plot(
                     axes=ax_bs, color=scalar_bands_color, main=False, **kwargs
                 )
@@ -136,7 +146,7 @@ class BandStructure:
         if "mulliken-projected band structure" in base.tasks:
             i += 1
             ax_mlk = fig.add_subplot(1, ncols, i)
-            bs = self._bs_mlk
+            bs = self.bandstructure_mulliken
             bs.plot_majority_contributions(axes=ax_mlk, **kwargs)
             ax_mlk.set_title("Majority contribution")
             if i == 2:
@@ -158,6 +168,36 @@ class BandStructure:
 
         plt.show()
 
+    def get_soc_comparison(self, bandpath=None, pairing="order", energy_penalty=1.0):
+        """Compares the band structures with and without spin-orbit coupling, see :func:`~aimstools.bandstructures.soc_comparison.compare_spectra`.
+
+        The eigenvalues with spin-orbit coupling are shifted by the difference of the Fermi levels, so that both spectra share the same energy scale.
+
+        Args:
+            bandpath (str): Band path string, defaults to the calculated band path.
+            pairing (str): "order" or "energy". Pairing by character requires Mulliken spectra with and without spin-orbit coupling,
+                which are not written out by the same calculation, see :func:`~aimstools.bandstructures.soc_comparison.compare_spectra`.
+            energy_penalty (float): Penalty of the energy difference in 1/eV for pairing="energy".
+
+        Returns:
+            namedtuple: soc_comparison with splittings, shifts, Rashba coefficients and band gap changes.
+        """
+        assert (
+            self.bandstructure_zora != None and self.bandstructure_soc != None
+        ), "Band structures with and without spin-orbit coupling are required."
+        bs, bs_soc = self.bandstructure_zora, self.bandstructure_soc
+        zora, _ = bs.get_memoized_spectrum(bs.get_spectrum, bandpath=bandpath)
+        soc, _ = bs_soc.get_memoized_spectrum(bs_soc.get_spectrum, bandpath=bandpath)
+        offset = self.base.fermi_level.soc - self.base.fermi_level.scalar
+        return compare_spectra(
+            zora,
+            soc,
+            pairing=pairing,
+            offset=offset,
+            cell=self.base.structure.cell,
+            energy_penalty=energy_penalty,
+        )
+
     def get_properties(self, bandstructureclass=None, spin="none"):
         bs = bandstructureclass or (
             (self.bandstructure_soc or self.bandstructure_zora)
@@ -174,6 +214,22 @@ class BandStructure:
                 "with" if soc else "without"
             )
         )
+        if dgap == None:
+            fs = bs.get_fermi_surface()
+            logger.info(
+                "The band structure is {}. {} bands cross the Fermi level at {} points along the band path.".format(
+                    "a " + fs.kind if fs.kind != "insulator" else "an insulator",
+                    len(fs.crossing_bands),
+                    len(fs.crossings.state),
+                )
+            )
+            if len(fs.crossings.state) > 0:
+                logger.info(
+                    "The mean Fermi velocity along the band path is {:.3e} m/s.".format(
+                        np.mean(fs.crossings.velocity)
+                    )
+                )
+            return
         logger.info("The fundamental band gap is {}.".format(i))
         if i == "indirect":
             logger.info(
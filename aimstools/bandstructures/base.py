@@ -1,9 +1,13 @@
 from aimstools.misc import *
 from aimstools.postprocessing import FHIAimsOutputReader
+from aimstools.bandstructures import effective_masses
+from aimstools.bandstructures import band_statistics
+from aimstools.bandstructures import fermi_surface
 
 from ase.dft.kpoints import parse_path_string, BandPath
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+import copy
 import re
 
 import numpy as np
@@ -23,6 +27,9 @@ class BandStructureBaseClass(FHIAimsOutputReader):
         self._energy_reference = "not specified"
         self.band_sections = self.__set_sections()
         self._bandpath = None
+        self._spectrum_cache = OrderedDict()
+        self.spectrum_cache_size = 8
+        self._spectrum = None
 
     @property
     def energy_reference(self):
@@ -124,6 +131,32 @@ class BandStructureBaseClass(FHIAimsOutputReader):
     def bandpath(self):
         return self._bandpath
 
+    @property
+    def spectrum(self):
+        """Spectrum of the calculated band path, which is only assembled when it is accessed for the first time."""
+        if self._spectrum is None:
+            self._spectrum = self._read_spectrum()
+        return self._spectrum
+
+    def _read_spectrum(self, bandpath=None):
+        """Assembles the spectrum of a band path. Subclasses with another type of spectrum override this method."""
+        return self.get_spectrum(bandpath)
+
+    def get_bandpath_segments(self, bandpath=None):
+        """Resolves a band path string into the pairs of high-symmetry points of its segments.
+
+        Args:
+            bandpath (str): Band path string, defaults to the calculated band path.
+
+        Returns:
+            list: List of pairs (symbol1, symbol2) in the order of the band path.
+        """
+        if bandpath != None:
+            bp = parse_path_string(self.get_bandpath(bandpath).path)
+        else:
+            bp = parse_path_string(self.bandpath.path)
+        return [(s1, s2) for segment in bp for s1, s2 in zip(segment[:-1], segment[1:])]
+
     def set_bandpath(self):
         sections = self.band_sections
         special_points = {k.symbol1: k.k1 for k in sections}
@@ -252,7 +285,8 @@ class BandStructureBaseClass(FHIAimsOutputReader):
     def __get_mlk_bandfiles_scalar(self, spin="none"):
         n = len(self.band_sections)
         files = list(self.outputdir.glob("*.out*"))
-        spin = "1" if spin in ["none", "up"] else "2"
+        # collinear scalar files contain both spin channels, there are no bandmlk2 files
+        spin = "1"
         bandfiles = []
         for i in range(1, n + 1):
             # mulliken soc files overwrite scalar files
@@ -281,65 +315,234 @@ class BandStructureBaseClass(FHIAimsOutputReader):
             bandfiles.append(f[0])
         return bandfiles
 
-    def get_data_from_bandstructure(self, spectrum=None, spin=None):
-        from itertools import combinations_with_replacement
+    def get_memoized_spectrum(self, get_spectrum, bandpath=None, spin=None):
+        """Returns the spectrum of a band path together with its band edges and gaps.
+
+        Both are kept in a least-recently-used cache of size spectrum_cache_size per (bandpath, spin), so that
+        repeated plotting calls reuse the assembled arrays. The energy reference does not enter, because it is only applied when plotting.
+        The arrays of a cached spectrum are read-only views, so that in-place changes can not corrupt the cache.
+
+        Args:
+            get_spectrum (function): Function that assembles the spectrum of a band path string.
+            bandpath (str): Band path string, defaults to the calculated band path.
+            spin (str): Spin channel.
+
+        Returns:
+            tuple: (spectrum, (vbm, cbm, indirect, direct)).
+        """
+        key = (bandpath, self.spin2index(spin))
+        cache = self._spectrum_cache
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        spectrum = self.spectrum if bandpath == None else get_spectrum(bandpath)
+        spectrum = self.get_readonly_spectrum(spectrum)
+        data = (spectrum, self.get_data_from_bandstructure(spectrum, spin=spin))
+        cache[key] = data
+        while len(cache) > self.spectrum_cache_size:
+            cache.popitem(last=False)
+        return data
+
+    def get_readonly_spectrum(self, spectrum):
+        """Returns a shallow copy of a spectrum, whose arrays are read-only views of the arrays of the spectrum.
 
+        Args:
+            spectrum (namedtuple): Spectrum with kpoints, kpoint_axis, eigenvalues and occupations.
+
+        Returns:
+            namedtuple: Spectrum of the same type, the given spectrum stays writeable.
+        """
+        views = {}
+        for name in ["kpoints", "kpoint_axis", "eigenvalues", "occupations"]:
+            value = getattr(spectrum, name, None)
+            if isinstance(value, np.ndarray):
+                views[name] = value.view()
+                views[name].flags.writeable = False
+        if hasattr(spectrum, "_replace"):
+            return spectrum._replace(**views)
+        spectrum = copy.copy(spectrum)
+        for name, value in views.items():
+            setattr(spectrum, name, value)
+        return spectrum
+
+    def get_gap_data(self, spectrum=None, threshold=0.1):
+        """Finds band edges, band gaps and Fermi level crossings of all spin channels at once.
+
+        Occupied and unoccupied states are separated by masked reductions over the states, so that the search is linear
+        in the number of k-points. States are counted as occupied if their occupation is at least 1e-4.
+
+        Args:
+            spectrum (namedtuple): Spectrum with kpoints, kpoint_axis, eigenvalues and occupations. Defaults to self.spectrum.
+            threshold (float): Band gaps smaller than this value in eV are considered metallic.
+
+        Returns:
+            tuple: One gap_data namedtuple (spin, vbm, cbm, indirect, direct, metallic, crossings) per spin channel.
+            The gaps are None for metals and for spin channels without occupied or unoccupied states, whose band edges
+            are infinite. Crossings are the indices of states which are occupied at some k-points and unoccupied at others.
+        """
         dbg = namedtuple("direct", ["value", "k", "axis_coord", "e1", "e2"])
         ibg = namedtuple(
             "indirect", ["value", "k1", "axis_coord1", "e1", "k2", "axis_coord2", "e2"]
         )
+        gd = namedtuple(
+            "gap_data",
+            ["spin", "vbm", "cbm", "indirect", "direct", "metallic", "crossings"],
+        )
+
+        if spectrum is None:
+            spectrum = self.spectrum
+        # (nkpoints, nspins, nstates)
+        evs = np.asarray(spectrum.eigenvalues)
+        occupied = np.asarray(spectrum.occupations) >= 1e-4
+        # highest occupied and lowest unoccupied state per k-point and spin, shape (nkpoints, nspins)
+        vbs = np.where(occupied, evs, -np.inf).max(axis=2)
+        cbs = np.where(occupied, np.inf, evs).min(axis=2)
+        kpts = np.dot(spectrum.kpoints, self.structure.cell.T) / (2 * np.pi)
+        kcoords = np.asarray(spectrum.kpoint_axis)
+        crossings = occupied.any(axis=0) & (~occupied).any(axis=0)
+
+        data = []
+        for spin in range(evs.shape[1]):
+            vb, cb = vbs[:, spin], cbs[:, spin]
+            i, j = np.argmax(vb), np.argmin(cb)
+            vbm, cbm = vb[i], cb[j]
+            cross = np.flatnonzero(crossings[spin])
+            gap = cbm - vbm
+            # without occupied or unoccupied states, the band edges are infinite
+            edges = np.isfinite(vbm) and np.isfinite(cbm)
+            metallic = edges and ((len(cross) > 0) or not (gap > threshold))
+            direct = indirect = None
+            dgaps = cb - vb
+            d = np.argmin(dgaps)
+            if edges and not metallic and np.isfinite(dgaps[d]):
+                direct = dbg(dgaps[d], kpts[d], kcoords[d], vb[d], cb[d])
+                # If a direct gap is as small as the fundamental gap, the gap is direct.
+                if dgaps[d] > gap + 1e-6:
+                    indirect = ibg(
+                        gap, kpts[i], kcoords[i], vbm, kpts[j], kcoords[j], cbm
+                    )
+            data.append(gd(spin, vbm, cbm, indirect, direct, metallic, cross))
+        return tuple(data)
+
+    def get_data_from_bandstructure(self, spectrum=None, spin=None):
+        """Returns band edges and band gaps of one spin channel.
 
+        Args:
+            spectrum (namedtuple): Spectrum with kpoints, kpoint_axis, eigenvalues and occupations. Defaults to self.spectrum.
+            spin (str): Spin channel.
+
+        Returns:
+            tuple: (vbm, cbm, indirect, direct). The gaps are None for metals. The indirect gap is None if the gap is direct.
+        """
         spin = self.spin2index(spin)
+        if spectrum is None:
+            spectrum = self.spectrum
+        data = self.get_gap_data(spectrum)[spin]
+        return (data.vbm, data.cbm, data.indirect, data.direct)
+
+    def get_effective_masses(
+        self, spectrum=None, window=None, npoints=3, model="parabolic"
+    ):
+        """Fits effective masses at the band edges and other band extrema.
+
+        See :func:`~aimstools.bandstructures.effective_masses.get_effective_masses` for details.
 
-        if spectrum == None:
+        Args:
+            spectrum (namedtuple): Spectrum with Cartesian kpoints, kpoint_axis, eigenvalues and occupations. Defaults to self.spectrum.
+            window (tuple): Energy window in eV relative to the Fermi level for additional extrema.
+            npoints (int): Number of k-points on each side of an extremum that enter the fit.
+            model (str): "parabolic" or "hyperbolic".
+
+        Returns:
+            namedtuple: Extrema with effective masses in units of the electron mass along all path directions through them.
+        """
+        if spectrum is None:
             spectrum = self.spectrum
-        else:
-            spectrum = spectrum
-        evs = spectrum.eigenvalues[:, spin, :].copy()
-        occs = spectrum.occupations[:, spin, :].copy()
-        kpts = spectrum.kpoints.copy()
-        kcoords = spectrum.kpoint_axis.copy()
-        l = range(len(spectrum.kpoints))
-        gaps = []
-        for i, j in combinations_with_replacement(l, 2):
-            vbs = evs[i, :][occs[i, :] >= 1e-4]
-            cbs = evs[j, :][occs[j, :] < 1e-4]
-            cb = np.min(cbs)
-            vb = np.max(vbs)
-            gap = cb - vb
-            gaps.append((i, j, gap, vb, cb))
-        gaps = np.array(gaps)
-        index = np.argmin(gaps[:, 2])
-        vbm, cbm = np.max(gaps[:, 3]), np.min(gaps[:, 4])
-        if gaps[index, 2] > 0.1:
-            if gaps[index, 0] != gaps[index, 1]:
-                i, j = map(int, gaps[index, [0, 1]])
-                kp1 = np.dot(kpts[i], self.structure.cell.T) / (2 * np.pi)
-                kp2 = np.dot(kpts[j], self.structure.cell.T) / (2 * np.pi)
-                kc1 = kcoords[i]
-                kc2 = kcoords[j]
-                val = gaps[index, 2]
-                indirect = ibg(val, kp1, kc1, vbm, kp2, kc2, cbm)
-                dgaps = gaps[gaps[:, 0] == gaps[:, 1]]
-                dgaps = dgaps.reshape((-1, 5))
-                index = np.argmin(dgaps[:, 2])
-                val = dgaps[index, 2]
-                i = int(dgaps[index, 0])
-                kp = np.dot(kpts[i], self.structure.cell.T) / (2 * np.pi)
-                kc = kcoords[i]
-                e1, e2 = dgaps[index, 3], dgaps[index, 4]
-                direct = dbg(val, kp, kc, e1, e2)
-            else:
-                i = int(gaps[index, 0])
-                val = gaps[index, 2]
-                kp = np.dot(kpts[i], self.structure.cell.T) / (2 * np.pi)
-                kc = kcoords[i]
-                indirect = None
-                e1, e2 = gaps[index, 3], gaps[index, 4]
-                direct = dbg(val, kp, kc, e1, e2)
-        else:
-            direct = indirect = None
-        return (vbm, cbm, indirect, direct)
+        return effective_masses.get_effective_masses(
+            spectrum.kpoints,
+            spectrum.kpoint_axis,
+            spectrum.eigenvalues,
+            spectrum.occupations,
+            window=window,
+            npoints=npoints,
+            model=model,
+            fermi_level=self.fermi_level_offset,
+        )
+
+    def get_band_statistics(
+        self, spectrum=None, bandpath=None, window=3, flat_threshold=0.1
+    ):
+        """Computes bandwidths, band extrema, velocities and flatness of all bands and spin channels.
+
+        See :func:`~aimstools.bandstructures.band_statistics.get_band_statistics` for details.
+
+        Args:
+            spectrum (namedtuple): Spectrum with kpoint_axis and eigenvalues. Defaults to the spectrum of the band path.
+            bandpath (str): Band path string, defaults to the calculated band path.
+            window (tuple): Energy window in eV relative to the Fermi level. Only bands that enter the window are kept.
+            flat_threshold (float): Bandwidth in eV below which a band is considered flat.
+
+        Returns:
+            DataFrame: One row per band and spin channel.
+        """
+        if spectrum is None:
+            spectrum, _ = self.get_memoized_spectrum(
+                self._read_spectrum, bandpath=bandpath
+            )
+        return band_statistics.get_band_statistics(
+            spectrum.kpoint_axis,
+            spectrum.eigenvalues,
+            window=window,
+            flat_threshold=flat_threshold,
+            fermi_level=self.fermi_level_offset,
+            label_coords=spectrum.label_coords,
+            kpoint_labels=spectrum.kpoint_labels,
+        )
+
+    @property
+    def fermi_level_offset(self):
+        """Position of the Fermi level on the energy scale of the eigenvalues of the spectrum.
+
+        The mulliken bands with spin-orbit coupling are referenced to the scalar Fermi level, so that their Fermi level lies at
+        fermi_level.soc - fermi_level.scalar. All other spectra are referenced to their own Fermi level.
+        """
+        if self.soc and self.task == "mulliken-projected band structure":
+            return self.fermi_level.soc - self.fermi_level.scalar
+        return 0.0
+
+    def get_fermi_surface(
+        self, spectrum=None, bandpath=None, threshold=0.1, pocket_depth=0.3
+    ):
+        """Finds the Fermi level crossings and Fermi velocities along the band path and classifies the band structure.
+
+        See :func:`~aimstools.bandstructures.fermi_surface.get_fermi_surface` for details. With spin-orbit coupling, only the
+        first spin channel is considered, since the second one duplicates its eigenvalues. The Fermi level is taken from
+        :attr:`fermi_level_offset`.
+
+        Args:
+            spectrum (namedtuple): Spectrum with kpoints, kpoint_axis and eigenvalues. Defaults to the spectrum of the band path.
+            bandpath (str): Band path string, defaults to the calculated band path.
+            threshold (float): Band gaps smaller than this value in eV are not considered insulating.
+            pocket_depth (float): Largest depth of electron and hole pockets in eV of a semimetal.
+
+        Returns:
+            namedtuple: fermi_surface with kind ("metal", "semimetal" or "insulator"), gap, crossing bands, pocket depths and crossings.
+        """
+        if spectrum is None:
+            spectrum, _ = self.get_memoized_spectrum(
+                self._read_spectrum, bandpath=bandpath
+            )
+        evs = np.asarray(spectrum.eigenvalues)
+        if self.soc:
+            evs = evs[:, :1]
+        return fermi_surface.get_fermi_surface(
+            spectrum.kpoints,
+            spectrum.kpoint_axis,
+            evs,
+            fermi_level=self.fermi_level_offset,
+            threshold=threshold,
+            pocket_depth=pocket_depth,
+        )
 
     def spin2index(self, spin):
         if spin in [None, "none", "down", "dn", 0]:
@@ -10,6 +10,10 @@ from ase.dft.kpoints import resolve_kpt_path_string
 
 import ase.io
 from ase.dft.kpoints import BandPath
+from ase.geometry import minkowski_reduce
+
+from collections import namedtuple
+from functools import lru_cache
 
 
 def pretty(kpt):
@@ -49,6 +53,93 @@ def set_axes_equal(ax):
     ax.set_zlim3d([z_middle - plot_radius, z_middle + plot_radius])
 
 
+def get_bz_polygons(cell, dim=3, tolerance=1e-6):
+    """Constructs the facets of the Brillouine zone of a cell.
+
+    The reciprocal cell is Minkowski-reduced first, so that the 27 lattice points around the origin contain all neighbours
+    of the Wigner-Seitz cell. The facets are cached per reduced reciprocal cell, which is compared up to the tolerance,
+    hence cells of the same lattice are only constructed once.
+
+    Args:
+        cell (array): Real space cell of shape (3, 3).
+        dim (int): Number of periodic dimensions, None defaults to 3.
+        tolerance (float): Tolerance in 1/Angstrom to identify equal reciprocal cells, None defaults to 1e-6.
+
+    Returns:
+        namedtuple: brillouine_zone with read-only arrays:
+            vertices (array): Vertices of shape (nvertices, 3) in units of 1/Angstrom without the factor 2 pi.
+            facets (array): Ordered vertex indices of every facet of shape (nfacets, maxvertices), padded with -1.
+            normals (array): Outward unit normals of shape (nfacets, 3).
+    """
+    # equal arguments of different types or None share one cache entry
+    dim = 3 if dim is None else int(dim)
+    tolerance = 1e-6 if tolerance is None else float(tolerance)
+    icell = np.linalg.pinv(np.array(cell, dtype=float)).T
+    key = tuple(np.round(icell / tolerance).astype(np.int64).ravel())
+    return _get_bz_polygons(_get_canonical_key(key, dim, tolerance), dim, tolerance)
+
+
+@lru_cache(maxsize=256)
+def _get_canonical_key(key, dim, tolerance):
+    """Chooses the shortest linearly independent lattice vectors as basis, so that equal lattices give equal keys.
+
+    Ties between vectors of equal length are broken by their rounded coordinates.
+    """
+    icell = np.array(key, dtype=float).reshape(3, 3) * tolerance
+    pbc = [True] * dim + [False] * (3 - dim)
+    icell, _ = minkowski_reduce(icell, pbc=pbc)
+    icell = np.array(icell)
+    I = (np.indices((3, 3, 3)) - 1).reshape((3, 27)).T
+    I = I[np.all(I[:, dim:] == 0, axis=1) & np.any(I != 0, axis=1)]
+    candidates = np.dot(I, icell)
+    rounded = np.round(candidates / tolerance).astype(np.int64)
+    lengths = np.round(np.linalg.norm(candidates, axis=1) / tolerance)
+    order = np.lexsort(tuple(-rounded.T[::-1]) + (lengths,))
+    basis = []
+    for v in candidates[order]:
+        if np.linalg.matrix_rank(np.array(basis + [v]), tol=tolerance) > len(basis):
+            basis.append(v)
+        if len(basis) == dim:
+            break
+    icell[:dim] = basis
+    return tuple(np.round(icell / tolerance).astype(np.int64).ravel())
+
+
+@lru_cache(maxsize=64)
+def _get_bz_polygons(key, dim, tolerance):
+    bz = namedtuple("brillouine_zone", ["vertices", "facets", "normals"])
+    icell = np.array(key, dtype=float).reshape(3, 3) * tolerance
+    if dim < 3:
+        icell[2, 2] = 1e-3
+    if dim < 2:
+        icell[1, 1] = 1e-3
+    I = (np.indices((3, 3, 3)) - 1).reshape((3, 27))
+    G = np.dot(icell.T, I).T
+    voronoi = scipy.spatial.Voronoi(G)
+    # the origin is point 13, its ridges are the facets of the Brillouine zone
+    ridge_points = np.asarray(voronoi.ridge_points)
+    selected = np.flatnonzero(np.any(ridge_points == 13, axis=1))
+    ridges = [voronoi.ridge_vertices[i] for i in selected]
+    lengths = np.array([len(r) for r in ridges], dtype=int)
+    indices = np.concatenate(ridges)
+    # ridges with a vertex at infinity (-1) are dropped
+    finite = np.ones(len(ridges), dtype=bool)
+    finite[np.repeat(np.arange(len(ridges)), lengths)[indices < 0]] = False
+    padded = np.arange(lengths.max())[None, :] < lengths[:, None]
+    facets = np.full(padded.shape, -1, dtype=int)
+    facets[padded] = indices
+    facets = facets[finite][:, : lengths[finite].max()]
+    selected = selected[finite]
+    normals = G[ridge_points[selected]].sum(axis=1)
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    used, inverse = np.unique(facets[facets >= 0], return_inverse=True)
+    vertices = voronoi.vertices[used]
+    facets[facets >= 0] = inverse
+    for array in (vertices, facets, normals):
+        array.flags.writeable = False
+    return bz(vertices, facets, normals)
+
+
 class BrillouineZone:
     """ Mostly taken from ase.dft.bz, just cleaned up. """
 
@@ -82,37 +173,26 @@ class BrillouineZone:
         self._bandpath = bp
         self.special_points = bp.special_points
 
+    def get_bz_polygons(self, dim=3):
+        """Returns the facets of the Brillouine zone as arrays, see :func:`~aimstools.bandstructures.brillouinezone.get_bz_polygons`."""
+        return get_bz_polygons(self.structure.get_cell(), dim=dim)
+
     def get_bz(self, dim=3):
-        atoms = self.structure
-        cell = atoms.get_cell()
-        icell = np.linalg.pinv(cell).T
-
-        if dim < 3:
-            icell[2, 2] = 1e-3
-        if dim < 2:
-            icell[1, 1] = 1e-3
-
-        bz = []
-        I = (np.indices((3, 3, 3)) - 1).reshape((3, 27))
-        G = np.dot(icell.T, I).T
-        voronoi = scipy.spatial.Voronoi(G)
-        for vertices, points in zip(voronoi.ridge_vertices, voronoi.ridge_points):
-            if -1 not in vertices and 13 in points:
-                normal = G[points].sum(0)
-                normal /= (normal ** 2).sum() ** 0.5
-                bz.append((voronoi.vertices[vertices], normal))
-        return bz
+        """Returns the facets of the Brillouine zone as list of (vertices, normal) tuples."""
+        bz = self.get_bz_polygons(dim=dim)
+        return [
+            (bz.vertices[facet[facet >= 0]], normal)
+            for facet, normal in zip(bz.facets, bz.normals)
+        ]
 
     def plot(self, axes=None, paths=None, points=None, elev=None):
         special_points = self.special_points
         labelseq, coords = resolve_kpt_path_string(self.bandpath.path, special_points)
         fig = plt.gcf()
-        paths = []
-        points_already_plotted = set()
-        for subpath_labels, subpath_coords in zip(labelseq, coords):
-            subpath_coords = np.array(subpath_coords)
-            points_already_plotted.update(subpath_labels)
-            paths.append((subpath_labels, self.bandpath._scale(subpath_coords)))
+        # all path coordinates are scaled at once and split into the subpaths afterwards
+        lengths = np.cumsum([len(k) for k in coords])[:-1]
+        scaled = self.bandpath._scale(np.concatenate(coords).reshape(-1, 3))
+        paths = list(zip(labelseq, np.split(scaled, lengths)))
 
         dimensions = 2 if self.is_2d else 3
         if dimensions == 3:
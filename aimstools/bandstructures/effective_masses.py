@@ -0,0 +1,276 @@
+from aimstools.misc import *
+
+from collections import namedtuple
+
+import numpy as np
+
+# hbar^2 / (2 m_e) in eV * Angstrom^2
+hbar2_2me = 3.80998
+
+
+def get_path_segments(kpoint_axis):
+    """Splits the k-point axis into path segments.
+
+    Consecutive points with the same coordinate on the k-point axis mark the boundaries of path segments and jumps.
+
+    Args:
+        kpoint_axis (array): K-point axis of shape (nkpoints,).
+
+    Returns:
+        list: List of index arrays, one per path segment.
+    """
+    bounds = np.flatnonzero(np.diff(kpoint_axis) <= 0) + 1
+    return np.split(np.arange(len(kpoint_axis)), bounds)
+
+
+def get_fit_directions(kpoints, kpoint_axis, npoints=3):
+    """Collects the k-points along every path direction through every k-point.
+
+    Interior points of a segment have one two-sided direction. End points of segments have one one-sided direction per segment
+    that starts or ends at the same k-point, e.g., all segments meeting at a high-symmetry point.
+
+    Args:
+        kpoints (array): Cartesian k-points of shape (nkpoints, 3).
+        kpoint_axis (array): K-point axis of shape (nkpoints,).
+        npoints (int): Number of k-points on each side of the center that enter the fit.
+
+    Returns:
+        tuple: (centers, windows) with the center index of every direction of shape (ndirections,) and
+        the k-point indices of every direction of shape (ndirections, 2 * npoints + 1), where -1 marks missing points.
+    """
+    kpoints = np.asarray(kpoints)
+    nkpoints = len(kpoints)
+    segments = get_path_segments(kpoint_axis)
+    segment = np.zeros(nkpoints, dtype=int)
+    for i, s in enumerate(segments):
+        segment[s] = i
+    offsets = np.arange(-npoints, npoints + 1)
+    # two-sided windows around every point, clipped at the segment boundaries
+    windows = np.arange(nkpoints)[:, None] + offsets[None, :]
+    inside = (windows >= 0) & (windows < nkpoints)
+    windows = np.where(inside, windows, 0)
+    inside &= segment[windows] == segment[:, None]
+    windows = np.where(inside, windows, -1)
+    ends = np.isin(
+        np.arange(nkpoints), [s[0] for s in segments] + [s[-1] for s in segments]
+    )
+    centers = list(np.flatnonzero(~ends))
+    directions = list(windows[~ends])
+    # one-sided windows of all segment ends at the same k-point
+    end_points = np.flatnonzero(ends)
+    same = np.all(
+        np.isclose(
+            kpoints[end_points, None, :], kpoints[None, end_points, :], atol=1e-6
+        ),
+        axis=-1,
+    )
+    for i, p in enumerate(end_points):
+        for q in end_points[same[i]]:
+            # windows are clipped at the segment boundaries, so they are one-sided
+            w = windows[q].copy()
+            if q != p:
+                # the center is the same k-point, the fit is anchored at p
+                w[offsets == 0] = p
+            if len(segments[segment[q]]) > 1:
+                centers.append(p)
+                directions.append(w)
+    return np.array(centers, dtype=int), np.array(directions, dtype=int).reshape(
+        -1, len(offsets)
+    )
+
+
+def find_extrema(eigenvalues, centers, windows):
+    """Finds the local maxima and minima of all bands.
+
+    A state is a local extremum if its energy is not exceeded (maximum) or undercut (minimum) by its direct neighbours
+    along any direction through its k-point.
+
+    Args:
+        eigenvalues (array): Eigenvalues of shape (nkpoints, nstates) of one spin channel.
+        centers (array): Center indices from :func:`get_fit_directions`.
+        windows (array): Window indices from :func:`get_fit_directions`.
+
+    Returns:
+        tuple: Boolean arrays (maxima, minima) of shape (nkpoints, nstates).
+    """
+    nkpoints, nstates = eigenvalues.shape
+    mid = windows.shape[1] // 2
+    neighbours = windows[:, [mid - 1, mid + 1]]
+    center = eigenvalues[centers][:, None, :]
+    values = np.where(
+        (neighbours >= 0)[..., None], eigenvalues[neighbours], center
+    )  # (ndirections, 2, nstates)
+    maxima = np.ones((nkpoints, nstates), dtype=bool)
+    minima = np.ones((nkpoints, nstates), dtype=bool)
+    np.logical_and.at(maxima, centers, np.all(values <= center, axis=1))
+    np.logical_and.at(minima, centers, np.all(values >= center, axis=1))
+    return maxima, minima
+
+
+def fit_effective_masses(distances, energies, model="parabolic"):
+    """Fits dispersions E(k) around extrema for many directions at once.
+
+    The parabolic model is E - E0 = hbar^2 k^2 / (2 m*). The hyperbolic (Kane) model is
+    (E - E0) (1 + alpha (E - E0)) = hbar^2 k^2 / (2 m*) with the nonparabolicity alpha in 1/eV.
+
+    Args:
+        distances (array): Distances from the extremum in 1/Angstrom of shape (nfits, nwindow), NaN for missing points.
+        energies (array): Energies relative to the extremum in eV of shape (nfits, nwindow), NaN for missing points.
+        model (str): "parabolic" or "hyperbolic".
+
+    Returns:
+        tuple: (masses, alpha) of shape (nfits,) in units of the electron mass and 1/eV. Masses are negative at maxima.
+    """
+    valid = np.isfinite(distances) & np.isfinite(energies) & (distances > 0)
+    t2 = np.where(valid, distances ** 2, 0.0)
+    de = np.where(valid, energies, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if model == "parabolic":
+            curvature = np.sum(t2 * de, axis=1) / np.sum(t2 * t2, axis=1)
+            alpha = np.full(len(curvature), np.nan)
+        elif model == "hyperbolic":
+            # de = c * t2 - alpha * de^2, solved by normal equations for (c, alpha)
+            a = np.stack([t2, -(de ** 2)], axis=-1)
+            ata = np.einsum("nwi,nwj->nij", a, a)
+            atb = np.einsum("nwi,nw->ni", a, de)
+            solvable = np.linalg.cond(ata) < 1e12
+            solution = np.full(atb.shape, np.nan)
+            solution[solvable] = np.linalg.solve(
+                ata[solvable], atb[solvable][..., None]
+            )[..., 0]
+            curvature, alpha = solution[:, 0], solution[:, 1]
+        else:
+            raise Exception("Model {} not recognized.".format(model))
+        masses = hbar2_2me / curvature
+    enough = np.sum(valid, axis=1) >= (2 if model == "hyperbolic" else 1)
+    masses[~enough] = np.nan
+    alpha[~enough] = np.nan
+    return masses, alpha
+
+
+def get_effective_masses(
+    kpoints,
+    kpoint_axis,
+    eigenvalues,
+    occupations,
+    window=None,
+    npoints=3,
+    model="parabolic",
+    fermi_level=0.0,
+):
+    """Locates band extrema and fits effective masses along all path directions through them.
+
+    The valence band maximum and conduction band minimum of every spin channel are always included. If a window is given,
+    all other local extrema with energies inside of it are included as well. Everything is vectorized over bands, extrema
+    and directions, so that the function can be applied to many calculations in a row.
+
+    Args:
+        kpoints (array): Cartesian k-points in 1/Angstrom of shape (nkpoints, 3).
+        kpoint_axis (array): K-point axis of shape (nkpoints,).
+        eigenvalues (array): Eigenvalues of shape (nkpoints, nspins, nstates).
+        occupations (array): Occupations of shape (nkpoints, nspins, nstates).
+        window (tuple): Energy window (lower, upper) in eV for additional extrema. A single value w is (-w, w).
+        npoints (int): Number of k-points on each side of an extremum that enter the fit.
+        model (str): "parabolic" or "hyperbolic", see :func:`fit_effective_masses`.
+        fermi_level (float): Fermi level on the energy scale of the eigenvalues, the energy window is relative to it.
+
+    Returns:
+        namedtuple: effective_masses with one entry per extremum:
+            kind (array): "VBM", "CBM", "maximum" or "minimum".
+            spin, state, kpoint_index (array): Spin channel, state and k-point index.
+            energy (array): Energy of the extremum.
+            directions (array): Unit vectors of the fit directions of shape (nextrema, ndirections, 3), NaN-padded.
+            masses (array): Effective masses in units of the electron mass of shape (nextrema, ndirections), NaN-padded.
+            nonparabolicity (array): Nonparabolicity in 1/eV of shape (nextrema, ndirections), NaN for parabolic fits.
+    """
+    em = namedtuple(
+        "effective_masses",
+        [
+            "kind",
+            "spin",
+            "state",
+            "kpoint_index",
+            "energy",
+            "directions",
+            "masses",
+            "nonparabolicity",
+        ],
+    )
+    kpoints = np.asarray(kpoints)
+    eigenvalues = np.asarray(eigenvalues)
+    occupied = np.asarray(occupations) >= 1e-4
+    nkpoints, nspins, nstates = eigenvalues.shape
+    if window != None and not hasattr(window, "__len__"):
+        window = (-abs(window), abs(window))
+    if window != None:
+        window = (min(window) + fermi_level, max(window) + fermi_level)
+    centers, windows = get_fit_directions(kpoints, kpoint_axis, npoints=npoints)
+    _, index = np.unique(np.round(kpoints, 6), axis=0, return_index=True)
+    first = np.isin(np.arange(nkpoints), index)
+
+    kind, spin, state, kindex = [], [], [], []
+    for s in range(nspins):
+        evs = eigenvalues[:, s, :]
+        vbs = np.where(occupied[:, s], evs, -np.inf)
+        cbs = np.where(occupied[:, s], np.inf, evs)
+        k, n = np.unravel_index(np.argmax(vbs), vbs.shape)
+        edges = [("VBM", k, n)]
+        k, n = np.unravel_index(np.argmin(cbs), cbs.shape)
+        edges.append(("CBM", k, n))
+        for name, k, n in edges:
+            kind.append(name)
+            spin.append(s)
+            kindex.append(k)
+            state.append(n)
+        if window != None:
+            maxima, minima = find_extrema(evs, centers, windows)
+            # k-points that occur several times are only counted once
+            inside = (evs >= window[0]) & (evs <= window[1]) & first[:, None]
+            for name, mask in (("maximum", maxima), ("minimum", minima)):
+                for k, n in zip(*np.nonzero(mask & inside)):
+                    # degenerate states, e.g., Kramers pairs, are only counted once
+                    if any(
+                        (k == e[1]) and abs(evs[k, n] - evs[k, e[2]]) < 1e-4
+                        for e in edges
+                    ):
+                        continue
+                    edges.append((name, k, n))
+                    kind.append(name)
+                    spin.append(s)
+                    kindex.append(k)
+                    state.append(n)
+    kind, spin = np.array(kind), np.array(spin, dtype=int)
+    state, kindex = np.array(state, dtype=int), np.array(kindex, dtype=int)
+
+    # all directions through all extrema, shape (nfits, nwindow)
+    extremum, direction = np.nonzero(kindex[:, None] == centers[None, :])
+    fit_windows = windows[direction]
+    missing = fit_windows < 0
+    fit_windows = np.where(missing, 0, fit_windows)
+    center = kindex[extremum]
+    dk = kpoints[fit_windows] - kpoints[center][:, None, :]
+    distances = np.where(missing, np.nan, np.linalg.norm(dk, axis=-1))
+    energies = eigenvalues[
+        fit_windows, spin[extremum][:, None], state[extremum][:, None]
+    ]
+    energies = energies - eigenvalues[center, spin[extremum], state[extremum]][:, None]
+    energies = np.where(missing, np.nan, energies)
+    masses, alpha = fit_effective_masses(distances, energies, model=model)
+    # unit vector of every direction from the farthest point of the window
+    far = np.argmax(np.where(missing, -1, distances), axis=1)
+    unit = dk[np.arange(len(far)), far]
+    unit = unit / np.maximum(np.linalg.norm(unit, axis=-1, keepdims=True), 1e-12)
+
+    nextrema = len(kind)
+    ndirections = np.max(np.bincount(extremum, minlength=nextrema), initial=0)
+    slot = np.zeros(len(extremum), dtype=int)
+    for i in range(1, len(extremum)):
+        slot[i] = slot[i - 1] + 1 if extremum[i] == extremum[i - 1] else 0
+    m = np.full((nextrema, ndirections), np.nan)
+    a = np.full((nextrema, ndirections), np.nan)
+    d = np.full((nextrema, ndirections, 3), np.nan)
+    m[extremum, slot] = masses
+    a[extremum, slot] = alpha
+    d[extremum, slot] = unit
+    energy = eigenvalues[kindex, spin, state]
+    return em(kind, spin, state, kindex, energy, d, m, a)
@@ -0,0 +1,104 @@
+from aimstools.misc import *
+
+from collections import namedtuple
+
+import numpy as np
+
+# hbar in eV * s
+hbar = 6.582119569e-16
+
+
+def get_fermi_crossings(kpoints, kpoint_axis, eigenvalues, fermi_level=0.0):
+    """Finds all crossings of bands with the Fermi level along the band path.
+
+    A band crosses the Fermi level between two neighbouring k-points of the same path segment if its energy relative to the
+    Fermi level changes sign. The crossing point is linearly interpolated between both k-points, the Fermi velocity is
+    the local slope of the band on this interval. All bands, spin channels and k-points are handled at once.
+
+    Args:
+        kpoints (array): Cartesian k-points in 1/Angstrom of shape (nkpoints, 3).
+        kpoint_axis (array): K-point axis of shape (nkpoints,).
+        eigenvalues (array): Eigenvalues of shape (nkpoints, nspins, nstates).
+        fermi_level (float): Fermi level on the energy scale of the eigenvalues.
+
+    Returns:
+        namedtuple: fermi_crossings with one entry per crossing:
+            spin, state (array): Spin channel and state.
+            kpoint_index (array): Index of the k-point before the crossing.
+            axis_coord (array): Interpolated coordinate of the crossing on the k-point axis.
+            kpoint (array): Interpolated Cartesian k-point of the crossing of shape (ncrossings, 3).
+            slope (array): Slope dE/dk along the path in eV Angstrom.
+            velocity (array): Fermi velocity |dE/dk| / hbar in m/s.
+    """
+    fc = namedtuple(
+        "fermi_crossings",
+        ["spin", "state", "kpoint_index", "axis_coord", "kpoint", "slope", "velocity"],
+    )
+    kpoints = np.asarray(kpoints, dtype=float)
+    x = np.asarray(kpoint_axis, dtype=float)
+    evs = np.asarray(eigenvalues, dtype=float) - fermi_level
+    # steps within path segments, boundaries and jumps are excluded
+    steps = np.flatnonzero(np.diff(x) > 0)
+    below = evs < 0
+    k, spin, state = np.nonzero(below[steps] != below[steps + 1])
+    k = steps[k]
+    e0, e1 = evs[k, spin, state], evs[k + 1, spin, state]
+    t = e0 / (e0 - e1)
+    dx = x[k + 1] - x[k]
+    axis_coord = x[k] + t * dx
+    kpoint = kpoints[k] + t[:, None] * (kpoints[k + 1] - kpoints[k])
+    slope = (e1 - e0) / dx
+    velocity = np.abs(slope) / hbar * 1e-10
+    return fc(spin, state, k, axis_coord, kpoint, slope, velocity)
+
+
+def get_fermi_surface(
+    kpoints,
+    kpoint_axis,
+    eigenvalues,
+    fermi_level=0.0,
+    threshold=0.1,
+    pocket_depth=0.3,
+):
+    """Classifies a band structure as metal, semimetal or insulator from the Fermi level crossings along the band path.
+
+    Without crossings, the band structure is an insulator if the gap between the states below and above the Fermi level is
+    larger than threshold, otherwise it is a semimetal with touching bands, e.g., graphene. With crossings, every crossing band
+    forms an electron or hole pocket, whose depth is how far the band extends to the other side of the Fermi level. If all
+    pockets are shallower than pocket_depth, e.g., bismuth, the band structure is a semimetal, otherwise it is a metal.
+
+    Args:
+        kpoints (array): Cartesian k-points in 1/Angstrom of shape (nkpoints, 3).
+        kpoint_axis (array): K-point axis of shape (nkpoints,).
+        eigenvalues (array): Eigenvalues of shape (nkpoints, nspins, nstates).
+        fermi_level (float): Fermi level on the energy scale of the eigenvalues.
+        threshold (float): Band gaps smaller than this value in eV are not considered insulating.
+        pocket_depth (float): Largest depth of electron and hole pockets in eV of a semimetal.
+
+    Returns:
+        namedtuple: fermi_surface with:
+            kind (str): "metal", "semimetal" or "insulator".
+            gap (float): Energy difference in eV between the lowest state above and the highest state below the Fermi level
+                on the band path, 0 if bands cross the Fermi level.
+            crossing_bands (array): Integer array of shape (nbands, 2) with the spin channel and state of every crossing band.
+            pocket_depths (array): Pocket depth in eV of every crossing band of shape (nbands,).
+            crossings (namedtuple): Crossings from :func:`get_fermi_crossings`.
+    """
+    fs = namedtuple(
+        "fermi_surface", ["kind", "gap", "crossing_bands", "pocket_depths", "crossings"]
+    )
+    evs = np.asarray(eigenvalues, dtype=float) - fermi_level
+    crossings = get_fermi_crossings(kpoints, kpoint_axis, evs)
+    bands = np.unique(np.stack([crossings.spin, crossings.state], axis=1), axis=0)
+    emin = evs[:, bands[:, 0], bands[:, 1]].min(axis=0)
+    emax = evs[:, bands[:, 0], bands[:, 1]].max(axis=0)
+    depths = np.minimum(emax, -emin)
+    if len(bands) > 0:
+        gap = 0.0
+        kind = "semimetal" if np.all(depths < pocket_depth) else "metal"
+    else:
+        gap = np.min(evs[evs >= 0], initial=np.inf) - np.max(
+            evs[evs < 0], initial=-np.inf
+        )
+        kind = "insulator" if gap > threshold else "semimetal"
+    return fs(kind, gap, bands, depths, crossings)
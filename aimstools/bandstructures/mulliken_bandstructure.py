@@ -4,6 +4,16 @@ from aimstools.bandstructures.utilities import (
     MullikenBandStructurePlot,
 )
 from aimstools.bandstructures.bandstructure import BandStructureBaseClass
+from aimstools.bandstructures.mulliken_storage import (
+    ContributionBlocks,
+    ContributionQuantizer,
+    get_cache_metadata,
+    open_cache_memmap,
+    read_cache,
+    sparsify_contributions,
+    write_cache,
+)
+from aimstools.density_of_states.utilities import Contribution, DOSSpectrum
 
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
@@ -17,11 +27,20 @@ from ase.data.colors import jmol_colors
 from ase.formula import Formula
 
 from collections import namedtuple
+from pathlib import Path
 import numpy as np
 import time
 
 
 class MullikenSpectrum:
+    """Container of a Mulliken-projected spectrum along a band path.
+
+    The contributions are stored as :class:`~aimstools.bandstructures.mulliken_storage.ContributionBlocks`
+    of shape (natoms, nkpoints, nspins, nstates, [tot, s, p, d, f, g, h]). Only the requested atoms and angular momenta are materialized.
+
+    Contributions summed over species or other groups of atoms are computed once for all angular momenta and cached by (group, l).
+    """
+
     def __init__(
         self,
         atoms,
@@ -39,15 +58,18 @@ class MullikenSpectrum:
         self.kpoint_axis = kpoint_axis
         self.eigenvalues = eigenvalues
         self.occupations = occupations
+        if isinstance(contributions, np.ndarray):
+            contributions = ContributionBlocks([contributions])
         self.contributions = contributions
         self.label_coords = label_coords
         self.kpoint_labels = kpoint_labels
         self.jumps = jumps
+        self._group_cache = {}
 
     def get_atom_contribution(self, index, l="tot"):
         l = self.l2index(l)
         s = self.atoms[index].symbol
-        con = self.contributions[index, :, :, :, l].copy()
+        con = np.array(self.contributions[index, :, :, :, l])
         return MullikenContribution(s, con, l)
 
     def get_symbol(self, symbol):
@@ -62,21 +84,280 @@ class MullikenSpectrum:
         s = Formula.from_list(s).format("metal").format("reduce")
         return s
 
+    @property
+    def species(self):
+        """Dictionary of species and the indices of their atoms."""
+        species = {}
+        for k, j in enumerate(self.atoms):
+            species.setdefault(j.symbol, []).append(k)
+        return species
+
+    def get_group_contributions(self, groups, l="tot"):
+        """Returns the contributions summed over groups of atoms, e.g., species, fragments or layers.
+
+        Groups that are not cached yet are reduced together for all angular momenta, so that subsequent calls are lookups.
+
+        Args:
+            groups (list): List of lists of atom indices.
+            l (str): Angular momentum.
+
+        Returns:
+            list: List of arrays of shape (nkpoints, nspins, nstates).
+        """
+        l = self.l2index(l)
+        groups = [tuple(sorted(set(int(i) for i in g))) for g in groups]
+        missing = [g for g in dict.fromkeys(groups) if (g, l) not in self._group_cache]
+        if len(missing) > 0:
+            tensor = self.contributions.reduce_atoms(missing)
+            for g, t in zip(missing, tensor):
+                # one contiguous array per angular momentum
+                t = np.ascontiguousarray(np.moveaxis(t, -1, 0))
+                for i, con in enumerate(t):
+                    con.flags.writeable = False
+                    self._group_cache[(g, i)] = con
+        return [self._group_cache[(g, l)] for g in groups]
+
     def get_species_contribution(self, symbol, l="tot"):
         symbol = self.get_symbol(symbol)
-        l = self.l2index(l)
         assert symbol in self.atoms.symbols, "Symbol {} not part of atoms.".format(
             symbol
         )
-        indices = [k for k, j in enumerate(self.atoms) if j.symbol == symbol]
-        cons = self.contributions[indices, ...]
-        cons = np.sum(cons[:, :, :, :, l], axis=0)
-        return MullikenContribution(symbol, cons, l)
+        species = self.species
+        # all species are reduced at once, since they are usually needed together
+        cons = self.get_group_contributions(species.values(), l)
+        cons = cons[list(species.keys()).index(symbol)]
+        return MullikenContribution(symbol, cons, self.l2index(l))
 
     def get_group_contribution(self, symbols, l="tot"):
-        symbols = [self.get_symbol(s) for s in symbols]
-        cons = sum([self.get_species_contribution(s, l) for s in symbols])
-        return cons
+        # every species is counted once, even if it is given several times
+        symbols = list(dict.fromkeys([self.get_symbol(s) for s in symbols]))
+        for s in symbols:
+            assert s in self.atoms.symbols, "Symbol {} not part of atoms.".format(s)
+        species = self.species
+        indices = sorted(set([k for s in symbols for k in species[s]]))
+        cons = self.get_group_contributions([indices], l)[0]
+        symbol = Formula.from_list(symbols).format("reduce")
+        return MullikenContribution(symbol, cons, self.l2index(l))
+
+    def get_fragment_contribution(self, indices, l="tot"):
+        """Returns the contribution of a user-defined group of atoms, e.g., a molecule or a layer.
+
+        Args:
+            indices (list): Atom indices.
+            l (str): Angular momentum.
+
+        Returns:
+            MullikenContribution: Contribution labeled by the chemical formula of the fragment.
+        """
+        cons = self.get_group_contributions([indices], l)[0]
+        symbol = self.atoms[list(indices)].symbols.formula.format("metal")
+        return MullikenContribution(symbol, cons, self.l2index(l))
+
+    def stack_contributions(self, list_of_contributions):
+        """Stacks a list of contributions into one array.
+
+        Args:
+            list_of_contributions (list): List of :class:`MullikenContribution` or arrays of shape (nkpoints, nspins, nstates).
+
+        Returns:
+            array: Array of shape (ncontributions, nkpoints, nspins, nstates).
+        """
+        cons = [
+            c.contribution if isinstance(c, MullikenContribution) else np.asarray(c)
+            for c in list_of_contributions
+        ]
+        return np.stack(cons, axis=0)
+
+    def get_majority_contribution(self, list_of_contributions, threshold=None):
+        """Classifies every state at every k-point by its largest contribution.
+
+        Args:
+            list_of_contributions (list): List of :class:`MullikenContribution` or arrays of shape (nkpoints, nspins, nstates).
+            threshold (float): If the two largest contributions differ by less than this fraction of the largest one,
+                the state is classified as mixed. For example, 0.1 marks states where the top two are within 10 %.
+
+        Returns:
+            array: Integer array of shape (nkpoints, nspins, nstates) with the index of the largest contribution, or -1 for mixed states.
+        """
+        cons = self.stack_contributions(list_of_contributions)
+        majority = np.argmax(cons, axis=0)
+        if threshold != None and len(cons) > 1:
+            top = np.partition(cons, -2, axis=0)
+            first, second = top[-1], top[-2]
+            mixed = (first - second) <= threshold * first
+            majority = np.where(mixed, -1, majority)
+        return majority
+
+    def get_majority_angular_momentum(self, symbols=None, max_l="f", threshold=None):
+        """Classifies every state at every k-point by its largest angular momentum contribution.
+
+        Args:
+            symbols (list): Species to sum over, defaults to all species.
+            max_l (str): Highest angular momentum to consider.
+            threshold (float): See :func:`get_majority_contribution`.
+
+        Returns:
+            array: Integer array of shape (nkpoints, nspins, nstates) with l = 0, 1, 2 ... of the largest contribution, or -1 for mixed states.
+        """
+        if symbols in ["all", "None", None, "All", []]:
+            symbols = set(self.atoms.symbols)
+        momenta = ("s", "p", "d", "f", "g", "h")
+        momenta = momenta[: momenta.index(max_l) + 1]
+        lcons = [self.get_group_contribution(symbols, l) for l in momenta]
+        return self.get_majority_contribution(lcons, threshold=threshold)
+
+    def get_character_vectors(self, by="species"):
+        """Returns the normalized Mulliken character of every state.
+
+        Args:
+            by (str): "species" resolves the character by species and angular momentum, "atoms" by atoms and angular momentum.
+
+        Returns:
+            array: Array of shape (nkpoints, nspins, nstates, nfeatures) with unit length along the last axis.
+        """
+        ncons = self.contributions.shape[-1]
+        momenta = ("s", "p", "d", "f", "g", "h")[: ncons - 1]
+        if by == "species":
+            groups = list(self.species.values())
+            chars = [self.get_group_contributions(groups, l) for l in momenta]
+            chars = np.stack([c for l in chars for c in l], axis=-1)
+        elif by == "atoms":
+            chars = np.asarray(self.contributions)[..., 1 : len(momenta) + 1]
+            chars = np.moveaxis(chars, 0, -2).reshape(chars.shape[1:-1] + (-1,))
+        else:
+            raise Exception(
+                "Character vectors can only be resolved by species or atoms."
+            )
+        norm = np.linalg.norm(chars, axis=-1, keepdims=True)
+        return chars / np.maximum(norm, 1e-12)
+
+    def get_band_connectivity(self, by="species", energy_penalty=1.0, chunksize=64):
+        """Connects the states of neighbouring k-points to bands by their Mulliken character.
+
+        The states at two neighbouring k-points are matched by maximizing the overlap of their character vectors minus
+        energy_penalty times their energy difference. If every state has a unique best match, this is the optimal assignment,
+        otherwise the assignment problem is solved with the Hungarian algorithm. At segment boundaries and jumps
+        the states are kept in energetic order.
+
+        Args:
+            by (str): Resolution of the character vectors, see :func:`get_character_vectors`.
+            energy_penalty (float): Penalty of the energy difference in 1/eV.
+            chunksize (int): Number of k-point steps whose overlaps are evaluated at once.
+
+        Returns:
+            array: Integer array of shape (nkpoints, nspins, nstates), where [k, spin, band] is the index of the state belonging to band at k.
+        """
+        from scipy.optimize import linear_sum_assignment
+
+        chars = self.get_character_vectors(by=by).astype(np.float32)
+        evs = np.asarray(self.eigenvalues)
+        nkpoints, nspins, nstates = evs.shape
+        # matches[k, spin, i] is the state at k + 1 that continues state i at k
+        matches = np.broadcast_to(np.arange(nstates), (nkpoints - 1, nspins, nstates))
+        matches = matches.copy()
+        steps = np.flatnonzero(np.diff(self.kpoint_axis) > 0)
+        for spin in range(nspins):
+            for start in range(0, len(steps), chunksize):
+                k = steps[start : start + chunksize]
+                scores = np.matmul(
+                    chars[k, spin], chars[k + 1, spin].transpose(0, 2, 1)
+                )
+                de = np.abs(evs[k, spin, :, None] - evs[k + 1, spin, None, :])
+                scores -= energy_penalty * de
+                best = np.argmax(scores, axis=2)
+                unique = np.all(np.sort(best, axis=1) == np.arange(nstates), axis=1)
+                matches[k[unique], spin] = best[unique]
+                for i in np.flatnonzero(~unique):
+                    _, col = linear_sum_assignment(scores[i], maximize=True)
+                    matches[k[i], spin] = col
+        order = np.empty((nkpoints, nspins, nstates), dtype=int)
+        order[0] = np.arange(nstates)
+        for k in range(nkpoints - 1):
+            order[k + 1] = np.take_along_axis(matches[k], order[k], axis=1)
+        return order
+
+    def reorder_states(self, array, order):
+        """Reorders an array of shape (nkpoints, nspins, nstates) according to the band connectivity.
+
+        Args:
+            array (array): Eigenvalues, occupations or contributions of shape (nkpoints, nspins, nstates).
+            order (array): Band connectivity from :func:`get_band_connectivity`.
+
+        Returns:
+            array: Array of the same shape, where the last axis enumerates connected bands instead of states.
+        """
+        return np.take_along_axis(np.asarray(array), order, axis=2)
+
+    def get_projected_dos(
+        self,
+        by="species",
+        window=(-10, 10),
+        npoints=2001,
+        broadening=0.05,
+        spins=None,
+        fermi_level=0.0,
+    ):
+        """Computes the angular-momentum-projected density of states from the Mulliken contributions.
+
+        The eigenvalues of all k-points are sorted into the bins of the energy grid with a sparse matrix, which is multiplied
+        with the contributions of all atoms and angular momenta at once. The histogram is then broadened by Gaussians of
+        the same form as :func:`~aimstools.density_of_states.utilities.delta_function`. The k-points of the band path are weighted equally,
+        so the result approximates the density of states only as well as the band path samples the Brillouine zone.
+
+        Args:
+            by (str): "species" or "atoms".
+            window (tuple): Energy window (lower, upper) in eV of the energy grid.
+            npoints (int): Number of points of the energy grid.
+            broadening (float): Width of the Gaussians in eV, 0 returns the histogram.
+            spins (list): Spin channels to include, defaults to all.
+            fermi_level (float): Fermi level on the energy scale of the eigenvalues, the energy grid is relative to it.
+
+        Returns:
+            DOSSpectrum: Spectrum of type "species" or "atom" with energies of shape (npoints, nspins) and one
+            :class:`~aimstools.density_of_states.utilities.Contribution` of shape (npoints, nspins, 7) per species or atom.
+        """
+        from scipy.sparse import csr_matrix
+        from scipy.ndimage import gaussian_filter1d
+
+        evs = np.asarray(self.eigenvalues) - fermi_level
+        nkpoints, nspins, nstates = evs.shape
+        spins = list(range(nspins)) if spins == None else list(spins)
+        energies = np.linspace(min(window), max(window), npoints)
+        de = energies[1] - energies[0]
+        if by == "species":
+            labels, groups = list(self.species.keys()), list(self.species.values())
+            tensor = self.contributions.reduce_atoms(groups)
+        elif by == "atoms":
+            labels = list(self.atoms.symbols)
+            tensor = np.asarray(self.contributions)
+        else:
+            raise Exception("Projected DOS can only be resolved by species or atoms.")
+        ngroups, ncons = tensor.shape[0], tensor.shape[-1]
+        dos = np.zeros((npoints, len(spins), ngroups, 7), dtype=float)
+        for i, spin in enumerate(spins):
+            bins = np.rint((evs[:, spin, :].ravel() - energies[0]) / de).astype(int)
+            valid = (bins >= 0) & (bins < npoints)
+            histogram = csr_matrix(
+                (np.ones(np.sum(valid)), (bins[valid], np.flatnonzero(valid))),
+                shape=(npoints, nkpoints * nstates),
+            )
+            # (nkpoints * nstates, ngroups * ncons)
+            weights = np.moveaxis(tensor[:, :, spin], 0, 2).reshape(
+                nkpoints * nstates, -1
+            )
+            values = np.asarray(histogram @ weights).reshape(npoints, ngroups, ncons)
+            dos[:, i, :, : min(ncons, 7)] = values[..., :7]
+        dos /= nkpoints * de
+        if broadening > 0:
+            dos = gaussian_filter1d(
+                dos, broadening / np.sqrt(2) / de, axis=0, mode="constant"
+            )
+        energies = np.repeat(energies[:, None], len(spins), axis=1)
+        cons = [
+            Contribution(label, np.ascontiguousarray(dos[:, :, i]))
+            for i, label in enumerate(labels)
+        ]
+        return DOSSpectrum(energies, cons, "species" if by == "species" else "atom")
 
     def l2index(self, l):
         if l in [None, "none", "None", "total", "tot"]:
@@ -103,10 +384,23 @@ class MullikenSpectrum:
 
 
 class MullikenContribution:
+    """Contribution of atoms and angular momenta to the states of a Mulliken spectrum.
+
+    Sums, differences and scalings of contributions are lazy. They are recorded as :class:`~aimstools.misc.LinearCombination`
+    and evaluated in one pass when the contribution is accessed. Labels are also only composed when they are accessed.
+
+    Args:
+        symbol (str): Label of the contribution.
+        contribution (array): Array of shape (nkpoints, nspins, nstates).
+        l (str): Angular momentum.
+    """
+
     def __init__(self, symbol, contribution, l) -> None:
         self._symbol = symbol
         self.contribution = contribution
-        self._l = self.index2l(l)
+        self._labels = [symbol]
+        self._momenta = [self.index2l(l)]
+        self._difference = False
 
     def index2l(self, l):
         if type(l) == int:
@@ -132,11 +426,19 @@ class MullikenContribution:
     def __repr__(self) -> str:
         return "MullikenContribution({}, {})".format(self.symbol, self.l)
 
+    def _combine(self, expression, other=None, difference=False):
+        new = MullikenContribution.__new__(MullikenContribution)
+        new._symbol = None
+        new._expression = expression
+        new._labels = self._labels + (other._labels if other != None else [])
+        new._momenta = self._momenta + (other._momenta if other != None else [])
+        new._difference = (
+            self._difference or difference or (other != None and other._difference)
+        )
+        return new
+
     def __add__(self, other) -> "MullikenContribution":
-        l = "".join(set([self.l, other.l]))
-        d = self.contribution + other.contribution
-        s = Formula.from_list([self.symbol, other.symbol]).format("reduce")
-        return MullikenContribution(s, d, l)
+        return self._combine(self._expression + other._expression, other)
 
     def __radd__(self, other):
         if other == 0:
@@ -145,14 +447,27 @@ class MullikenContribution:
             return self.__add__(other)
 
     def __sub__(self, other):
-        l = "".join(set([self.l, other.l]))
-        d = self.contribution - other.contribution
-        s = Formula.from_list([self.symbol, other.symbol]).format("reduce")
-        s = "$\Delta$" + s
-        return MullikenContribution(s, d, l)
+        expression = self._expression - other._expression
+        return self._combine(expression, other, difference=True)
+
+    def __mul__(self, factor) -> "MullikenContribution":
+        return self._combine(self._expression * factor)
+
+    __rmul__ = __mul__
+
+    @property
+    def contribution(self):
+        return self._expression.evaluate()
+
+    @contribution.setter
+    def contribution(self, contribution):
+        self._expression = LinearCombination([(1, contribution)])
 
     @property
     def symbol(self):
+        if self._symbol == None:
+            s = Formula.from_list(self._labels).format("reduce")
+            self._symbol = "$\\Delta$" + str(s) if self._difference else str(s)
         return self._symbol
 
     @property
@@ -161,7 +476,7 @@ class MullikenContribution:
 
     @property
     def l(self):
-        return self._l
+        return "".join(dict.fromkeys(self._momenta))
 
     def get_latex_symbol(self):
         s = self.symbol
@@ -173,100 +488,448 @@ class MullikenBandStructure(BandStructureBaseClass):
     """Mulliken-projected band structure object.
 
     A fat band structure shows the momentum-resolved Mulliken contribution of each atom to the energy.
+
+    Args:
+        outputfile (str): Path to output file or output directory.
+        soc (bool): Read the band structure with spin-orbit coupling.
+        memmap (bool or str): Store the contributions as atom-major memory maps on disk instead of keeping them in memory.
+            If True, the cache directory is placed next to the output file, otherwise it specifies the cache directory.
+            Cached files are reused as long as the bandmlk files do not change.
+        energy_window (float or tuple): Only keep states that enter the energy window (in eV with respect to the Fermi level) at any k-point.
+            A single value w corresponds to the window (-w, w). States outside of the window are dropped while parsing.
+            Band paths that only need some of the sections only scan their band files, see :func:`get_bands`.
+        states (tuple): Only keep the states with indices start <= index < stop, counting from zero.
+        compact (str): Quantize the contributions of every section to "uint8" or "uint16" (True) while parsing and drop
+            angular momentum channels that are zero everywhere, see :class:`~aimstools.bandstructures.mulliken_storage.QuantizedContributions`.
+            The contributions are dequantized transparently when they are accessed. Can not be combined with memmap.
+        sparse (float): Store the contributions of every section as sparse matrix, where contributions of atoms to states
+            with a total contribution below this drop tolerance are discarded (True corresponds to 1e-3),
+            see :class:`~aimstools.bandstructures.mulliken_storage.SparseContributions`. Useful for large systems,
+            where most atoms do not contribute to most states. Can not be combined with memmap or compact.
+
     """
 
-    def __init__(self, outputfile, soc=False) -> None:
+    def __init__(
+        self,
+        outputfile,
+        soc=False,
+        memmap=False,
+        energy_window=None,
+        states=None,
+        compact=None,
+        sparse=None,
+    ) -> None:
         super().__init__(outputfile)
         self.soc = soc
+        self.memmap = memmap
+        self.compact = self.__set_compact(compact)
+        self.sparse = self.__set_sparse(sparse)
+        self.energy_window = self.__set_energy_window(energy_window)
+        self.states = tuple(states) if states != None else None
         self.band_sections = self.band_sections.mlk
         self._bandpath = self.set_bandpath()
         self.task = "mulliken-projected band structure"
         self.spin = "none" if self.control["spin"] != "collinear" else "collinear"
-        if self.soc == False and self.spin == "collinear":
-            raise Exception(
-                "Spin files without SOC have yet another structure, which I have not implemented yet..."
-            )
         if self.control["include_spin_orbit"] and not soc:
             raise Exception(
                 "With include_spin_orbit, the scalar-relativistic mulliken band files are not written out."
             )
         bandfiles = self.get_bandfiles(spin=self.spin, soc=soc)
         self.bandfiles = bandfiles.mulliken
+        self._lazy = LazyObjects({"state_range": self.get_state_range})
         self.bands = self.read_mlk_bandfiles(spin=self.spin)
-        self.spectrum = self.get_mlk_spectrum()
 
     def __repr__(self):
         return "{}(outputfile={}, spin_orbit_coupling={})".format(
             self.__class__.__name__, repr(self.outputfile), self.soc
         )
 
-    def read_mlk_bandfiles(self, spin="none"):
-        # Turns out that any attemps to use regex (np.fromregex, re.finditer ...) are much slower in this case than just pure string matching.
-        atoms = self.structure.copy()
-        natoms = len(atoms)
+    def __set_compact(self, compact):
+        if compact in [None, False, "None", "none"]:
+            return None
+        compact = "uint16" if compact == True else compact
+        assert compact in [
+            "uint8",
+            "uint16",
+        ], "Compact storage {} not recognized.".format(compact)
+        assert self.memmap in [
+            False,
+            None,
+        ], "Compact storage can not be combined with memory-mapping."
+        return np.dtype(compact)
+
+    def __set_sparse(self, sparse):
+        if sparse in [None, False]:
+            return None
+        sparse = 1e-3 if sparse == True else float(sparse)
+        assert self.memmap in [False, None] and (
+            self.compact == None
+        ), "Sparse storage can not be combined with memory-mapping or compact storage."
+        return sparse
+
+    def __set_energy_window(self, window):
+        if window == None:
+            return None
+        if (type(window) == float) or (type(window) == int):
+            window = (-abs(window), abs(window))
+        assert len(window) == 2, "Energy window not recognized."
+        return (float(min(window)), float(max(window)))
+
+    @property
+    def cachedir(self):
+        """ Directory of the memory-mapped contributions, None if they are kept in memory."""
+        if self.memmap in [False, None]:
+            return None
+        elif self.memmap == True:
+            return self.outputdir.joinpath(".aimstools_cache")
+        return Path(self.memmap)
+
+    @property
+    def state_range(self):
+        """(start, stop) indices of the kept states of all sections, see :func:`get_state_range`. They are only determined when the first section is read in."""
+        return self._lazy.get("state_range")
+
+    def get_path_segments(self, bandpath=None):
+        """Returns the sections that are needed for a band path.
+
+        Args:
+            bandpath (str): Band path string, defaults to the calculated band path.
+
+        Returns:
+            tuple: Pairs of section symbols in the order of the band files.
+        """
+        pairs = set()
+        for s1, s2 in self.get_bandpath_segments(bandpath):
+            pairs.update([(s1, s2), (s2, s1)])
+        keys = [(s.symbol1, s.symbol2) for s in self.band_sections]
+        return tuple(k for k in dict.fromkeys(keys) if k in pairs)
+
+    def get_bands(self, bandpath=None):
+        """Returns the lazily read sections for a band path.
+
+        Without an energy window, all sections keep the same states and are shared with :attr:`bands`. With an energy window,
+        the kept states depend on the eigenvalues of the sections, so that a band path that only needs some of the sections
+        gets its own sections, whose state range is determined from their band files alone.
+
+        Args:
+            bandpath (str): Band path string, defaults to the calculated band path.
+
+        Returns:
+            LazyObjects: Bands with kpoints, eigenvalues, occupations and contributions per pair of section symbols.
+        """
+        if self.energy_window == None:
+            return self.bands
+        segments = self.get_path_segments(bandpath)
+        if set(segments) == set(self.bands.keys()):
+            return self.bands
+        key = ("bands",) + segments
+        if key not in self._lazy:
+            self._lazy.register(
+                key,
+                lambda: self.read_mlk_bandfiles(spin=self.spin, segments=segments),
+            )
+        return self._lazy.get(key)
+
+    def read_mlk_bandfiles(self, spin="none", segments=None):
+        """Registers the bandmlk files of the sections, so that every section is only parsed when it is accessed for the first time.
+
+        The state range is shared by the registered sections and is determined from their band files when the first of them is read in.
+
+        Args:
+            spin (str): Spin treatment of the calculation.
+            segments (tuple): Pairs of section symbols to register, defaults to all sections.
+
+        Returns:
+            LazyObjects: Bands with kpoints, eigenvalues, occupations and contributions per pair of section symbols.
+        """
         if spin == "none" and self.soc == False:
             nspins = 1
         else:
             nspins = 2
-        bands = {}
-        b = namedtuple("band", ["kpoints", "data"])
-        logger.info("Reading in mulliken bandfiles in serial ...")
         logger.debug(
             "Note: I'm forcing all l-contributions below zero to be zero, see discussion with Volker Blum."
         )
+        key = "state_range"
+        if segments != None:
+            key = ("state_range",) + tuple(segments)
+            self._lazy.register(key, lambda: self.get_state_range(segments))
+        bands = LazyObjects()
         for section, bandfile in zip(self.band_sections, self.bandfiles):
-            start = time.time()
-            with open(bandfile, "r") as file:
-                lines = file.readlines()
-            kpoints = np.array(
-                [
-                    l.strip().split()[-4:-1]
-                    for l in [k for k in lines if "k point number" in k]
-                ],
-                dtype=np.float32,
+            pathsegment = (section.symbol1, section.symbol2)
+            if segments != None and pathsegment not in segments:
+                continue
+            bands.register(
+                pathsegment,
+                lambda section=section, bandfile=bandfile: self.read_mlk_section(
+                    section, bandfile, nspins, state_range=self._lazy.get(key)
+                ),
             )
-            values = [
-                k.strip().split()
-                for k in lines
-                if "k point number" not in k and "State" not in k and k != ""
-            ]
-            out = np.zeros((len(values), 12), dtype=np.float32)
-            for i, k in enumerate(values):
-                out[i][0 : len(k)] = k
-            ncons = out.shape[1] - 4 - nspins + 1  # dropping state, atom, spin indices
-            nstates = int(np.max(out[:, 0]) - np.min(out[:, 0])) + 1
-            nkpoints = len(kpoints)
-            indices = [1, 2] + list(range(-ncons, 0, 1))
-            out = out[:, indices]
-            out[:, 2:] = np.where(out[:, 2:] < 0.00, 0.00, out[:, 2:])
-            out[:, 2] = np.sum(out[:, 3:], axis=1)  # recalculating total contribution
-            logger.debug(
-                "Found: {:d} kpoints, {:d} states, {:d} spins, {:d} atoms, {:d} contributions.".format(
-                    nkpoints, nstates, nspins, natoms, ncons
-                )
+        return bands
+
+    def read_mlk_section(self, section, bandfile, nspins, state_range=None):
+        """Parses the bandmlk file of one section or loads it from the cache directory.
+
+        Args:
+            section (namedtuple): Band section.
+            bandfile (pathlib object): Path to bandmlk file.
+            nspins (int): Number of spin channels.
+            state_range (tuple): (start, stop) indices of states to keep, counting from zero, None keeps all states.
+
+        Returns:
+            namedtuple: Band with kpoints, eigenvalues, occupations and contributions.
+        """
+        b = namedtuple(
+            "band", ["kpoints", "eigenvalues", "occupations", "contributions"]
+        )
+        start = time.time()
+        cachedir = self.cachedir
+        if cachedir != None:
+            metadata = get_cache_metadata(
+                bandfile,
+                soc=self.soc,
+                nspins=nspins,
+                energy_window=self.energy_window,
+                states=self.states,
+                state_range=state_range,
             )
-            out = out.reshape(nkpoints, nstates * natoms * nspins, ncons + 2)
-            out = out.transpose(0, 2, 1)
-            out = out.reshape(nkpoints, ncons + 2, nstates, natoms, nspins)
-            out = out.transpose(
-                3, 0, 4, 2, 1
-            )  # (natoms, nkpoints, nspins, nstates, ncons)
-            if self.soc:
-                # Removing second spin channel for soc calculations.
-                out[:, :, 0, :, 2:] += out[:, :, 1, :, 2:]
-                out[:, :, 1, :, 2:] = 0.0
-            pathsegment = (section.symbol1, section.symbol2)
-            bands[pathsegment] = b(kpoints, out)
-            end = time.time()
-            logger.info(
-                "\t ... processed {} in {:.2f} seconds.".format(
-                    str(bandfile.parts[-1]), end - start
+            cached = read_cache(cachedir, metadata)
+            if cached != None:
+                logger.info(
+                    "\t ... loaded {} from cache.".format(str(bandfile.parts[-1]))
                 )
+                return b(*cached)
+        allocate = None
+        if cachedir != None:
+            allocate = lambda shape: open_cache_memmap(cachedir, metadata, shape)
+        elif self.compact != None:
+            allocate = lambda shape: ContributionQuantizer(shape, self.compact)
+        band = b(
+            *self.read_mlk_bandfile(
+                bandfile,
+                nspins,
+                state_range,
+                nkpoints=section.npoints,
+                allocate=allocate,
             )
-        return bands
+        )
+        if cachedir != None:
+            contributions = write_cache(cachedir, band, metadata)
+            band = band._replace(contributions=contributions)
+        if self.compact != None:
+            contributions = band.contributions.quantized()
+            band = band._replace(contributions=contributions)
+        if self.sparse != None:
+            contributions = sparsify_contributions(band.contributions, self.sparse)
+            band = band._replace(contributions=contributions)
+        end = time.time()
+        logger.info(
+            "\t ... processed {} in {:.2f} seconds.".format(
+                str(bandfile.parts[-1]), end - start
+            )
+        )
+        return band
+
+    def get_state_range(self, segments=None):
+        """Determines the range of states to keep from the energy window and the state indices.
+
+        The eigenvalues are scanned from the bandmlk files of all requested sections first, so that they keep the same states.
+        Band files of other sections are not opened.
+
+        Args:
+            segments (tuple): Pairs of section symbols, defaults to all sections.
+
+        Returns:
+            tuple: (start, stop) indices of the kept states counting from zero, None if all states are kept.
+        """
+        if self.energy_window == None and self.states == None:
+            return None
+        start, stop = self.states or (0, None)
+        if self.energy_window != None:
+            emin, emax = np.array(self.energy_window) + self.fermi_level_offset
+            inside = []
+            for section, bandfile in zip(self.band_sections, self.bandfiles):
+                if (segments != None) and (
+                    (section.symbol1, section.symbol2) not in segments
+                ):
+                    continue
+                indices, energies = self.scan_mlk_eigenvalues(bandfile)
+                inside.append(indices[(energies >= emin) & (energies <= emax)])
+            inside = np.concatenate(inside)
+            assert len(inside) > 0, "No states found inside of the energy window."
+            start = max(start, int(np.min(inside)))
+            stop = (
+                int(np.max(inside)) + 1
+                if stop == None
+                else min(stop, int(np.max(inside)) + 1)
+            )
+        assert (stop == None) or (stop > start), "No states left to read in."
+        logger.info(
+            "Keeping states {} to {} of the mulliken bandfiles.".format(
+                start, "last" if stop == None else stop - 1
+            )
+        )
+        return [start, stop]
+
+    def scan_mlk_eigenvalues(self, bandfile):
+        """Reads only the eigenvalue of each state and k-point from a bandmlk file.
+
+        Returns:
+            tuple: (indices, energies) of all states at all k-points, with indices counting from zero.
+        """
+        indices, energies = [], []
+        state, pending = None, False
+        with open(bandfile, "r") as file:
+            for line in file:
+                if "State" in line:
+                    k = line.split()
+                    if len(k) == 2:
+                        state, pending = int(k[1]) - 1, True
+                    continue
+                if "Spin channel" in line:
+                    # collinear scalar files list both spin channels per state
+                    pending = state != None
+                    continue
+                if pending:
+                    k = line.split()
+                    if len(k) > 1 and k[0].isdigit():
+                        indices.append(state)
+                        energies.append(float(k[1]))
+                        pending = False
+        return np.array(indices, dtype=int), np.array(energies, dtype=float)
+
+    def iterate_mlk_bandfile(self, bandfile, state_range=None):
+        """Reads a bandmlk file one k-point block at a time.
+
+        Args:
+            bandfile (pathlib object): Path to bandmlk file.
+            state_range (tuple): (start, stop) indices of states to keep, counting from zero.
+
+        Yields:
+            tuple: (kpoint, lines) with the fractional k-point and the data lines of the kept states.
+        """
+        start, stop = state_range or (0, None)
+        stop = np.inf if stop == None else stop
+        kpoint, block, keep = None, [], True
+        with open(bandfile, "r") as file:
+            for line in file:
+                if "k point number" in line:
+                    if kpoint != None:
+                        yield kpoint, block
+                    kpoint = line.strip().split()[-4:-1]
+                    block = []
+                elif "State" in line:
+                    k = line.split()
+                    if len(k) == 2:
+                        keep = start <= int(k[1]) - 1 < stop
+                elif "Spin channel" in line:
+                    continue
+                elif keep and line.strip() != "":
+                    block.append(line)
+        if kpoint != None:
+            yield kpoint, block
+
+    def parse_mlk_block(self, block, nspins):
+        """Converts the data lines of one k-point block to an array.
+
+        Files with SOC list the spin channels of every atom in a separate column. Collinear scalar files have no spin column,
+        instead every state lists all atoms of the spin up channel followed by all atoms of the spin down channel.
+
+        Returns:
+            array: Array of shape (natoms, nspins, nstates, ncons + 2) with eigenvalues, occupations and contributions.
+        """
+        natoms = len(self.structure)
+        ncols = len(block[0].split())
+        values = np.fromstring("".join(block), dtype=np.float32, sep=" ")
+        out = np.zeros((len(block), 12), dtype=np.float32)
+        if values.size == len(block) * ncols:
+            out[:, :ncols] = values.reshape(len(block), ncols)
+        else:
+            # lines with varying number of columns are padded one by one
+            for i, k in enumerate(block):
+                k = k.split()
+                out[i][0 : len(k)] = k
+        spin_column = self.soc or nspins == 1
+        # dropping state, atom and spin indices
+        ncons = out.shape[1] - 4 - (nspins - 1 if spin_column else 0)
+        indices = [1, 2] + list(range(-ncons, 0, 1))
+        out = out[:, indices]
+        out[:, 2:] = np.where(out[:, 2:] < 0.00, 0.00, out[:, 2:])
+        out[:, 2] = np.sum(out[:, 3:], axis=1)  # recalculating total contribution
+        nstates = len(block) // (natoms * nspins)
+        if spin_column:
+            out = out.reshape(nstates, natoms, nspins, ncons + 2)
+            out = out.transpose(1, 2, 0, 3)  # (natoms, nspins, nstates, ncons + 2)
+        else:
+            out = out.reshape(nstates, nspins, natoms, ncons + 2)
+            # spin up is listed first, but spin down has index 0 as for the regular band files
+            out = out.transpose(2, 1, 0, 3)[:, ::-1]
+        if self.soc:
+            # Removing second spin channel for soc calculations.
+            out[:, 0, :, 2:] += out[:, 1, :, 2:]
+            out[:, 1, :, 2:] = 0.0
+        return out
+
+    def read_mlk_bandfile(
+        self, bandfile, nspins, state_range=None, nkpoints=None, allocate=None
+    ):
+        """Parses a single bandmlk file with bounded memory.
+
+        The file is streamed one k-point block at a time and every block is written directly into a preallocated output tensor,
+        so that the peak memory is bounded by one k-point block and the output.
+
+        Args:
+            bandfile (pathlib object): Path to bandmlk file.
+            nspins (int): Number of spin channels in the file.
+            state_range (tuple): (start, stop) indices of states to keep, counting from zero.
+            nkpoints (int): Number of k-points in the file, counted from the file if not given.
+            allocate (callable): Function that returns the output tensor for the contributions for a given shape, e.g., a memory map or a
+                :class:`~aimstools.bandstructures.mulliken_storage.ContributionQuantizer`.
+
+        Returns:
+            tuple: (kpoints, eigenvalues, occupations, contributions) with contributions of shape (natoms, nkpoints, nspins, nstates, ncons).
+        """
+        # Turns out that any attemps to use regex (np.fromregex, re.finditer ...) are much slower in this case than just pure string matching.
+        if nkpoints == None:
+            with open(bandfile, "r") as file:
+                nkpoints = sum([1 for k in file if "k point number" in k])
+        allocate = allocate or (lambda shape: np.zeros(shape, dtype=np.float32))
+        kpoints = np.zeros((nkpoints, 3), dtype=np.float32)
+        contributions = None
+        i = 0
+        for i, (kpoint, block) in enumerate(
+            self.iterate_mlk_bandfile(bandfile, state_range)
+        ):
+            assert i < nkpoints, "Found more k-points than expected in {}.".format(
+                str(bandfile.parts[-1])
+            )
+            out = self.parse_mlk_block(block, nspins)
+            if contributions is None:
+                natoms, _, nstates, ncons = out.shape
+                ncons -= 2
+                logger.debug(
+                    "Found: {:d} kpoints, {:d} states, {:d} spins, {:d} atoms, {:d} contributions.".format(
+                        nkpoints, nstates, nspins, natoms, ncons
+                    )
+                )
+                eigenvalues = np.zeros((nkpoints, nspins, nstates), dtype=np.float32)
+                occupations = np.zeros((nkpoints, nspins, nstates), dtype=np.float32)
+                contributions = allocate((natoms, nkpoints, nspins, nstates, ncons))
+            kpoints[i] = kpoint
+            eigenvalues[i] = out[0, :, :, 0]
+            occupations[i] = out[0, :, :, 1]
+            contributions[:, i] = out[:, :, :, 2:]
+        assert (contributions is not None) and (
+            i + 1 == nkpoints
+        ), "Expected {} k-points in {}, found {}.".format(
+            nkpoints, str(bandfile.parts[-1]), i + 1
+        )
+        return kpoints, eigenvalues, occupations, contributions
+
+    def _read_spectrum(self, bandpath=None):
+        return self.get_mlk_spectrum(bandpath)
 
     def get_mlk_spectrum(self, bandpath=None):
-        bands = self.bands
+        bands = self.get_bands(bandpath)
         atoms = self.structure.copy()
         start = time.time()
         if bandpath != None:
@@ -287,24 +950,20 @@ class MullikenBandStructure(BandStructureBaseClass):
             label_coords.append(label_coords[-1] if len(label_coords) > 0 else 0.0)
             for s1, s2 in zip(segment[:-1], segment[1:]):
                 if (s1, s2) in bands.keys():
-                    data = bands[(s1, s2)].data
-                    kpoints = np.dot(bands[(s1, s2)].kpoints, icell_cv)
-                    energies = data[0, :, :, :, 0]  # (nkpoints, nspins, nstates)
-                    occ = data[0, :, :, :, 1]  # (nkpoints, nspins, nstates)
-                    con = data[
-                        :, :, :, :, 2:
-                    ]  # (natoms, nkpoints, nspins, nstates, [tot, s, p, d, f])
+                    band = bands[(s1, s2)]
+                    kpoints = np.dot(band.kpoints, icell_cv)
+                    energies = band.eigenvalues  # (nkpoints, nspins, nstates)
+                    occ = band.occupations  # (nkpoints, nspins, nstates)
+                    con = (
+                        band.contributions
+                    )  # (natoms, nkpoints, nspins, nstates, [tot, s, p, d, f])
                 elif (s1, s2) in [(k, j) for j, k in bands.keys()]:
-                    data = bands[(s2, s1)].data
-                    kpoints = np.dot(bands[(s2, s1)].kpoints, icell_cv)[::-1]
-                    energies = data[0, :, :, :, 0]  # (nkpoints, nspins, nstates)
-                    energies = np.flip(energies, axis=0)
-                    occ = data[0, :, :, :, 1]  # (nkpoints, nspins, nstates)
-                    occ = np.flip(occ, axis=0)
-                    con = data[
-                        :, :, :, :, 2:
-                    ]  # (natoms, nkpoints, nspins, nstates, [tot, s, p, d, f])
-                    con = np.flip(con, axis=1)
+                    band = bands[(s2, s1)]
+                    kpoints = np.dot(band.kpoints, icell_cv)[::-1]
+                    energies = np.flip(band.eigenvalues, axis=0)
+                    occ = np.flip(band.occupations, axis=0)
+                    # reversed view, no copy
+                    con = band.contributions[:, ::-1]
                 else:
                     raise Exception(
                         "Neither {}-{} nor {}-{} were found.".format(s1, s2, s2, s1)
@@ -326,7 +985,7 @@ class MullikenBandStructure(BandStructureBaseClass):
         kps = np.concatenate(kps, axis=0)
         kpoint_axis = np.concatenate(kpoint_axis, axis=0)
         occs = np.concatenate(occs, axis=0)
-        cons = np.concatenate(contributions, axis=1)
+        cons = ContributionBlocks(contributions)
         spec = MullikenSpectrum(
             atoms,
             kps,
@@ -344,6 +1003,37 @@ class MullikenBandStructure(BandStructureBaseClass):
         )
         return spec
 
+    def get_projected_dos(
+        self,
+        bandpath=None,
+        by="species",
+        window=(-10, 10),
+        npoints=2001,
+        broadening=0.05,
+    ):
+        """Computes the projected density of states along a band path, see :func:`MullikenSpectrum.get_projected_dos`.
+
+        With spin-orbit coupling, only the first spin channel carries contributions. The energies are relative to the Fermi level
+        of the calculation, see :attr:`fermi_level_offset`.
+
+        Args:
+            bandpath (str): Band path string, defaults to the calculated band path.
+
+        Returns:
+            DOSSpectrum: Spectrum that can be passed to :class:`~aimstools.density_of_states.utilities.DOSPlot`.
+        """
+        spectrum, _ = self.get_memoized_spectrum(
+            self.get_mlk_spectrum, bandpath=bandpath
+        )
+        return spectrum.get_projected_dos(
+            by=by,
+            window=window,
+            npoints=npoints,
+            broadening=broadening,
+            spins=[0] if self.soc else None,
+            fermi_level=self.fermi_level_offset,
+        )
+
     def __write_contributions(self):
         arrs = []
         names = []
@@ -418,15 +1108,14 @@ class MullikenBandStructure(BandStructureBaseClass):
         d["window"] = kwargs.pop("window", 3)
         d["mark_fermi_level"] = kwargs.pop("mark_fermi_level", fermi_color)
         d["mark_gap"] = kwargs.pop("mark_gap", True)
+        d["interpolate"] = kwargs.pop("interpolate", False)
+        d["downsample"] = kwargs.pop("downsample", False)
 
         self.set_energy_reference(reference, self.soc)
-        if bandpath != None:
-            spectrum = self.get_mlk_spectrum(bandpath)
-        else:
-            spectrum = self.spectrum
-        vbm, cbm, indirect_gap, direct_gap = self.get_data_from_bandstructure(
-            spectrum, spin=spin
+        spectrum, gaps = self.get_memoized_spectrum(
+            self.get_mlk_spectrum, bandpath=bandpath, spin=spin
         )
+        vbm, cbm, indirect_gap, direct_gap = gaps
 
         ref, shift = self.energy_reference
         fermi_level = self.fermi_level.soc if self.soc else self.fermi_level.scalar
@@ -444,7 +1133,10 @@ class MullikenBandStructure(BandStructureBaseClass):
         m = {}
         m["spin"] = self.spin2index(spin)
         m["mode"] = kwargs.pop("mode", "lines")
-        m["interpolate"] = kwargs.pop("interpolate", False)
+        m["interpolate"] = d["interpolate"]
+        m["downsample"] = d["downsample"]
+        m["min_weight"] = kwargs.pop("min_weight", None)
+        m["cull"] = kwargs.pop("cull", False)
 
         return axargs, kwargs, d, m
 
@@ -564,7 +1256,13 @@ class MullikenBandStructure(BandStructureBaseClass):
         return axes
 
     def plot_majority_contributions(
-        self, list_of_contributions=[], axes=None, colors=[], main=True, **kwargs
+        self,
+        list_of_contributions=[],
+        axes=None,
+        colors=[],
+        threshold=None,
+        main=True,
+        **kwargs
     ):
         axargs, kwargs, bsargs, mlkargs = self._process_kwargs(**kwargs)
         scale_width = mlkargs.pop("scale_width", 2)
@@ -587,16 +1285,29 @@ class MullikenBandStructure(BandStructureBaseClass):
             list_of_contributions
         ), "Number of colors does not match number of contributions."
 
-        con1 = list_of_contributions[0]
-        con = np.zeros(con1.contribution.shape)
-        for i, s, j in np.ndindex(con.shape):
-            # at each kpoint i, each spin s, each state j, compare which value is largest
-            l = [c.contribution[i, s, j] for c in list_of_contributions]
-            k = l.index(max(l))
-            # the index of the largest value is assigned to this point
-            con[i, s, j] = k + 1
-        con = MullikenContribution("Uh?", con, "eeeh")
+        majority = bsargs["spectrum"].get_majority_contribution(
+            list_of_contributions, threshold=threshold
+        )
         symbols = [c.get_latex_symbol() for c in list_of_contributions]
+        return self._plot_majority(
+            majority, colors, symbols, axes, main, axargs, bsargs, mlkargs
+        )
+
+    def _plot_majority(
+        self, majority, colors, labels, axes, main, axargs, bsargs, mlkargs
+    ):
+        # the index of the largest value is assigned to each point, mixed states are shown in gray
+        colors = list(colors)
+        labels = list(labels)
+        if np.any(majority < 0):
+            colors.insert(0, darkgray)
+            labels.insert(0, "mixed")
+            con = majority + 2
+        else:
+            con = majority + 1
+        con = MullikenContribution("Uh?", con, "eeeh")
+        # the indices are categorical and can not be interpolated between k-points
+        mlkargs = dict(mlkargs, interpolate=False)
         cmap = ListedColormap(colors)
         norm = BoundaryNorm(
             [0.5 + j for j in range(len(colors))] + [len(colors) + 0.5], cmap.N
@@ -611,7 +1322,7 @@ class MullikenBandStructure(BandStructureBaseClass):
             axes = mlk.draw()
             clb = plt.colorbar(plt.cm.ScalarMappable(norm=norm, cmap=cmap), ax=axes)
             clb.set_ticks(range(1, len(colors) + 1))
-            clb.set_ticklabels(symbols)
+            clb.set_ticklabels(labels)
 
         return axes
 
@@ -635,60 +1346,38 @@ class MullikenBandStructure(BandStructureBaseClass):
         return axes
 
     def plot_all_angular_momenta(
-        self, symbols="all", max_l="f", axes=None, colors=[], main=True, **kwargs
+        self,
+        symbols="all",
+        max_l="f",
+        axes=None,
+        colors=[],
+        threshold=None,
+        main=True,
+        **kwargs
     ):
         axargs, kwargs, bsargs, mlkargs = self._process_kwargs(**kwargs)
         scale_width = mlkargs.pop("scale_width", 2)
 
         momenta = ("s", "p", "d", "f", "g", "h")
-        momenta = dict(zip(momenta, range(len(momenta))))
-        momenta = {k: v for k, v in momenta.items() if v <= momenta[max_l]}
-
-        if symbols in ["all", "None", None, "All", []]:
-            symbols = set([k.symbol for k in self.structure])
-        else:
-            symbols = set(symbols)
+        momenta = momenta[: momenta.index(max_l) + 1]
 
         if colors == []:
             cmap = plt.cm.get_cmap("tab10")
             colors = [cmap(c) for c in np.linspace(0, 1, 6)]
             colors = colors[: len(momenta)]
 
-        lcons = [
-            self.spectrum.get_group_contribution(symbols, l) for l in momenta.keys()
-        ]
-        con = np.zeros(lcons[0].contribution.shape)
-        for i, s, j in np.ndindex(con.shape):
-            # at each kpoint i, each spin s, each state j, compare which value is largest
-            l = [c.contribution[i, s, j] for c in lcons]
-            k = l.index(max(l))
-            # the index of the largest value is assigned to this point
-            con[i, s, j] = k + 1
-        con = MullikenContribution("Uh?", con, "eeeh")
-
-        cmap = ListedColormap(colors)
-        norm = BoundaryNorm(
-            [0.5 + j for j in range(len(colors))] + [len(colors) + 0.5], cmap.N
+        majority = bsargs["spectrum"].get_majority_angular_momentum(
+            symbols, max_l=max_l, threshold=threshold
+        )
+        return self._plot_majority(
+            majority, colors, momenta, axes, main, axargs, bsargs, mlkargs
         )
-        with AxesContext(ax=axes, main=main, **axargs) as axes:
-            bs = BandStructurePlot(main=main, **bsargs)
-            axes = bs.draw()
-            x, y = bs.xy
-            mlk = MullikenBandStructurePlot(
-                x=x, y=y, con=con, cmap=cmap, norm=norm, scale_width=False, **mlkargs
-            )
-            axes = mlk.draw()
-            clb = plt.colorbar(plt.cm.ScalarMappable(norm=norm, cmap=cmap), ax=axes)
-            clb.set_ticks(range(1, len(colors) + 1))
-            clb.set_ticklabels(list(momenta.keys()))
-
-        return axes
 
     def plot(self, axes=None, color=mutedblack, main=True, **kwargs):
         axargs, kwargs, bsargs, _ = self._process_kwargs(**kwargs)
         with AxesContext(ax=axes, main=main, **axargs) as axes:
             bs = BandStructurePlot(main=main, **bsargs)
             axes = bs.draw()
-            x, y = bs.xy
+            x, y = bs.get_display_xy()
             axes.plot(x, y, color=color, **kwargs)
         return axes
@@ -0,0 +1,553 @@
+from aimstools.misc import *
+
+from pathlib import Path
+import json
+
+import numpy as np
+
+
+class ContributionBlocks:
+    """Segmented, atom-major storage of Mulliken contributions.
+
+    The contributions of every band path segment are kept as a separate block of shape (natoms, nkpoints, nspins, nstates, ncons).
+    A block can be an in-memory array, a read-only memory map, a reversed view of either, or a :class:`QuantizedContributions` or
+    :class:`SparseContributions` block. The blocks are never concatenated as a whole,
+    only the atoms and angular momenta that are requested are materialized.
+
+    Args:
+        blocks (list): List of arrays with shape (natoms, nkpoints, nspins, nstates, ncons).
+
+    """
+
+    def __init__(self, blocks) -> None:
+        self.blocks = list(blocks)
+        assert len(self.blocks) > 0, "At least one block of contributions is needed."
+
+    def __repr__(self):
+        return "{}(nblocks={}, shape={})".format(
+            self.__class__.__name__, len(self.blocks), self.shape
+        )
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def shape(self):
+        natoms, _, nspins, nstates, ncons = self.blocks[0].shape
+        nkpoints = sum([b.shape[1] for b in self.blocks])
+        return (natoms, nkpoints, nspins, nstates, ncons)
+
+    @property
+    def dtype(self):
+        return self.blocks[0].dtype
+
+    @property
+    def nbytes(self):
+        """Number of bytes held in memory, memory-mapped blocks do not count."""
+        return sum([b.nbytes for b in self.blocks if not _is_memmap(b)])
+
+    def take(self, indices, l=0):
+        """Materializes the contributions of the given atoms and angular momentum.
+
+        Args:
+            indices (list): Atom indices.
+            l (int): Index of the angular momentum channel (0 is the total contribution).
+
+        Returns:
+            array: Array of shape (len(indices), nkpoints, nspins, nstates).
+        """
+        indices = np.atleast_1d(indices)
+        con = [np.asarray(b[indices, :, :, :, l]) for b in self.blocks]
+        return np.concatenate(con, axis=1)
+
+    def sum_atoms(self, indices, l=0):
+        """Sums up the contributions of the given atoms block by block.
+
+        Args:
+            indices (list): Atom indices.
+            l (int): Index of the angular momentum channel (0 is the total contribution).
+
+        Returns:
+            array: Array of shape (nkpoints, nspins, nstates).
+        """
+        indices = np.atleast_1d(indices)
+        con = [
+            b.sum_atoms(indices, l)
+            if hasattr(b, "sum_atoms")
+            else np.sum(b[indices, :, :, :, l], axis=0)
+            for b in self.blocks
+        ]
+        return np.concatenate(con, axis=0)
+
+    def reduce_atoms(self, groups, chunksize=32):
+        """Sums up the contributions of groups of atoms for all angular momenta.
+
+        The atoms are sorted by group and read in chunks of chunksize atoms, which are summed with :func:`numpy.add.reduceat`,
+        so that at most one chunk of atoms is materialized per block.
+        Blocks that can reduce themselves, e.g., :class:`SparseContributions`, are reduced without densifying them.
+
+        Args:
+            groups (list): List of non-empty lists of atom indices.
+            chunksize (int): Number of atoms that are read in at once per block.
+
+        Returns:
+            array: Array of shape (len(groups), nkpoints, nspins, nstates, ncons).
+        """
+        groups = [np.atleast_1d(g).astype(int) for g in groups]
+        assert all(len(g) > 0 for g in groups), "Groups of atoms must not be empty."
+        con = [
+            b.reduce_atoms(groups)
+            if hasattr(b, "reduce_atoms")
+            else self._reduce_block(b, groups, chunksize)
+            for b in self.blocks
+        ]
+        return np.concatenate(con, axis=1)
+
+    def _reduce_block(self, block, groups, chunksize):
+        order = np.concatenate(groups)
+        members = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+        out = None
+        for start in range(0, len(order), chunksize):
+            stop = min(start + chunksize, len(order))
+            ids = members[start:stop]
+            # every run of one group within the chunk is summed separately
+            runs = np.flatnonzero(np.diff(ids, prepend=-1))
+            red = np.add.reduceat(np.asarray(block[order[start:stop]]), runs, axis=0)
+            if out is None:
+                out = np.zeros((len(groups),) + red.shape[1:], dtype=red.dtype)
+            out[ids[runs]] += red
+        return out
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = [k is Ellipsis for k in key].index(True)
+            key = key[:i] + (slice(None),) * (6 - len(key)) + key[i + 1 :]
+        key = key + (slice(None),) * (5 - len(key))
+        atoms, kpoints, rest = key[0], key[1], key[2:]
+        axis = 0 if np.ndim(atoms) == 0 and not isinstance(atoms, slice) else 1
+        con = [np.asarray(b[(atoms, slice(None)) + rest]) for b in self.blocks]
+        con = np.concatenate(con, axis=axis)
+        if not (isinstance(kpoints, slice) and kpoints == slice(None)):
+            index = [slice(None)] * con.ndim
+            index[axis] = kpoints
+            con = con[tuple(index)]
+        return con
+
+    def __array__(self, dtype=None):
+        con = np.concatenate([np.asarray(b) for b in self.blocks], axis=1)
+        if dtype is not None:
+            con = con.astype(dtype)
+        return con
+
+
+class QuantizedContributions:
+    """Compact storage of one block of Mulliken contributions as unsigned integers.
+
+    The contributions are stored as multiples of a common scale, so that uint8 resolves steps of 1/255 and uint16 steps of 1/65535
+    of the largest contribution. Trailing angular momentum channels that are zero everywhere, e.g., f, g and h, are not stored at all.
+    Indexing dequantizes to float32 and fills trimmed channels with zeros. Slicing without touching the angular momenta
+    returns another quantized view, so that, e.g., reversed path segments do not copy the data.
+
+    Args:
+        data (array): Integer array of shape (natoms, nkpoints, nspins, nstates, nkept).
+        scale (float): Contribution per integer step.
+        ncons (int): Number of angular momentum channels including trimmed ones.
+
+    """
+
+    def __init__(self, data, scale, ncons) -> None:
+        self.data = data
+        self.scale = scale
+        self.ncons = ncons
+
+    def __repr__(self):
+        return "{}(shape={}, dtype={}, kept={})".format(
+            self.__class__.__name__, self.shape, self.data.dtype, self.data.shape[-1]
+        )
+
+    @property
+    def shape(self):
+        return self.data.shape[:-1] + (self.ncons,)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        return np.dtype(np.float32)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def dequantize(self, key=(slice(None),)):
+        """Returns the contributions at the given index (without the angular momentum axis) as float32 array with all channels."""
+        values = self.data[key]
+        out = np.zeros(values.shape[:-1] + (self.ncons,), dtype=np.float32)
+        np.multiply(values, self.scale, out=out[..., : values.shape[-1]])
+        return out
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = [k is Ellipsis for k in key].index(True)
+            key = key[:i] + (slice(None),) * (self.ndim + 1 - len(key)) + key[i + 1 :]
+        key = key + (slice(None),) * (self.ndim - len(key))
+        rest, l = key[:-1], key[-1]
+        if all(isinstance(k, slice) for k in key) and l == slice(None):
+            return QuantizedContributions(self.data[rest], self.scale, self.ncons)
+        if np.ndim(l) == 0 and not isinstance(l, slice):
+            l = int(l) % self.ncons
+            if l >= self.data.shape[-1]:
+                return np.zeros(self.data[rest + (0,)].shape, dtype=np.float32)
+            return (self.data[rest + (l,)] * self.scale).astype(np.float32)
+        return self.dequantize(rest)[..., l]
+
+    def __array__(self, dtype=None, copy=None):
+        con = self.dequantize()
+        if dtype is not None:
+            con = con.astype(dtype)
+        return con
+
+
+def quantize_contributions(contributions, dtype=np.uint16):
+    """Quantizes one block of Mulliken contributions and trims trailing angular momentum channels that are zero everywhere.
+
+    Args:
+        contributions (array): Array of shape (natoms, nkpoints, nspins, nstates, ncons) with non-negative contributions.
+        dtype (numpy dtype): np.uint8 or np.uint16.
+
+    Returns:
+        QuantizedContributions: Quantized contributions.
+    """
+    dtype = np.dtype(dtype)
+    assert dtype in (np.uint8, np.uint16), "Quantization requires uint8 or uint16."
+    con = np.asarray(contributions)
+    ncons = con.shape[-1]
+    nonzero = np.flatnonzero(np.any(con != 0, axis=tuple(range(con.ndim - 1))))
+    nkept = max(1, int(nonzero[-1]) + 1 if len(nonzero) > 0 else 1)
+    # Mulliken contributions of single atoms can slightly exceed 1
+    scale = max(1.0, float(np.max(con, initial=0.0))) / np.iinfo(dtype).max
+    data = np.empty(con.shape[:-1] + (nkept,), dtype=dtype)
+    np.rint(
+        np.clip(con[..., :nkept] / scale, 0, np.iinfo(dtype).max),
+        out=data,
+        casting="unsafe",
+    )
+    return QuantizedContributions(data, scale, ncons)
+
+
+class ContributionQuantizer:
+    """Output tensor for Mulliken contributions that quantizes every k-point block as soon as it is written.
+
+    It is passed as output tensor to :func:`~aimstools.bandstructures.mulliken_bandstructure.MullikenBandStructure.read_mlk_bandfile`,
+    so that the contributions of a section are never held as float32 array as a whole. The scale starts at 1/255 or 1/65535 as for
+    :func:`quantize_contributions` and only grows if a block exceeds it, in which case the blocks written so far are requantized
+    one atom at a time.
+
+    Args:
+        shape (tuple): Shape (natoms, nkpoints, nspins, nstates, ncons).
+        dtype (numpy dtype): np.uint8 or np.uint16.
+
+    """
+
+    def __init__(self, shape, dtype=np.uint16) -> None:
+        dtype = np.dtype(dtype)
+        assert dtype in (np.uint8, np.uint16), "Quantization requires uint8 or uint16."
+        self.data = np.zeros(shape, dtype=dtype)
+        self.maximum = np.iinfo(dtype).max
+        self.scale = 1.0 / self.maximum
+        self.nonzero = np.zeros(shape[-1], dtype=bool)
+
+    def __repr__(self):
+        return "{}(shape={}, dtype={})".format(
+            self.__class__.__name__, self.shape, self.data.dtype
+        )
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __setitem__(self, key, values):
+        values = np.asarray(values, dtype=np.float32)
+        largest = float(np.max(values, initial=0.0))
+        if largest > self.scale * self.maximum:
+            # Mulliken contributions of single atoms can slightly exceed 1
+            scale = largest / self.maximum
+            for atom in self.data:
+                np.rint(atom * (self.scale / scale), out=atom, casting="unsafe")
+            self.scale = scale
+        self.nonzero |= np.any(values != 0, axis=tuple(range(values.ndim - 1)))
+        self.data[key] = np.rint(np.clip(values / self.scale, 0, self.maximum))
+
+    def quantized(self):
+        """Returns the written contributions as :class:`QuantizedContributions` with trailing zero channels trimmed."""
+        ncons = self.data.shape[-1]
+        nonzero = np.flatnonzero(self.nonzero)
+        nkept = max(1, int(nonzero[-1]) + 1 if len(nonzero) > 0 else 1)
+        data = self.data if nkept == ncons else self.data[..., :nkept].copy()
+        return QuantizedContributions(data, self.scale, ncons)
+
+
+class SparseContributions:
+    """Sparse storage of one block of Mulliken contributions for large systems.
+
+    The contributions are stored as CSR matrix with one row per state and k-point and one column per atom and angular momentum,
+    where all contributions of an atom to a state are dropped if its total contribution is below the drop tolerance.
+    Sums over groups of atoms are sparse matrix products. Indexing materializes only the requested atoms as dense float32 array.
+    Slicing without touching the angular momenta returns another sparse block, so that, e.g., reversed path segments stay sparse.
+
+    Args:
+        matrix (csr_matrix): Matrix of shape (nkpoints * nspins * nstates, natoms * ncons).
+        shape (tuple): Dense shape (natoms, nkpoints, nspins, nstates, ncons).
+
+    """
+
+    def __init__(self, matrix, shape) -> None:
+        self.matrix = matrix
+        self._shape = tuple(shape)
+
+    def __repr__(self):
+        return "{}(shape={}, density={:.4f})".format(
+            self.__class__.__name__, self.shape, self.density
+        )
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        return np.dtype(np.float32)
+
+    @property
+    def nbytes(self):
+        m = self.matrix
+        return m.data.nbytes + m.indices.nbytes + m.indptr.nbytes
+
+    @property
+    def density(self):
+        """Fraction of stored entries."""
+        return self.matrix.nnz / max(1, np.prod(self.shape))
+
+    def _select(self, rows, atoms):
+        # (natoms, nkpoints, nspins, nstates) -> row and column indices
+        natoms, nkpoints, nspins, nstates, ncons = self.shape
+        rows = np.arange(nkpoints * nspins * nstates).reshape(
+            nkpoints, nspins, nstates
+        )[rows]
+        columns = np.arange(natoms * ncons).reshape(natoms, ncons)[atoms]
+        return rows, columns
+
+    def dense(self, atoms=slice(None)):
+        """Returns the contributions of the given atoms as dense float32 array of shape (natoms, nkpoints, nspins, nstates, ncons)."""
+        natoms, nkpoints, nspins, nstates, ncons = self.shape
+        atoms = np.atleast_1d(np.arange(natoms)[atoms])
+        columns = (atoms[:, None] * ncons + np.arange(ncons)).ravel()
+        con = self.matrix[:, columns].toarray().astype(np.float32, copy=False)
+        con = con.reshape(nkpoints, nspins, nstates, len(atoms), ncons)
+        return np.moveaxis(con, 3, 0)
+
+    def reduce_atoms(self, groups):
+        """Sums up the contributions of groups of atoms for all angular momenta with one sparse matrix product.
+
+        Args:
+            groups (list): List of non-empty lists of atom indices.
+
+        Returns:
+            array: Array of shape (len(groups), nkpoints, nspins, nstates, ncons).
+        """
+        from scipy.sparse import csr_matrix
+
+        natoms, nkpoints, nspins, nstates, ncons = self.shape
+        groups = [np.atleast_1d(g).astype(int) for g in groups]
+        atoms = np.concatenate(groups)
+        group = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+        # (natoms * ncons, ngroups * ncons) with ones where atom and l belong to group and l
+        rows = (atoms[:, None] * ncons + np.arange(ncons)).ravel()
+        columns = (group[:, None] * ncons + np.arange(ncons)).ravel()
+        summation = csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+            shape=(natoms * ncons, len(groups) * ncons),
+        )
+        con = np.asarray((self.matrix @ summation).todense(), dtype=np.float32)
+        con = con.reshape(nkpoints, nspins, nstates, len(groups), ncons)
+        return np.moveaxis(con, 3, 0)
+
+    def sum_atoms(self, indices, l=0):
+        """Sums up the contributions of the given atoms for one angular momentum.
+
+        Returns:
+            array: Array of shape (nkpoints, nspins, nstates).
+        """
+        return self.reduce_atoms([indices])[0, ..., l]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = [k is Ellipsis for k in key].index(True)
+            key = key[:i] + (slice(None),) * (self.ndim + 1 - len(key)) + key[i + 1 :]
+        key = key + (slice(None),) * (self.ndim - len(key))
+        if all(isinstance(k, slice) for k in key) and key[-1] == slice(None):
+            rows, columns = self._select(key[1:4], key[0])
+            matrix = self.matrix[rows.ravel()][:, columns.ravel()]
+            shape = (columns.shape[0],) + rows.shape + (self.shape[-1],)
+            return SparseContributions(matrix.tocsr(), shape)
+        con = self.dense(key[0])
+        if np.ndim(key[0]) == 0 and not isinstance(key[0], slice):
+            return con[0][key[1:]]
+        return con[(slice(None),) + key[1:]]
+
+    def __array__(self, dtype=None, copy=None):
+        con = self.dense()
+        if dtype is not None:
+            con = con.astype(dtype)
+        return con
+
+
+def sparsify_contributions(contributions, tolerance=1e-3):
+    """Converts one block of Mulliken contributions to sparse storage.
+
+    Args:
+        contributions (array): Array of shape (natoms, nkpoints, nspins, nstates, ncons).
+        tolerance (float): All contributions of an atom to a state are dropped if its total contribution is below this value.
+
+    Returns:
+        SparseContributions: Sparse contributions.
+    """
+    from scipy.sparse import csr_matrix
+
+    con = np.asarray(contributions)
+    natoms, nkpoints, nspins, nstates, ncons = con.shape
+    # (nkpoints * nspins * nstates, natoms, ncons)
+    con = np.moveaxis(con, 0, 3).reshape(-1, natoms, ncons)
+    con = np.where((con[..., :1] >= tolerance), con, 0).astype(np.float32)
+    matrix = csr_matrix(con.reshape(-1, natoms * ncons))
+    matrix.eliminate_zeros()
+    return SparseContributions(matrix, (natoms, nkpoints, nspins, nstates, ncons))
+
+
+def _is_memmap(array):
+    return isinstance(array, np.memmap) or isinstance(
+        getattr(array, "base", None), np.memmap
+    )
+
+
+def _metadata_matches(metadata, reference):
+    return all(metadata.get(k) == v for k, v in reference.items())
+
+
+def get_cache_metadata(bandfile, **kwargs):
+    """Returns the metadata that identifies a cached bandmlk file."""
+    bandfile = Path(bandfile)
+    stat = bandfile.stat()
+    metadata = {
+        "source": str(bandfile.parts[-1]),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+    metadata.update(kwargs)
+    # tuples are stored as lists, this makes the comparison with cached entries consistent
+    return json.loads(json.dumps(metadata))
+
+
+def get_cache_file(cachedir, metadata):
+    """ Returns the path of the atom-major .npy file holding the contributions of a cached bandmlk file."""
+    stem = Path(metadata["source"]).stem
+    return Path(cachedir).joinpath(stem + ".contributions.npy")
+
+
+def open_cache_memmap(cachedir, metadata, shape, dtype=np.float32):
+    """Creates a writable memory map in the cache directory, so that a parser can write into it directly.
+
+    Args:
+        cachedir (pathlib object): Cache directory.
+        metadata (dict): Metadata identifying the source file and parsing options.
+        shape (tuple): Shape of the contributions (natoms, nkpoints, nspins, nstates, ncons).
+
+    Returns:
+        memmap: Writable memory map of the contributions.
+    """
+    Path(cachedir).mkdir(parents=True, exist_ok=True)
+    npy = get_cache_file(cachedir, metadata)
+    # The metadata is removed first, so that an interrupted parser does not leave a valid cache entry.
+    Path(cachedir).joinpath(npy.name.replace(".contributions.npy", ".json")).unlink(
+        missing_ok=True
+    )
+    return np.lib.format.open_memmap(npy, mode="w+", dtype=dtype, shape=shape)
+
+
+def write_cache(cachedir, band, metadata):
+    """Writes one parsed bandmlk segment to the cache directory.
+
+    The contributions are stored as atom-major .npy file, which is read back as memory map. If the contributions were already
+    written into a memory map of the cache directory, they are only flushed. K-points,
+    eigenvalues and occupations are small and are stored in a compressed .npz file next to it.
+
+    Args:
+        cachedir (pathlib object): Cache directory.
+        band (namedtuple): Band with kpoints, eigenvalues, occupations and contributions.
+        metadata (dict): Metadata identifying the source file and parsing options.
+
+    Returns:
+        array: Read-only memory map of the contributions.
+    """
+    cachedir = Path(cachedir)
+    cachedir.mkdir(parents=True, exist_ok=True)
+    stem = Path(metadata["source"]).stem
+    npy = get_cache_file(cachedir, metadata)
+    con = band.contributions
+    if isinstance(con, np.memmap) and Path(con.filename) == npy.resolve():
+        con.flush()
+    else:
+        out = np.lib.format.open_memmap(
+            npy, mode="w+", dtype=con.dtype, shape=con.shape
+        )
+        out[:] = con
+        out.flush()
+        del out
+    np.savez_compressed(
+        cachedir.joinpath(stem + ".npz"),
+        kpoints=band.kpoints,
+        eigenvalues=band.eigenvalues,
+        occupations=band.occupations,
+    )
+    with open(cachedir.joinpath(stem + ".json"), "w") as file:
+        json.dump(metadata, file, indent=2)
+    return np.load(npy, mmap_mode="r")
+
+
+def read_cache(cachedir, metadata):
+    """Reads one bandmlk segment from the cache directory.
+
+    Args:
+        cachedir (pathlib object): Cache directory.
+        metadata (dict): Metadata that has to match the cached metadata.
+
+    Returns:
+        tuple: (kpoints, eigenvalues, occupations, contributions) or None if there is no matching cache entry.
+    """
+    cachedir = Path(cachedir)
+    stem = Path(metadata["source"]).stem
+    files = [
+        cachedir.joinpath(stem + k) for k in (".json", ".npz", ".contributions.npy")
+    ]
+    if not all(k.exists() for k in files):
+        return None
+    with open(files[0], "r") as file:
+        cached = json.load(file)
+    if not _metadata_matches(cached, metadata):
+        logger.debug("Cache of {} is outdated.".format(metadata["source"]))
+        return None
+    data = np.load(files[1])
+    contributions = np.load(files[2], mmap_mode="r")
+    return (data["kpoints"], data["eigenvalues"], data["occupations"], contributions)
@@ -21,7 +21,6 @@ class RegularBandStructure(BandStructureBaseClass):
             bandfiles = self.get_bandfiles(spin="none", soc=soc)
             bandfiles = bandfiles.regular
             self.bands = self.read_bandfiles(zip(bandfiles, bandfiles))
-            self.spectrum = self.get_spectrum()
         else:
             if soc:
                 logger.warning(
@@ -30,47 +29,86 @@ class RegularBandStructure(BandStructureBaseClass):
             bandfiles_dn = self.get_bandfiles(spin="dn", soc=soc).regular
             bandfiles_up = self.get_bandfiles(spin="up", soc=soc).regular
             self.bands = self.read_bandfiles(zip(bandfiles_dn, bandfiles_up))
-            self.spectrum = self.get_spectrum()
 
     def __repr__(self):
         return "{}(outputfile={}, spin_orbit_coupling={})".format(
             self.__class__.__name__, repr(self.outputfile), self.soc
         )
 
+    def read_bandfile(self, bandfile):
+        """Reads one band file.
+
+        Args:
+            bandfile (pathlib object): Band file with lines of index, k1, k2, k3, occ, ev, occ, ev ...
+
+        Returns:
+            array: Array of shape (nkpoints, ncolumns).
+        """
+        return np.loadtxt(bandfile, ndmin=2)
+
     def read_bandfiles(self, bandfiles):
-        bands = {}
-        b = namedtuple("band", ["kpoints", "occupations", "eigenvalues"])
+        """Registers the band files of all sections, so that every section is only read in when it is accessed for the first time.
+
+        Every section is stored once. The reversed section is a zero-copy view with negative strides.
+
+        Args:
+            bandfiles (iterable): Pairs of band files (spin down, spin up) per section.
+
+        Returns:
+            LazyObjects: Bands with kpoints, occupations and eigenvalues per pair of section symbols.
+        """
+        bands = LazyObjects()
         nspins = 2 if self.spin == "collinear" else 1
-        for section, bandfile in zip(self.band_sections, bandfiles):
-            ev, occ, rocc, revs = [], [], [], []
-            for s in range(nspins):
-                bf = bandfile[s]
-                # index, k1, k2, k3, occ, ev, occ, ev ...
-                data = np.loadtxt(bf)[:, 1:]
-                points = data[:, :3]
-                occupations = data[:, 3:-2:2]
-                eigenvalues = data[:, 4:-1:2]
-                rpoints = points[::-1].copy()
-                roccs = occupations[::-1].copy()
-                reigvs = eigenvalues[::-1].copy()
-                ev.append(eigenvalues)
-                revs.append(reigvs)
-                occ.append(occupations)
-                rocc.append(roccs)
-            ev = np.stack(ev, axis=1)
-            occ = np.stack(occ, axis=1)
-            rocc = np.stack(rocc, axis=1)
-            revs = np.stack(revs, axis=1)
-            band_forward = b(points, occ, ev)
-            band_backward = b(rpoints, rocc, revs)
+        for section, files in zip(self.band_sections, bandfiles):
             pathsegment = (section.symbol1, section.symbol2)
             pathsegment_r = (section.symbol2, section.symbol1)
-            bands[pathsegment] = band_forward
-            bands[pathsegment_r] = band_backward
+            bands.register(
+                pathsegment, lambda files=files[:nspins]: self.read_section(files)
+            )
+            bands.register(
+                pathsegment_r,
+                lambda key=pathsegment: self.reverse_band(bands.get(key)),
+            )
         return bands
 
+    def read_section(self, bandfiles):
+        """Reads the band files of one section.
+
+        Args:
+            bandfiles (list): Band files of the section, one per spin channel.
+
+        Returns:
+            namedtuple: Band with kpoints, occupations and eigenvalues.
+        """
+        b = namedtuple("band", ["kpoints", "occupations", "eigenvalues"])
+        # index, k1, k2, k3, occ, ev, occ, ev ...
+        spins = [self.read_bandfile(bf)[:, 1:] for bf in bandfiles]
+        points = spins[-1][:, :3].copy()
+        occ = np.stack([d[:, 3:-2:2] for d in spins], axis=1)
+        ev = np.stack([d[:, 4:-1:2] for d in spins], axis=1)
+        return b(points, occ, ev)
+
+    def reverse_band(self, band):
+        """Returns a reversed, zero-copy view of a band."""
+        return band._replace(
+            kpoints=band.kpoints[::-1],
+            occupations=band.occupations[::-1],
+            eigenvalues=band.eigenvalues[::-1],
+        )
+
+    def load_bands(self, segments):
+        """Reads the band files of the given segments, segments that have been read before are skipped.
+
+        Args:
+            segments (list): Pairs of section symbols.
+        """
+        for s in dict.fromkeys(segments):
+            if not self.bands.is_constructed(s):
+                self.bands.get(s)
+
     def get_spectrum(self, bandpath=None):
         bands = self.bands
+        self.load_bands(self.get_bandpath_segments(bandpath))
         if bandpath != None:
             bp = parse_path_string(self.get_bandpath(bandpath).path)
         else:
@@ -136,15 +174,14 @@ class RegularBandStructure(BandStructureBaseClass):
         d["window"] = kwargs.pop("window", 3)
         d["mark_fermi_level"] = kwargs.pop("mark_fermi_level", fermi_color)
         d["mark_gap"] = kwargs.pop("mark_gap", True)
+        d["interpolate"] = kwargs.pop("interpolate", False)
+        d["downsample"] = kwargs.pop("downsample", False)
 
         self.set_energy_reference(reference, self.soc)
-        if bandpath != None:
-            spectrum = self.get_spectrum(bandpath)
-        else:
-            spectrum = self.spectrum
-        vbm, cbm, indirect_gap, direct_gap = self.get_data_from_bandstructure(
-            spectrum, spin=spin
+        spectrum, gaps = self.get_memoized_spectrum(
+            self.get_spectrum, bandpath=bandpath, spin=spin
         )
+        vbm, cbm, indirect_gap, direct_gap = gaps
         ref, shift = self.energy_reference
         fermi_level = self.fermi_level.soc if self.soc else self.fermi_level.scalar
 
@@ -165,6 +202,6 @@ class RegularBandStructure(BandStructureBaseClass):
         with AxesContext(ax=axes, main=main, **axargs) as axes:
             bs = BandStructurePlot(main=main, **bsargs)
             axes = bs.draw()
-            x, y = bs.xy
+            x, y = bs.get_display_xy()
             axes.plot(x, y, color=color, **kwargs)
         return axes
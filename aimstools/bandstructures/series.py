@@ -0,0 +1,399 @@
+from aimstools.misc import *
+from aimstools.bandstructures.regular_bandstructure import RegularBandStructure
+from aimstools.bandstructures.effective_masses import get_path_segments
+from aimstools.bandstructures import effective_masses
+
+from collections import namedtuple
+
+import numpy as np
+
+
+def interpolate_segment(t_new, t_old, values):
+    """Linearly interpolates values along one path segment.
+
+    Repeated coordinates, e.g., of segments of zero length, only keep their first value.
+
+    Args:
+        t_new (array): Fractional coordinates along the segment in [0, 1] of shape (nnew,).
+        t_old (array): Non-decreasing fractional coordinates of the values of shape (nold,).
+        values (array): Values of shape (nold, ...).
+
+    Returns:
+        array: Interpolated values of shape (nnew, ...).
+    """
+    t_old, index = np.unique(t_old, return_index=True)
+    values = values[index]
+    if len(t_old) < 2:
+        return np.repeat(values[:1], len(t_new), axis=0)
+    j = np.clip(np.searchsorted(t_old, t_new, side="right") - 1, 0, len(t_old) - 2)
+    w = (t_new - t_old[j]) / (t_old[j + 1] - t_old[j])
+    w = w.reshape((-1,) + (1,) * (values.ndim - 1))
+    return values[j] * (1 - w) + values[j + 1] * w
+
+
+def read_spectrum(outputfile, soc=False, bandpath=None):
+    """Reads the spectrum of one calculation, e.g., in a worker process.
+
+    Args:
+        outputfile (str): Output file or directory.
+        soc (bool): Read the band structure with spin-orbit coupling.
+        bandpath (str): Band path string, defaults to the calculated band path.
+
+    Returns:
+        dict: Fields of the spectrum, structure, Fermi level and calculated band path, which can be sent between processes.
+    """
+    bs = RegularBandStructure(outputfile, soc=soc)
+    return get_spectrum_data(bs, bandpath)
+
+
+def get_spectrum_data(bandstructure, bandpath=None):
+    """Collects the spectrum of a band structure object together with the metadata of its calculation.
+
+    Args:
+        bandstructure (RegularBandStructure): Band structure object.
+        bandpath (str): Band path string, defaults to the calculated band path.
+
+    Returns:
+        dict: Fields of the spectrum, structure, Fermi level and calculated band path.
+    """
+    bs = bandstructure
+    spectrum, _ = bs.get_memoized_spectrum(bs.get_spectrum, bandpath=bandpath)
+    return {
+        "spectrum": dict(spectrum._asdict()),
+        "structure": bs.structure,
+        "fermi_level": bs.fermi_level.soc if bs.soc else bs.fermi_level.scalar,
+        "bandpath": bs.bandpath.path,
+    }
+
+
+class BandStructureSeries:
+    """Series of band structures of the same system, e.g., under strain, electric fields or for different compositions.
+
+    The band files of the calculations are read in parallel and aligned on the band path of the first calculation. Path segments with a different
+    number of k-points are interpolated onto the fractional coordinates of the reference segments, so that, e.g., strained cells with
+    different k-point distances share one k-point axis. States are aligned at the valence band edge, so that calculations with a
+    different number of states can be stacked as well. Eigenvalues and occupations are stored in arrays of shape (ncalc, nkpoints, nspins, nstates).
+
+    >>> from aimstools.bandstructures import BandStructureSeries
+    >>> series = BandStructureSeries(["strain_0.00", "strain_0.01", "strain_0.02"], parameters=[0.0, 0.01, 0.02])
+    >>> series.get_band_edges()
+    >>> series.get_trends()
+    >>> series.get_mass_trends()
+
+    The tables are returned as pandas DataFrames, see :func:`~aimstools.bandstructures.band_statistics.get_band_statistics`.
+
+    Parsing the band files holds the GIL, so the output and band files of different calculations are read in a process pool
+    and only the spectra, structures and Fermi levels are sent back. Every output file is parsed once. Band structure objects
+    that are passed in are read in the current process. The structures and Fermi levels are kept as structures and fermi_levels.
+    On platforms that spawn processes, scripts that create a series need an ``if __name__ == "__main__":`` guard.
+
+    Args:
+        calculations (list or dict): Output files or directories, or band structure objects. A dictionary maps names to either.
+        parameters (list): Value of the scanned parameter of every calculation, e.g., the strain. Defaults to 0, 1, 2 ...
+        soc (bool): Read the band structures with spin-orbit coupling.
+        bandpath (str): Band path string, defaults to the calculated band path of the first calculation.
+        reference (str): Energy reference, "fermi level" or "VBM" of every calculation.
+        max_workers (int): Number of processes to read in the band files, defaults to the number of CPUs.
+
+    """
+
+    def __init__(
+        self,
+        calculations,
+        parameters=None,
+        soc=False,
+        bandpath=None,
+        reference="fermi level",
+        max_workers=None,
+    ) -> None:
+        if not isinstance(calculations, dict):
+            calculations = {
+                str(getattr(c, "outputfile", c)): c for c in list(calculations)
+            }
+        assert len(calculations) > 0, "At least one calculation is needed."
+        self.names = list(calculations.keys())
+        self.parameters = np.asarray(
+            np.arange(len(self.names)) if parameters is None else parameters,
+            dtype=float,
+        )
+        assert len(self.parameters) == len(
+            self.names
+        ), "Every calculation needs a parameter."
+        self.soc = soc
+        assert reference in [
+            "fermi level",
+            "VBM",
+        ], "Energy reference {} not recognized.".format(reference)
+        self.reference = reference
+        data = self.__read_spectra(list(calculations.values()), bandpath, max_workers)
+        self.structures = [d["structure"] for d in data]
+        self.fermi_levels = np.array([d["fermi_level"] for d in data], dtype=float)
+        self.bandpath = bandpath or data[0]["bandpath"]
+        spectra = [
+            namedtuple("spectrum", d["spectrum"].keys())(**d["spectrum"]) for d in data
+        ]
+        self.__stack_spectra(spectra)
+
+    def __read_spectra(self, calculations, bandpath, max_workers):
+        from concurrent.futures import ProcessPoolExecutor
+        import os
+
+        # every output file is only parsed once, in a worker process if there is more than one
+        data = [None] * len(calculations)
+        files = [
+            i for i, c in enumerate(calculations) if not hasattr(c, "get_spectrum")
+        ]
+        nworkers = min(max_workers or os.cpu_count() or 1, len(files))
+        if nworkers > 1:
+            with ProcessPoolExecutor(max_workers=nworkers) as pool:
+                results = pool.map(
+                    read_spectrum,
+                    [calculations[i] for i in files],
+                    [self.soc] * len(files),
+                    [bandpath] * len(files),
+                )
+                for i, d in zip(files, results):
+                    data[i] = d
+        for i, c in enumerate(calculations):
+            if data[i] is not None:
+                continue
+            if hasattr(c, "get_spectrum"):
+                data[i] = get_spectrum_data(c, bandpath)
+            else:
+                data[i] = read_spectrum(c, self.soc, bandpath)
+        return data
+
+    def __repr__(self):
+        return "{}(ncalculations={}, bandpath={}, reference={})".format(
+            self.__class__.__name__, len(self.names), self.bandpath, self.reference
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def __stack_spectra(self, spectra):
+        ref = spectra[0]
+        segments = get_path_segments(ref.kpoint_axis)
+        evs, occs, kps = [], [], []
+        for spectrum in spectra:
+            other = get_path_segments(spectrum.kpoint_axis)
+            assert len(other) == len(
+                segments
+            ), "The calculations do not share the same band path."
+            ev, occ, kp = [], [], []
+            for s_ref, s in zip(segments, other):
+                x_ref = ref.kpoint_axis[s_ref]
+                x = spectrum.kpoint_axis[s]
+                if len(s) == len(s_ref):
+                    ev.append(spectrum.eigenvalues[s])
+                    occ.append(spectrum.occupations[s])
+                    kp.append(spectrum.kpoints[s])
+                    continue
+                t_ref = (x_ref - x_ref[0]) / max(x_ref[-1] - x_ref[0], 1e-12)
+                t = (x - x[0]) / max(x[-1] - x[0], 1e-12)
+                ev.append(interpolate_segment(t_ref, t, spectrum.eigenvalues[s]))
+                occ.append(interpolate_segment(t_ref, t, spectrum.occupations[s]))
+                kp.append(interpolate_segment(t_ref, t, spectrum.kpoints[s]))
+            evs.append(np.concatenate(ev, axis=0))
+            occs.append(np.concatenate(occ, axis=0))
+            kps.append(np.concatenate(kp, axis=0))
+        nspins = {e.shape[1] for e in evs}
+        assert len(nspins) == 1, "The calculations differ in their spin treatment."
+        # states are aligned at the highest state that is occupied at any k-point
+        nvbs = [
+            int(np.max(np.nonzero(np.any(o >= 1e-4, axis=(0, 1)))[0], initial=-1)) + 1
+            for o in occs
+        ]
+        nbelow = min(nvbs)
+        nabove = min(e.shape[2] - n for e, n in zip(evs, nvbs))
+        states = [slice(n - nbelow, n + nabove) for n in nvbs]
+        self.state_offsets = np.array([s.start for s in states], dtype=int)
+        self.eigenvalues = np.stack([e[..., s] for e, s in zip(evs, states)], axis=0)
+        self.occupations = np.stack([o[..., s] for o, s in zip(occs, states)], axis=0)
+        self.kpoints = np.stack(kps, axis=0)
+        self.kpoint_axis = np.asarray(ref.kpoint_axis)
+        self.label_coords = ref.label_coords
+        self.kpoint_labels = ref.kpoint_labels
+        self.jumps = ref.jumps
+        if self.reference == "VBM":
+            occupied = self.occupations >= 1e-4
+            vbm = np.where(occupied, self.eigenvalues, -np.inf).max(axis=(1, 2, 3))
+            self.eigenvalues = self.eigenvalues - vbm[:, None, None, None]
+
+    def get_band_edges(self):
+        """Finds band edges and band gaps of all calculations and spin channels at once.
+
+        States are counted as occupied if their occupation is at least 1e-4. Gaps are NaN if bands cross the Fermi level.
+
+        Returns:
+            DataFrame: One row per calculation and spin channel with the columns calculation, parameter, spin, vbm, vbm_index,
+            vbm_label, cbm, cbm_index, cbm_label, gap, direct_gap and direct_index.
+        """
+        import pandas as pd
+
+        occupied = self.occupations >= 1e-4
+        # (ncalc, nkpoints, nspins)
+        vbs = np.where(occupied, self.eigenvalues, -np.inf).max(axis=3)
+        cbs = np.where(occupied, np.inf, self.eigenvalues).min(axis=3)
+        ivbm, icbm = np.argmax(vbs, axis=1), np.argmin(cbs, axis=1)
+        vbm, cbm = np.max(vbs, axis=1), np.min(cbs, axis=1)
+        idirect = np.argmin(cbs - vbs, axis=1)
+        direct = np.min(cbs - vbs, axis=1)
+        crossing = np.any(occupied, axis=1) & np.any(~occupied, axis=1)
+        # metals and calculations without unoccupied states have no gap
+        undefined = np.any(crossing, axis=-1) | ~np.isfinite(cbm - vbm) | ~(cbm > vbm)
+        gap = np.where(undefined, np.nan, cbm - vbm)
+        direct = np.where(undefined, np.nan, direct)
+        labels = np.full(len(self.kpoint_axis), "", dtype=object)
+        for coord, label in zip(self.label_coords, self.kpoint_labels):
+            labels[np.isclose(self.kpoint_axis, coord, atol=1e-6)] = label
+        ncalc, nspins = vbm.shape
+        calc, spin = np.indices((ncalc, nspins))
+        return pd.DataFrame(
+            {
+                "calculation": np.array(self.names, dtype=object)[calc.ravel()],
+                "parameter": self.parameters[calc.ravel()],
+                "spin": spin.ravel(),
+                "vbm": vbm.ravel(),
+                "vbm_index": ivbm.ravel(),
+                "vbm_label": labels[ivbm.ravel()],
+                "cbm": cbm.ravel(),
+                "cbm_index": icbm.ravel(),
+                "cbm_label": labels[icbm.ravel()],
+                "gap": gap.ravel(),
+                "direct_gap": direct.ravel(),
+                "direct_index": idirect.ravel(),
+            }
+        )
+
+    def get_effective_masses(self, window=None, npoints=3, model="parabolic"):
+        """Fits effective masses at the band edges of all calculations.
+
+        Every calculation is fitted on its own Cartesian k-points, so that changes of the cell enter the masses.
+        See :func:`~aimstools.bandstructures.effective_masses.get_effective_masses` for details.
+
+        Args:
+            window (tuple): Energy window in eV for additional extrema.
+            npoints (int): Number of k-points on each side of an extremum that enter the fit.
+            model (str): "parabolic" or "hyperbolic".
+
+        Returns:
+            DataFrame: One row per calculation, extremum and fit direction with the columns calculation, parameter, kind, spin, state,
+            kpoint_index, energy, direction, direction_x, direction_y, direction_z, mass and nonparabolicity. The direction is the
+            index of the fit direction through the extremum, which is fixed by the band path.
+        """
+        import pandas as pd
+
+        tables = []
+        for i, name in enumerate(self.names):
+            em = effective_masses.get_effective_masses(
+                self.kpoints[i],
+                self.kpoint_axis,
+                self.eigenvalues[i],
+                self.occupations[i],
+                window=window,
+                npoints=npoints,
+                model=model,
+            )
+            extremum, direction = np.nonzero(np.isfinite(em.masses))
+            tables.append(
+                pd.DataFrame(
+                    {
+                        "calculation": name,
+                        "parameter": self.parameters[i],
+                        "kind": em.kind[extremum],
+                        "spin": em.spin[extremum],
+                        "state": em.state[extremum] + self.state_offsets[i],
+                        "kpoint_index": em.kpoint_index[extremum],
+                        "energy": em.energy[extremum],
+                        "direction": direction,
+                        "direction_x": em.directions[extremum, direction, 0],
+                        "direction_y": em.directions[extremum, direction, 1],
+                        "direction_z": em.directions[extremum, direction, 2],
+                        "mass": em.masses[extremum, direction],
+                        "nonparabolicity": em.nonparabolicity[extremum, direction],
+                    }
+                )
+            )
+        return pd.concat(tables, ignore_index=True)
+
+    def get_trends(self, quantities=("vbm", "cbm", "gap", "direct_gap"), degree=1):
+        """Fits polynomials of the band edges and gaps against the parameters of the series.
+
+        All quantities and spin channels are fitted with one call to :func:`numpy.polyfit`. For a strain scan with degree 1,
+        the slopes of the gaps are the deformation potentials. Trends of the effective masses are fitted by :func:`get_mass_trends`.
+
+        Args:
+            quantities (tuple): Columns of :func:`get_band_edges`.
+            degree (int): Degree of the polynomials.
+
+        Returns:
+            DataFrame: One row per quantity and spin channel with the polynomial coefficients c0, c1 ... in increasing order.
+        """
+        import pandas as pd
+
+        edges = self.get_band_edges()
+        nspins = self.eigenvalues.shape[2]
+        ncalc = len(self.names)
+        # (ncalc, nquantities * nspins)
+        values = np.stack(
+            [edges[q].to_numpy().reshape(ncalc, nspins) for q in quantities], axis=1
+        ).reshape(ncalc, -1)
+        coefficients = self.__fit_polynomials(values, degree)
+        quantity, spin = np.indices((len(quantities), nspins))
+        table = pd.DataFrame(
+            {
+                "quantity": np.array(quantities, dtype=object)[quantity.ravel()],
+                "spin": spin.ravel(),
+            }
+        )
+        for i, c in enumerate(coefficients):
+            table["c{}".format(i)] = c
+        return table
+
+    def get_mass_trends(self, degree=1, window=None, npoints=3, model="parabolic"):
+        """Fits polynomials of the effective masses against the parameters of the series.
+
+        Masses are grouped by kind, spin, state, k-point and fit direction, see :func:`get_effective_masses`. States are counted
+        as in the first calculation. All groups that are found in every calculation are fitted with one call to :func:`numpy.polyfit`,
+        the coefficients of the other groups are NaN, e.g., if the valence band maximum moves to another k-point.
+
+        Args:
+            degree (int): Degree of the polynomials.
+            window (tuple): Energy window in eV for additional extrema.
+            npoints (int): Number of k-points on each side of an extremum that enter the fit.
+            model (str): "parabolic" or "hyperbolic".
+
+        Returns:
+            DataFrame: One row per group with the columns kind, spin, state, kpoint_index, direction, direction_x, direction_y and
+            direction_z of the first calculation that has the group, and the polynomial coefficients c0, c1 ... in increasing order.
+        """
+        masses = self.get_effective_masses(window=window, npoints=npoints, model=model)
+        offsets = dict(zip(self.names, self.state_offsets - self.state_offsets[0]))
+        masses["state"] = masses["state"] - masses["calculation"].map(offsets)
+        keys = ["kind", "spin", "state", "kpoint_index", "direction"]
+        # (ngroups, ncalc)
+        values = masses.pivot_table(
+            index=keys, columns="calculation", values="mass", aggfunc="first"
+        ).reindex(columns=self.names)
+        coefficients = self.__fit_polynomials(values.to_numpy().T, degree)
+        directions = ["direction_x", "direction_y", "direction_z"]
+        table = masses.groupby(keys)[directions].first().loc[values.index]
+        table = table.reset_index()
+        for i, c in enumerate(coefficients):
+            table["c{}".format(i)] = c
+        return table
+
+    def __fit_polynomials(self, values, degree):
+        # columns with missing values are not fitted
+        ncalc = len(self.names)
+        assert (
+            ncalc > degree
+        ), "Not enough calculations for polynomials of degree {}.".format(degree)
+        valid = np.all(np.isfinite(values), axis=0)
+        coefficients = np.full((degree + 1, values.shape[1]), np.nan)
+        if np.any(valid):
+            coefficients[:, valid] = np.polyfit(
+                self.parameters, values[:, valid], degree
+            )[::-1]
+        return coefficients
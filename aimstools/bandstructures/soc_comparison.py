@@ -0,0 +1,234 @@
+from aimstools.misc import *
+from aimstools.bandstructures.effective_masses import get_path_segments
+
+from collections import namedtuple
+
+import numpy as np
+
+
+def pair_states_by_order(nzora, nsoc, nkpoints):
+    """Pairs the states 2n and 2n + 1 with spin-orbit coupling with the scalar-relativistic state n.
+
+    Returns:
+        array: Integer array of shape (nkpoints, npairs, 2) with the indices of the states with spin-orbit coupling.
+    """
+    npairs = min(nzora, nsoc // 2)
+    pairs = np.arange(2 * npairs).reshape(npairs, 2)
+    return np.broadcast_to(pairs, (nkpoints, npairs, 2)).copy()
+
+
+def pair_states_by_assignment(
+    zora_energies,
+    soc_energies,
+    zora_chars=None,
+    soc_chars=None,
+    energy_penalty=1.0,
+    chunksize=64,
+):
+    """Assigns two states with spin-orbit coupling to every scalar-relativistic state.
+
+    At every k-point, the sum of the character overlaps minus energy_penalty times the energy differences is maximized,
+    where every scalar-relativistic state takes exactly two states with spin-orbit coupling. Without character vectors,
+    only the energy differences are minimized. The scores are evaluated for chunks of k-points at once. If every state has
+    a unique best match, this is the optimal assignment, otherwise the assignment problem is solved with the Hungarian algorithm
+    at the conflicting k-points.
+
+    Args:
+        zora_energies (array): Scalar-relativistic eigenvalues of shape (nkpoints, nzora).
+        soc_energies (array): Eigenvalues with spin-orbit coupling of shape (nkpoints, nsoc) on the same energy scale.
+        zora_chars (array): Normalized character vectors of shape (nkpoints, nzora, nfeatures).
+        soc_chars (array): Normalized character vectors of shape (nkpoints, nsoc, nfeatures).
+        energy_penalty (float): Penalty of the energy difference in 1/eV.
+        chunksize (int): Number of k-points whose scores are evaluated at once.
+
+    Returns:
+        array: Integer array of shape (nkpoints, npairs, 2) with the indices of the states with spin-orbit coupling.
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    nkpoints, nzora = zora_energies.shape
+    nsoc = soc_energies.shape[1]
+    npairs = min(nzora, nsoc // 2)
+    pairs = np.empty((nkpoints, npairs, 2), dtype=int)
+    if npairs == 0:
+        return pairs
+    for start in range(0, nkpoints, chunksize):
+        k = slice(start, start + chunksize)
+        scores = -energy_penalty * np.abs(
+            zora_energies[k, :npairs, None] - soc_energies[k, None, :]
+        )
+        if zora_chars is not None and soc_chars is not None:
+            scores += np.matmul(zora_chars[k, :npairs], soc_chars[k].transpose(0, 2, 1))
+        # fast path: every state with spin-orbit coupling is claimed by a different slot
+        best = np.sort(np.argpartition(-scores, 1, axis=2)[:, :, :2], axis=2)
+        claimed = np.sort(best.reshape(len(scores), -1), axis=1)
+        unique = np.all(np.diff(claimed, axis=1) > 0, axis=1)
+        for i in np.flatnonzero(~unique):
+            # every scalar-relativistic state is represented by two slots
+            rows, cols = linear_sum_assignment(
+                np.repeat(scores[i], 2, axis=0), maximize=True
+            )
+            best[i] = np.sort(cols[np.argsort(rows)].reshape(npairs, 2), axis=1)
+        pairs[k] = best
+    return pairs
+
+
+def get_band_edges(eigenvalues, occupations):
+    """Returns the fundamental and the direct band gap of a spin channel from the occupations.
+
+    Args:
+        eigenvalues (array): Eigenvalues of shape (nkpoints, nstates).
+        occupations (array): Occupations of shape (nkpoints, nstates).
+
+    Returns:
+        tuple: (vbm, cbm, fundamental, direct). The gaps are NaN if bands cross the Fermi level.
+    """
+    occupied = occupations >= 1e-4
+    vbs = np.max(np.where(occupied, eigenvalues, -np.inf), axis=1)
+    cbs = np.min(np.where(occupied, np.inf, eigenvalues), axis=1)
+    vbm, cbm = np.max(vbs), np.min(cbs)
+    fundamental, direct = cbm - vbm, np.min(cbs - vbs)
+    if not np.isfinite(fundamental) or fundamental <= 0:
+        fundamental = direct = np.nan
+    return vbm, cbm, fundamental, direct
+
+
+def get_rashba_coefficients(kpoints, kpoint_axis, splitting, cell):
+    """Estimates Rashba coefficients from the splitting next to time-reversal invariant momenta.
+
+    With E = hbar^2 k^2 / (2 m*) +- alpha k, the splitting grows as 2 alpha k away from a time-reversal invariant momentum.
+    The coefficient is estimated from the first k-point next to every time-reversal invariant momentum on the path.
+
+    Args:
+        kpoints (array): Cartesian k-points in 1/Angstrom of shape (nkpoints, 3).
+        kpoint_axis (array): K-point axis of shape (nkpoints,).
+        splitting (array): Splittings of shape (nkpoints, npairs).
+        cell (array): Real space cell of shape (3, 3).
+
+    Returns:
+        array: Largest Rashba coefficient in eV Angstrom of every pair of shape (npairs,), NaN if there is no such momentum on the path.
+    """
+    fractional = np.dot(kpoints, np.asarray(cell).T) / (2 * np.pi)
+    trim = np.all(np.abs(2 * fractional - np.round(2 * fractional)) < 1e-4, axis=1)
+    segment = np.zeros(len(kpoints), dtype=int)
+    for i, s in enumerate(get_path_segments(kpoint_axis)):
+        segment[s] = i
+    centers, neighbours = [], []
+    for offset in (-1, 1):
+        k = np.flatnonzero(trim)
+        n = k + offset
+        valid = (n >= 0) & (n < len(kpoints))
+        k, n = k[valid], n[valid]
+        valid = segment[k] == segment[n]
+        centers.append(k[valid])
+        neighbours.append(n[valid])
+    centers, neighbours = np.concatenate(centers), np.concatenate(neighbours)
+    if len(centers) == 0:
+        return np.full(splitting.shape[1], np.nan)
+    dk = np.linalg.norm(kpoints[neighbours] - kpoints[centers], axis=1)
+    alpha = (splitting[neighbours] - splitting[centers]) / (2 * dk[:, None])
+    return np.max(alpha, axis=0)
+
+
+def compare_spectra(
+    zora,
+    soc,
+    pairing="order",
+    offset=0.0,
+    cell=None,
+    by="species",
+    energy_penalty=1.0,
+):
+    """Compares scalar-relativistic and spin-orbit coupled spectra on the same k-path.
+
+    Every scalar-relativistic state is paired with two states with spin-orbit coupling. The splitting is the energy difference
+    of the two states, the shift is the difference of their mean energy to the scalar-relativistic state. Everything is
+    vectorized over all states and k-points.
+
+    Args:
+        zora (namedtuple): Scalar-relativistic spectrum without spin polarization.
+        soc (namedtuple): Spectrum with spin-orbit coupling on the same k-path.
+        pairing (str): "order" pairs states by energetic order, "energy" by the smallest energy differences and
+            "character" by the Mulliken character and energy differences, which requires Mulliken spectra.
+        offset (float): Energy added to the eigenvalues with spin-orbit coupling, e.g., the difference of the Fermi levels.
+        cell (array): Real space cell for the Rashba coefficients.
+        by (str): Resolution of the character vectors for pairing="character".
+        energy_penalty (float): Penalty of the energy difference in 1/eV for pairing="energy" and "character".
+
+    Returns:
+        namedtuple: soc_comparison with:
+            pairs (array): Indices of the states with spin-orbit coupling of shape (nkpoints, npairs, 2).
+            splitting (array): Splitting of every pair of shape (nkpoints, npairs).
+            shift (array): Shift of the mean energy of every pair of shape (nkpoints, npairs).
+            max_splitting, mean_splitting (array): Largest and mean splitting of every pair along the path of shape (npairs,).
+            rashba (array): Rashba coefficients in eV Angstrom of shape (npairs,), see :func:`get_rashba_coefficients`.
+            gap_change (float): Change of the fundamental band gap, NaN for metals.
+            direct_gap_change (float): Change of the smallest direct band gap, NaN for metals.
+    """
+    comparison = namedtuple(
+        "soc_comparison",
+        [
+            "pairs",
+            "splitting",
+            "shift",
+            "max_splitting",
+            "mean_splitting",
+            "rashba",
+            "gap_change",
+            "direct_gap_change",
+        ],
+    )
+    assert (
+        zora.eigenvalues.shape[1] == 1
+    ), "The scalar-relativistic spectrum must not be spin-polarized."
+    assert np.allclose(
+        zora.kpoints, soc.kpoints, atol=1e-4
+    ), "The spectra are not on the same k-path."
+    zora_energies = np.asarray(zora.eigenvalues[:, 0, :], dtype=float)
+    soc_energies = np.asarray(soc.eigenvalues[:, 0, :], dtype=float) + offset
+    nkpoints, nzora = zora_energies.shape
+    if pairing == "order":
+        pairs = pair_states_by_order(nzora, soc_energies.shape[1], nkpoints)
+    elif pairing == "energy":
+        pairs = pair_states_by_assignment(
+            zora_energies, soc_energies, energy_penalty=energy_penalty
+        )
+    elif pairing == "character":
+        assert hasattr(zora, "get_character_vectors") and hasattr(
+            soc, "get_character_vectors"
+        ), "Pairing by character requires Mulliken spectra."
+        pairs = pair_states_by_assignment(
+            zora_energies,
+            soc_energies,
+            zora.get_character_vectors(by=by)[:, 0],
+            soc.get_character_vectors(by=by)[:, 0],
+            energy_penalty=energy_penalty,
+        )
+    else:
+        raise Exception("Pairing {} not recognized.".format(pairing))
+    npairs = pairs.shape[1]
+    energies = np.take_along_axis(soc_energies[:, :, None], pairs, axis=1)
+    splitting = energies[:, :, 1] - energies[:, :, 0]
+    shift = energies.mean(axis=2) - zora_energies[:, :npairs]
+    if cell is None:
+        rashba = np.full(npairs, np.nan)
+    else:
+        rashba = get_rashba_coefficients(
+            np.asarray(soc.kpoints), soc.kpoint_axis, splitting, cell
+        )
+    _, _, gap_zora, direct_zora = get_band_edges(
+        zora_energies, np.asarray(zora.occupations[:, 0, :])
+    )
+    _, _, gap_soc, direct_soc = get_band_edges(
+        soc_energies, np.asarray(soc.occupations[:, 0, :])
+    )
+    return comparison(
+        pairs,
+        splitting,
+        shift,
+        splitting.max(axis=0),
+        splitting.mean(axis=0),
+        rashba,
+        gap_soc - gap_zora,
+        direct_soc - direct_zora,
+    )
@@ -5,9 +5,119 @@ import matplotlib.ticker as ticker
 from matplotlib.collections import LineCollection
 from matplotlib.colors import Normalize
 
+from scipy.interpolate import CubicSpline, PchipInterpolator
+
 import numpy as np
 
 
+def interpolate_bands(x, y, weights=None, density=True):
+    """Interpolates bands and contributions path segment by path segment.
+
+    The k-point axis is split where consecutive points coincide, i.e., at the boundaries of path segments and at jumps.
+    Every segment is interpolated for all bands at once, the eigenvalues with a cubic spline and the contributions
+    with a monotonic PCHIP interpolant, which does not overshoot.
+
+    Args:
+        x (array): K-point axis of shape (nkpoints,).
+        y (array): Eigenvalues of shape (nkpoints, nbands).
+        weights (array): Contributions of shape (nkpoints, nbands).
+        density (int): Number of interpolated intervals per original interval. True defaults to 5.
+
+    Returns:
+        tuple: (x, y) or (x, y, weights) if weights are given.
+    """
+    density = 5 if density is True else int(density)
+    assert density > 0, "Interpolation density must be positive."
+    bounds = np.flatnonzero(np.diff(x) <= 0) + 1
+    new_x, new_y, new_w = [], [], []
+    for s in np.split(np.arange(len(x)), bounds):
+        ws = None
+        if len(s) < 2:
+            xs, ys = x[s], y[s]
+            if weights is not None:
+                ws = weights[s]
+        else:
+            xs = np.linspace(x[s[0]], x[s[-1]], (len(s) - 1) * density + 1)
+            ys = CubicSpline(x[s], y[s], axis=0)(xs)
+            if weights is not None:
+                ws = PchipInterpolator(x[s], weights[s], axis=0)(xs)
+                ws = ws.astype(weights.dtype, copy=False)
+        new_x.append(xs)
+        new_y.append(ys)
+        new_w.append(ws)
+    x, y = np.concatenate(new_x), np.concatenate(new_y, axis=0)
+    if weights is None:
+        return x, y
+    return x, y, np.concatenate(new_w, axis=0)
+
+
+def get_display_points(axes, downsample=True):
+    """Returns the number of k-points to keep for downsampling, None if the bands should not be downsampled.
+
+    True corresponds to two k-points per pixel of the axes width, an integer specifies the number of k-points directly.
+    """
+    if downsample in [False, None, 0]:
+        return None
+    if downsample is True:
+        return max(int(2 * axes.get_window_extent().width), 2)
+    return int(downsample)
+
+
+def downsample_bands(x, y, weights=None, npoints=1000, window=None):
+    """Reduces the number of k-points of dense band paths to the display resolution.
+
+    The k-points are selected by the largest-triangle-three-buckets algorithm path segment by path segment. Since all bands
+    share the k-point axis, the triangle areas of all bands inside of the energy window are summed up in every bucket.
+    The boundaries of all path segments and the minimum and maximum of every band on every segment are always kept.
+
+    Args:
+        x (array): K-point axis of shape (nkpoints,).
+        y (array): Eigenvalues of shape (nkpoints, nbands).
+        weights (array): Contributions of shape (nkpoints, nbands).
+        npoints (int): Approximate number of k-points to keep.
+        window (tuple): Energy window (lower, upper). Only bands inside of the window determine the selected k-points.
+
+    Returns:
+        tuple: (x, y) or (x, y, weights) if weights are given.
+    """
+    if len(x) <= npoints:
+        return (x, y) if weights is None else (x, y, weights)
+    if window is None:
+        inside = np.ones(y.shape[1], dtype=bool)
+    else:
+        inside = np.any((y >= min(window)) & (y <= max(window)), axis=0)
+    inside = inside if np.any(inside) else np.ones(y.shape[1], dtype=bool)
+    bounds = np.flatnonzero(np.diff(x) <= 0) + 1
+    segments = np.split(np.arange(len(x)), bounds)
+    keep = [bounds - 1, bounds, [0, len(x) - 1]]
+    for s in segments:
+        ys = y[s][:, inside]
+        keep += [s[np.argmin(ys, axis=0)], s[np.argmax(ys, axis=0)]]
+        # number of buckets proportional to the number of k-points of the segment
+        nbuckets = int(npoints * len(s) / len(x)) - 2
+        if nbuckets < 1 or len(s) <= nbuckets + 2:
+            keep.append(s)
+            continue
+        buckets = np.array_split(np.arange(1, len(s) - 1), nbuckets)
+        xs = x[s]
+        a = 0
+        for i, b in enumerate(buckets):
+            if i + 1 < len(buckets):
+                c = buckets[i + 1]
+                xc, yc = xs[c].mean(), ys[c].mean(axis=0)
+            else:
+                xc, yc = xs[-1], ys[-1]
+            area = np.abs(
+                (xs[a] - xc) * (ys[b] - ys[a]) - (xs[a] - xs[b])[:, None] * (yc - ys[a])
+            ).sum(axis=1)
+            a = b[np.argmax(area)]
+            keep.append([s[a]])
+    keep = np.unique(np.concatenate([np.asarray(k, dtype=int) for k in keep]))
+    if weights is None:
+        return x[keep], y[keep]
+    return x[keep], y[keep], weights[keep]
+
+
 class BandStructurePlot:
     def __init__(
         self,
@@ -23,6 +133,8 @@ class BandStructurePlot:
         fermi_level=None,
         mark_fermi_level=None,
         mark_gap=False,
+        interpolate=False,
+        downsample=False,
         main=False,
     ) -> None:
         self.ax = plt.gca()
@@ -43,8 +155,25 @@ class BandStructurePlot:
         self.xlimits, self.ylimits = self.set_xy_limits()
         self.mark_fermi_level = mark_fermi_level
         self.mark_gap = mark_gap
+        self.interpolate = interpolate
+        self.downsample = downsample
         self.main = main
 
+    def get_interpolated_xy(self):
+        """Returns the k-point axis and the bands, interpolated if requested."""
+        x, y = self.xy
+        if self.interpolate in [False, None, 0]:
+            return x, y
+        return interpolate_bands(x, y, density=self.interpolate)
+
+    def get_display_xy(self):
+        """Returns the k-point axis and the bands, interpolated and downsampled to the display resolution if requested."""
+        x, y = self.get_interpolated_xy()
+        npoints = get_display_points(self.ax, self.downsample)
+        if npoints is None:
+            return x, y
+        return downsample_bands(x, y, npoints=npoints, window=self.ylimits)
+
     def draw(self):
         ylocs = ticker.MultipleLocator(base=0.5)
         self.ax.yaxis.set_major_locator(ylocs)
@@ -194,6 +323,27 @@ class BandStructurePlot:
 
 
 class MullikenBandStructurePlot:
+    """Draws the contributions of a Mulliken spectrum as fat bands.
+
+    All bands are drawn as a single collection, so that the number of artists does not grow with the number of bands.
+    Segments outside of the energy window of the axes are not drawn, so the energy window has to be set before.
+
+    Args:
+        x (array): K-point axis of shape (nkpoints,).
+        y (array): Eigenvalues of shape (nkpoints, nstates).
+        spin (int): Spin channel.
+        con (MullikenContribution): Contribution that determines widths and colors.
+        cmap (colormap): Colormap of the contribution.
+        mode (str): "lines" or "scatter".
+        interpolate (int): Interpolate bands and contributions, see :func:`interpolate_bands`.
+        downsample (int): Downsample bands and contributions to the display resolution, see :func:`get_display_points`.
+        norm (Normalize): Normalization of the contribution.
+        scale_width (float): Scaling factor of the line widths. False draws lines of constant width.
+        min_weight (float): Segments and points with an absolute contribution below this value are not drawn.
+        cull (bool): Skip segments and points outside of the energy window of the axes when drawing. They are then
+            missing if the limits of the axes are changed later, otherwise matplotlib clips them.
+    """
+
     def __init__(
         self,
         x=None,
@@ -203,8 +353,11 @@ class MullikenBandStructurePlot:
         cmap=None,
         mode="lines",
         interpolate=False,
+        downsample=False,
         norm=None,
         scale_width=2,
+        min_weight=None,
+        cull=False,
     ) -> None:
         self.ax = plt.gca()
         self.x = x.copy()
@@ -213,34 +366,83 @@ class MullikenBandStructurePlot:
         self.con = con
         self.cmap = cmap
         self.mode = mode
-        self.interpoalte = interpolate
+        self.interpolate = interpolate
+        self.downsample = downsample
         self.norm = norm or Normalize(vmin=0.0, vmax=1.0)
         self.scale_width = scale_width
+        self.min_weight = min_weight
+        self.cull = cull
 
     def draw(self):
         x = self.x
         y = self.y
-        for band in range(y.shape[1]):
-            band_x = x.copy()
-            band_y = y[:, band].copy()
-            band_width = self.con.contribution[:, self.spin, band].copy()
-            if self.mode == "lines":
-                self.plot_linecollection(band_x, band_y, band_width)
-            elif self.mode == "scatter":
-                self.plot_scatter(band_x, band_y, band_width)
+        weights = np.asarray(self.con.contribution[:, self.spin, :])
+        if self.interpolate not in [False, None, 0]:
+            x, y, weights = self.interpol(x, y, weights)
+        npoints = get_display_points(self.ax, self.downsample)
+        if npoints is not None:
+            x, y, weights = downsample_bands(
+                x, y, weights, npoints=npoints, window=self.ax.get_ylim()
+            )
+        if self.mode == "lines":
+            self.plot_linecollection(x, y, weights)
+        elif self.mode == "scatter":
+            self.plot_scatter(x, y, weights)
         return self.ax
 
-    def plot_linecollection(self, band_x, band_y, band_width):
+    def get_segments(self, x, y, weights):
+        """Builds the line segments of all bands at once.
+
+        The segment between two k-points carries the weight of the first k-point.
+
+        Args:
+            x (array): K-point axis of shape (nkpoints,).
+            y (array): Eigenvalues of shape (nkpoints, nbands).
+            weights (array): Contributions of shape (nkpoints, nbands).
+
+        Returns:
+            tuple: Segments of shape (nsegments, 2, 2) and weights of shape (nsegments,), ordered band by band.
+        """
+        points = np.stack([np.broadcast_to(x[:, None], y.shape), y], axis=-1)
+        # (nbands, nkpoints - 1, [start, end], [x, y])
+        segments = np.stack([points[:-1], points[1:]], axis=2).transpose(1, 0, 2, 3)
+        segments = segments.reshape(-1, 2, 2)
+        weights = weights[:-1].T.reshape(-1)
+        keep = self.get_visible(segments[:, :, 1], weights)
+        return segments[keep], weights[keep]
+
+    def get_visible(self, y, weights):
+        """Returns a mask of the segments or points that are drawn.
+
+        Segments with an absolute contribution below min_weight are skipped. If cull is set, segments that lie completely
+        outside of the energy window of the axes are skipped as well.
+
+        Args:
+            y (array): Energies of shape (n, npoints).
+            weights (array): Contributions of shape (n,).
+
+        Returns:
+            array: Boolean mask of shape (n,).
+        """
+        keep = np.ones(len(y), dtype=bool)
+        if self.cull:
+            lower, upper = self.ax.get_ylim()
+            # some margin for the width of the lines
+            margin = 0.05 * (upper - lower)
+            keep &= ~(
+                np.all(y < lower - margin, axis=1) | np.all(y > upper + margin, axis=1)
+            )
+        if self.min_weight not in [None, False, 0]:
+            keep &= np.abs(weights) >= self.min_weight
+        return keep
+
+    def plot_linecollection(self, x, y, weights):
         axes = self.ax
-        band_width = band_width[:-1]
-        points = np.array([band_x, band_y]).T.reshape(-1, 1, 2)
-        segments = np.concatenate(
-            [points[:-1], points[1:]], axis=1
-        )  # this reshapes it into (x1, x2) (y1, y2) pairs
+        segments, weights = self.get_segments(x, y, weights)
         if self.scale_width in [False, None, "none", 0]:
             lwidths = 1
         else:
-            lwidths = band_width.copy() * self.scale_width
+            lwidths = weights * self.scale_width
         lc = LineCollection(
             segments,
             linewidths=lwidths,
@@ -248,29 +450,28 @@ class MullikenBandStructurePlot:
             norm=self.norm,
             capstyle="round",
         )
-        lc.set_array(band_width)
+        lc.set_array(weights)
         axes.add_collection(lc)
 
-    def plot_scatter(self, band_x, band_y, band_width):
+    def plot_scatter(self, x, y, weights):
         axes = self.ax
+        x = np.broadcast_to(x[:, None], y.shape).T.reshape(-1)
+        y = y.T.reshape(-1)
+        weights = weights.T.reshape(-1)
+        keep = self.get_visible(y[:, None], weights)
+        x, y, weights = x[keep], y[keep], weights[keep]
         if self.scale_width in [False, None, "none", 0]:
-            swidths = 1
+            swidths = np.ones(weights.shape)
         else:
-            swidths = band_width.copy() * self.scale_width
+            swidths = weights * self.scale_width
         axes.scatter(
-            band_x,
-            band_y,
+            x,
+            y,
             c=swidths,
             cmap=self.cmap,
             norm=self.norm,
-            s=(band_width * 2),
+            s=(weights * 2),
         )
 
-    def interpol(self):
-        # if interpolation_step != False:
-        #     f1 = interpolate.interp1d(x, band_y)
-        #     f2 = interpolate.interp1d(x, band_width)
-        #     band_x = np.arange(0, np.max(x), self.interpolation_step)
-        #     band_y = f1(band_x)
-        #     band_width = f2(band_x)
-        pass
+    def interpol(self, x, y, weights):
+        return interpolate_bands(x, y, weights, density=self.interpolate)
@@ -20,10 +20,12 @@ class DensityOfStates:
     >>> apdos_zora = dos.atom_dos_zora
     >>> apdos_soc = dos.atom_dos_soc
     >>> spdos_zora = dos.specices_dos_zora
-    >>> spdos_soc = dos.species_dos_soc    
+    >>> spdos_soc = dos.species_dos_soc
 
     The atom-projected DOS can produce all projections on the species and the total dos. It shares most of its methods with the species-projected DOS.
 
+    The densities of states are only read in when they are accessed for the first time.
+
     An out-of-the box visualization can be done via:
 
     >>> dos.plot()
@@ -35,42 +37,43 @@ class DensityOfStates:
 
     def __init__(self, outputfile) -> None:
         self.outputfile = outputfile
-        self._tdos_zora = None
-        self._tdos_soc = None
-        self._apdos_zora = None
-        self._apdos_soc = None
-        self._spdos_zora = None
-        self._spdos_soc = None
         self._set_classes()
 
     def _set_classes(self):
+        # The densities of states are only read in on first access.
         self.base = DOSBaseClass(outputfile=self.outputfile)
         self.soc = self.base.control["include_spin_orbit"]
         self.methods = []
+        self._classes = LazyObjects()
+        classes = []
         if any(x in ["total dos", "total dos tetrahedron"] for x in self.base.tasks):
             self.methods.append("total")
-            self._tdos_zora = TotalDOS(outputfile=self.outputfile, soc=False)
-            if self.soc:
-                self._tdos_soc = TotalDOS(outputfile=self.outputfile, soc=True)
+            classes.append(("total", TotalDOS))
         if any(
             x in ["atom-projected dos", "atom-projected dos tetrahedron"]
             for x in self.base.tasks
         ):
             self.methods.append("atom")
-            self._apdos_zora = AtomProjectedDOS(outputfile=self.outputfile, soc=False)
-            if self.soc:
-                self._apdos_soc = AtomProjectedDOS(outputfile=self.outputfile, soc=True)
+            classes.append(("atom", AtomProjectedDOS))
         if any(
             x in ["species-projected dos", "species-projected dos tetrahedron"]
             for x in self.base.tasks
         ):
             self.methods.append("species")
-            self._spdos_zora = SpeciesProjectedDOS(
-                outputfile=self.outputfile, soc=False
+            classes.append(("species", SpeciesProjectedDOS))
+        for method, dosclass in classes:
+            self._classes.register(
+                (method, False),
+                lambda dosclass=dosclass: dosclass(
+                    outputfile=self.outputfile, soc=False
+                ),
             )
             if self.soc:
-                self._spdos_soc = SpeciesProjectedDOS(
-                    outputfile=self.outputfile, soc=True
+                self._classes.register(
+                    (method, True),
+                    lambda dosclass=dosclass: dosclass(
+                        outputfile=self.outputfile, soc=True
+                    ),
                 )
 
     def __repr__(self):
@@ -81,32 +84,32 @@ class DensityOfStates:
     @property
     def total_dos_zora(self):
         """ Returns :class:`~aimstools.density_of_states.total_dos.TotalDOS` without spin-orbit coupling."""
-        return self._tdos_zora
+        return self._classes.get(("total", False))
 
     @property
     def total_dos_soc(self):
         """ Returns :class:`~aimstools.density_of_states.total_dos.TotalDOS` with spin-orbit coupling."""
-        return self._tdos_soc
+        return self._classes.get(("total", True))
 
     @property
     def atom_dos_zora(self):
         """ Returns :class:`~aimstools.density_of_states.atom_proj_dos.AtomProjectedDOS` without spin-orbit coupling."""
-        return self._apdos_zora
+        return self._classes.get(("atom", False))
 
     @property
     def atom_dos_soc(self):
         """ Returns :class:`~aimstools.density_of_states.atom_proj_dos.AtomProjectedDOS` with spin-orbit coupling."""
-        return self._apdos_soc
+        return self._classes.get(("atom", True))
 
     @property
     def species_dos_zora(self):
         """ Returns :class:`~aimstools.density_of_states.species_proj_dos.SpeciesProjectedDOS` without spin-orbit coupling."""
-        return self._spdos_zora
+        return self._classes.get(("species", False))
 
     @property
     def species_dos_soc(self):
         """ Returns :class:`~aimstools.density_of_states.species_proj_dos.SpeciesProjectedDOS` with spin-orbit coupling."""
-        return self._spdos_soc
+        return self._classes.get(("species", True))
 
     def plot(self, **kwargs):
         base = self.base
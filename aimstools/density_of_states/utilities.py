@@ -304,19 +304,37 @@ class DOSSpectrum:
 
 
 class Contribution:
+    """Contribution of atoms to a density of states.
+
+    Sums, differences and scalings of contributions are lazy. They are recorded as :class:`~aimstools.misc.LinearCombination`
+    and evaluated in one pass when the values are accessed. Labels are also only composed when they are accessed.
+
+    Args:
+        symbol (str): Label of the contribution.
+        values (array): Array of shape (nenergies, nspins, ncons).
+    """
+
     def __init__(self, symbol, values) -> None:
         self._symbol = symbol
         self.values = values
+        self._labels = [symbol]
+        self._difference = False
 
     def __repr__(self) -> str:
         return "{}({})".format(self.__class__.__name__, self.symbol)
 
+    def _combine(self, expression, other=None, difference=False):
+        new = Contribution.__new__(Contribution)
+        new._symbol = None
+        new._expression = expression
+        new._labels = self._labels + (other._labels if other != None else [])
+        new._difference = (
+            self._difference or difference or (other != None and other._difference)
+        )
+        return new
+
     def __add__(self, other) -> "Contribution":
-        d = self.values + other.values
-        s1 = string2symbols(self.symbol)
-        s2 = string2symbols(other.symbol)
-        s = Formula.from_list(s1 + s2).format("reduce").format("metal")
-        return Contribution(s, d)
+        return self._combine(self._expression + other._expression, other)
 
     def __radd__(self, other):
         if other == 0:
@@ -324,10 +342,37 @@ class Contribution:
         else:
             return self.__add__(other)
 
+    def __sub__(self, other) -> "Contribution":
+        expression = self._expression - other._expression
+        return self._combine(expression, other, difference=True)
+
+    def __mul__(self, factor) -> "Contribution":
+        return self._combine(self._expression * factor)
+
+    __rmul__ = __mul__
+
+    @property
+    def values(self):
+        return self._expression.evaluate()
+
+    @values.setter
+    def values(self, values):
+        self._expression = LinearCombination([(1, values)])
+
     @property
     def symbol(self):
+        if self._symbol == None:
+            s = self._get_formula()
+            self._symbol = "$\\Delta$" + s if self._difference else s
         return self._symbol
 
+    def _get_formula(self):
+        """Returns the reduced formula of all atoms in the contribution, without marking differences."""
+        if self._symbol != None and not self._difference:
+            return self._symbol
+        s = [k for j in self._labels for k in string2symbols(j)]
+        return Formula.from_list(s).format("reduce").format("metal")
+
     def set_symbol(self, symbol):
         assert type(symbol) == str, "Symbol must be a string."
         try:
@@ -339,8 +384,9 @@ class Contribution:
         ), "Symbol is not an element from the PSE."
         s = Formula.from_list(s).format("reduce").format("metal")
         self._symbol = s
+        self._labels = [s]
+        self._difference = False
 
     def get_latex_symbol(self):
-        s = self.symbol
-        s = Formula(s)
-        return s.format("latex")
+        s = Formula(self._get_formula()).format("latex")
+        return "$\\Delta$" + s if self._difference else s
@@ -1,5 +1,7 @@
 import logging
+import threading
 import matplotlib.pyplot as plt
+import numpy as np
 
 
 def setup_custom_logger(name):
@@ -112,3 +114,137 @@ class AxesContext:
                 )
         return None
 
+
+class LinearCombination:
+    """ Lazy linear combination of arrays of the same shape.
+
+    Sums, differences and scalings only record (coefficient, array) terms. The terms are evaluated in a single pass
+    into one output array when the value is requested, and the result is cached. The value is read-only, so that
+    in-place changes can not corrupt the cached value or the arrays of the terms.
+
+    Args:
+        terms (list): List of (coefficient, array) tuples.
+
+    """
+
+    def __init__(self, terms) -> None:
+        self.terms = list(terms)
+        self._value = None
+
+    def __repr__(self) -> str:
+        return "{}(nterms={})".format(self.__class__.__name__, len(self.terms))
+
+    def __add__(self, other) -> "LinearCombination":
+        return LinearCombination(self.terms + other.terms)
+
+    def __sub__(self, other) -> "LinearCombination":
+        return self + other * -1
+
+    def __mul__(self, factor) -> "LinearCombination":
+        return LinearCombination([(c * factor, a) for c, a in self.terms])
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> "LinearCombination":
+        return self * -1
+
+    def evaluate(self) -> "np.ndarray":
+        """Returns the value of the linear combination."""
+        if self._value is not None:
+            return self._value
+        # Terms of the same array are merged, e.g., a - a.
+        coefficients, arrays = {}, {}
+        for c, a in self.terms:
+            coefficients[id(a)] = coefficients.get(id(a), 0) + c
+            arrays[id(a)] = a
+        terms = [(coefficients[k], arrays[k]) for k in arrays]
+        (c, a), rest = terms[0], terms[1:]
+        if c == 1 and len(rest) == 0:
+            # A single array is not copied, but returned as read-only view.
+            if isinstance(a, np.ndarray) and not a.flags.writeable:
+                self._value = a
+            else:
+                self._value = np.asarray(a).view()
+                self._value.flags.writeable = False
+            return self._value
+        value = np.multiply(a, c, dtype=np.result_type(a, np.float32))
+        buffer = None
+        for c, a in rest:
+            if c == 1:
+                value += a
+            elif c == -1:
+                value -= a
+            elif c != 0:
+                buffer = np.empty_like(value) if buffer is None else buffer
+                np.multiply(a, c, out=buffer)
+                value += buffer
+        value.flags.writeable = False
+        self._value = value
+        return value
+
+
+class LazyObjects:
+    """Thread-safe, memoized construction of objects on first access.
+
+    Factories are registered under a key and are only called when the object is requested for the first time.
+    Every key has its own lock, so that different objects can be constructed concurrently, while each object is constructed only once.
+
+    Args:
+        factories (dict): Dictionary of keys and callables without arguments.
+
+    """
+
+    def __init__(self, factories=None) -> None:
+        self.factories = {}
+        self._objects = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        for key, factory in (factories or {}).items():
+            self.register(key, factory)
+
+    def __repr__(self) -> str:
+        return "{}(registered={}, constructed={})".format(
+            self.__class__.__name__, list(self.factories), list(self._objects)
+        )
+
+    def __contains__(self, key) -> bool:
+        return key in self.factories
+
+    def __getitem__(self, key):
+        if key not in self.factories:
+            raise KeyError(key)
+        return self.get(key)
+
+    def __iter__(self):
+        return iter(list(self.factories))
+
+    def __len__(self) -> int:
+        return len(self.factories)
+
+    def keys(self):
+        """Returns the registered keys, regardless of whether their objects have been constructed."""
+        return list(self.factories)
+
+    def register(self, key, factory) -> None:
+        """Registers a factory under the given key, replacing constructed objects of the same key."""
+        with self._lock:
+            self.factories[key] = factory
+            self._locks[key] = threading.Lock()
+            self._objects.pop(key, None)
+
+    def is_constructed(self, key) -> bool:
+        """Returns True if the object of the given key has already been constructed."""
+        return key in self._objects
+
+    def get(self, key):
+        """Returns the object of the given key and constructs it on first access, None if the key is not registered."""
+        if key in self._objects:
+            return self._objects[key]
+        with self._lock:
+            lock = self._locks.get(key)
+        if lock is None:
+            return None
+        with lock:
+            if key not in self._objects:
+                self._objects[key] = self.factories[key]()
+            return self._objects[key]
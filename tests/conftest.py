@@ -0,0 +1,4 @@
+import os
+
+# plots in the tests are drawn without a display, the backend is set before matplotlib is imported
+os.environ.setdefault("MPLBACKEND", "Agg")
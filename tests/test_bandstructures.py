@@ -0,0 +1,752 @@
+from aimstools.misc import *
+import pytest
+
+from pathlib import Path
+
+import tempfile
+import shutil
+
+import numpy as np
+
+from aimstools.bandstructures import MullikenBandStructure
+
+
+def test_mulliken_memmap_storage():
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    dirpath = tempfile.mkdtemp()
+    bs = MullikenBandStructure(cs, soc=True)
+    bs_mm = MullikenBandStructure(cs, soc=True, memmap=dirpath)
+    assert bs_mm.spectrum.contributions.nbytes == 0, "Contributions not memory-mapped."
+    bs_cached = MullikenBandStructure(cs, soc=True, memmap=dirpath)
+    for b in (bs_mm, bs_cached):
+        assert np.allclose(
+            np.asarray(bs.spectrum.contributions), np.asarray(b.spectrum.contributions)
+        ), "Memory-mapped contributions differ from in-memory contributions."
+    con1 = bs.spectrum.get_species_contribution("Si", l="p").contribution
+    con2 = bs.spectrum.get_atom_contribution(0, l="p").contribution
+    con2 = con2 + bs.spectrum.get_atom_contribution(1, l="p").contribution
+    assert np.allclose(con1, con2), "Species contribution is not the sum over atoms."
+    shutil.rmtree(dirpath)
+
+
+def test_contribution_blocks():
+    from aimstools.bandstructures.mulliken_storage import ContributionBlocks
+
+    rng = np.random.default_rng(0)
+    a, b = rng.random((3, 4, 1, 5, 7)), rng.random((3, 2, 1, 5, 7))
+    con = np.concatenate([a, b], axis=1)
+    blocks = ContributionBlocks([a, b[:, ::-1]])
+    con[:, 4:] = con[:, 4:][:, ::-1]
+    assert np.allclose(blocks[np.array([0, 2])], con[[0, 2]]), "Wrong atoms."
+    assert np.allclose(blocks[np.array([2, 0]), ..., 1], con[[2, 0], ..., 1])
+    assert np.allclose(blocks[1, np.array([5, 0])], con[1, [5, 0]]), "Wrong k-points."
+    assert np.allclose(blocks[..., 3], con[..., 3]), "Wrong angular momentum."
+
+
+def test_mulliken_energy_window():
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = MullikenBandStructure(cs, soc=True)
+    bs_w = MullikenBandStructure(cs, soc=True, energy_window=3)
+    start, stop = bs_w.get_state_range()
+    evs = bs.spectrum.eigenvalues[:, :, start:stop]
+    assert np.allclose(evs, bs_w.spectrum.eigenvalues), "Wrong states were kept."
+    # the mulliken bands with soc are referenced to the scalar Fermi level
+    evs = bs_w.spectrum.eigenvalues - bs_w.fermi_level_offset
+    assert np.all(
+        np.any((evs >= -3) & (evs <= 3), axis=(0, 1))
+    ), "States outside of the energy window were kept."
+    cons = np.asarray(bs.spectrum.contributions)[:, :, :, start:stop, :]
+    assert np.allclose(
+        cons, np.asarray(bs_w.spectrum.contributions)
+    ), "Contributions of the kept states differ."
+
+
+def test_energy_window_segments():
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = MullikenBandStructure(cs, soc=True)
+    bs_w = MullikenBandStructure(cs, soc=True, energy_window=3)
+    scanned = []
+    scan = bs_w.scan_mlk_eigenvalues
+
+    def record(bandfile):
+        scanned.append(bandfile)
+        return scan(bandfile)
+
+    bs_w.scan_mlk_eigenvalues = record
+    spectrum = bs_w.get_mlk_spectrum("XG")
+    segments = bs_w.get_path_segments("XG")
+    bandfiles = [
+        f
+        for s, f in zip(bs_w.band_sections, bs_w.bandfiles)
+        if (s.symbol1, s.symbol2) in segments
+    ]
+    assert len(bandfiles) < len(bs_w.bandfiles), "Band path needs all sections."
+    assert scanned == bandfiles, "Band files of other sections were scanned."
+    assert not any(
+        bs_w.bands.is_constructed(k) for k in bs_w.bands.keys()
+    ), "Sections of the full band path were read in."
+    start, stop = bs_w.get_state_range(segments)
+    evs = bs.get_mlk_spectrum("XG").eigenvalues[:, :, start:stop]
+    assert np.allclose(
+        evs, spectrum.eigenvalues
+    ), "Wrong states were kept for the band path."
+
+
+def test_streamed_mlk_parsing():
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = MullikenBandStructure(cs, soc=True)
+    bandfile = bs.bandfiles[0]
+    # reference: the whole file is parsed at once
+    with open(bandfile, "r") as file:
+        lines = file.readlines()
+    kpoints = np.array(
+        [l.split()[-4:-1] for l in lines if "k point number" in l], dtype=np.float32
+    )
+    values = [l.split() for l in lines if "k point" not in l and "State" not in l]
+    values = np.array([v for v in values if len(v) > 0], dtype=np.float32)
+    nstates = int(values[:, 0].max())
+    # (nkpoints, nstates, natoms, nspins, ncolumns)
+    values = values.reshape(len(kpoints), nstates, len(bs.structure), 2, -1)
+    evs = values[:, :, 0, 0, 1]
+    # soc contributions of both spin channels are summed up in the first one
+    cons = np.clip(values[..., 6:], 0, None).sum(axis=3).transpose(2, 0, 1, 3)
+    nls = cons.shape[-1]
+
+    blocks = list(bs.iterate_mlk_bandfile(bandfile))
+    assert len(blocks) == len(kpoints), "Not one block per k-point."
+    k, e, o, c = bs.read_mlk_bandfile(bandfile, 2)
+    assert np.allclose(k, kpoints) and np.allclose(e[:, 0], evs), "Wrong eigenvalues."
+    assert np.allclose(c[:, :, 0, :, 1 : nls + 1], cons), "Wrong contributions."
+    assert np.allclose(c[:, :, 0, :, 0], cons.sum(axis=-1)), "Wrong total."
+    assert np.all(c[:, :, 1] == 0), "Second soc spin channel is not empty."
+    k, e, o, c = bs.read_mlk_bandfile(bandfile, 2, state_range=(10, 30))
+    assert np.allclose(c[:, :, 0, :, 1 : nls + 1], cons[:, :, 10:30]), "Wrong states."
+
+    section = bs.band_sections[0]
+    spectrum = bs.get_mlk_spectrum(section.symbol2 + section.symbol1)
+    assert np.allclose(spectrum.eigenvalues[:, 0], evs[::-1]), "Wrong reversed bands."
+    assert np.allclose(
+        np.asarray(spectrum.contributions)[:, :, 0, :, 1 : nls + 1], cons[:, ::-1]
+    ), "Wrong reversed contributions."
+
+
+def test_gap_data():
+    from aimstools.bandstructures import RegularBandStructure
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = RegularBandStructure(cs, soc=True)
+    evs = bs.spectrum.eigenvalues[:, 0, :]
+    occs = bs.spectrum.occupations[:, 0, :]
+    vbs = np.array([np.max(e[o >= 1e-4]) for e, o in zip(evs, occs)])
+    cbs = np.array([np.min(e[o < 1e-4]) for e, o in zip(evs, occs)])
+    vbm, cbm, indirect, direct = bs.get_data_from_bandstructure()
+    assert np.isclose(vbm, vbs.max()) and np.isclose(
+        cbm, cbs.min()
+    ), "Wrong band edges."
+    assert np.isclose(direct.value, np.min(cbs - vbs)), "Wrong direct band gap."
+    if indirect is not None:
+        assert np.isclose(indirect.value, cbm - vbm), "Wrong indirect band gap."
+
+    os = Path().cwd().joinpath("tests/open_shell")
+    bs = RegularBandStructure(os, soc=False)
+    data = bs.get_gap_data()
+    assert len(data) == 2, "Both spin channels should be analyzed."
+    for d in data:
+        assert d.metallic and (
+            d.direct is None
+        ), "Open shell system should be metallic."
+        assert len(d.crossings) > 0, "Bands crossing the Fermi level were not found."
+
+    # the first spin channel has no unoccupied states, the second no occupied states
+    ones = np.ones_like(bs.spectrum.eigenvalues[:, 0])
+    occupations = np.stack([ones, np.zeros_like(ones)], axis=1)
+    spectrum = bs.spectrum._replace(occupations=occupations)
+    for d in bs.get_gap_data(spectrum):
+        assert not np.isfinite(d.cbm - d.vbm), "Band edges should be missing."
+        assert (d.direct is None) and (d.indirect is None), "Gaps should be None."
+
+
+def test_group_contributions():
+    ms = Path().cwd().joinpath("tests/multiple_species")
+    bs = MullikenBandStructure(ms, soc=True)
+    spectrum = bs.spectrum
+    cons = np.asarray(spectrum.contributions)
+    for s, indices in spectrum.species.items():
+        con = spectrum.get_species_contribution(s, l="p").contribution
+        assert np.allclose(con, cons[indices, ..., 2].sum(axis=0)), "Wrong species sum."
+    c1 = spectrum.get_species_contribution(s, l="p").contribution
+    assert c1 is con, "Species contributions are not cached."
+    fragment = spectrum.get_fragment_contribution([0, 1], l="tot")
+    assert np.allclose(fragment.contribution, cons[[0, 1], ..., 0].sum(axis=0))
+    group = spectrum.get_group_contribution(list(spectrum.species.keys()), l="tot")
+    assert np.allclose(group.contribution, cons[..., 0].sum(axis=0))
+    symbols = list(spectrum.species.keys())
+    summed = sum([spectrum.get_species_contribution(s) for s in symbols])
+    group = spectrum.get_group_contribution(symbols + symbols[:1])
+    assert np.allclose(group.contribution, summed.contribution), "Atoms counted twice."
+    assert group.symbol == summed.symbol, "Wrong label of group."
+    groups = [[1], [0, 1], [0]]
+    reduced = spectrum.contributions.reduce_atoms(groups, chunksize=2)
+    for g, r in zip(groups, reduced):
+        assert np.allclose(r, cons[g].sum(axis=0)), "Wrong chunked group sum."
+
+
+def test_majority_contribution():
+    ms = Path().cwd().joinpath("tests/multiple_species")
+    spectrum = MullikenBandStructure(ms, soc=True).spectrum
+    # dominant, mixed within 10 % and dominant states
+    a = np.array([0.9, 0.5, 0.2]).reshape(1, 1, 3)
+    b = np.array([0.1, 0.48, 0.7]).reshape(1, 1, 3)
+    majority = spectrum.get_majority_contribution([a, b])
+    assert np.array_equal(majority.ravel(), [0, 0, 1]), "Wrong majority."
+    majority = spectrum.get_majority_contribution([a, b], threshold=0.1)
+    assert np.array_equal(majority.ravel(), [0, -1, 1]), "Mixed state not detected."
+    c = np.array([0.0, 0.0, 0.69]).reshape(1, 1, 3)
+    majority = spectrum.get_majority_contribution([a, b, c], threshold=0.1)
+    assert np.array_equal(majority.ravel(), [0, -1, -1]), "Wrong top two."
+    majority = spectrum.get_majority_contribution([a, b, c], threshold=0.01)
+    assert np.array_equal(majority.ravel(), [0, 0, 1]), "Threshold is too strict."
+
+
+def test_lazy_contributions():
+    ms = Path().cwd().joinpath("tests/multiple_species")
+    bs = MullikenBandStructure(ms, soc=True)
+    a = bs.spectrum.get_atom_contribution(0, "p")
+    b = bs.spectrum.get_atom_contribution(1, "p")
+    c = bs.spectrum.get_atom_contribution(1, "s")
+    ref = a.contribution + b.contribution - 0.5 * c.contribution
+    expr = a + b - 0.5 * c
+    assert np.allclose(expr.contribution, ref), "Wrong linear combination."
+    assert expr.l == "ps", "Wrong angular momentum label."
+    assert sum([a, b]).symbol == "NB", "Wrong label of sum."
+    assert (a - a).contribution.max() == 0, "Difference with itself should vanish."
+    for con in [a, expr]:
+        with pytest.raises(ValueError):
+            con.contribution[0] = 0.0
+
+    from aimstools.density_of_states.utilities import Contribution
+
+    n, b = Contribution("N", np.ones((3, 1, 7))), Contribution("B", np.ones((3, 1, 7)))
+    assert (n + b).symbol == "NB", "Wrong label of sum."
+    assert (n - b).symbol == "$\\Delta$NB", "Difference is not marked."
+    assert (n - b).get_latex_symbol().startswith("$\\Delta$"), "Wrong latex label."
+    assert ((n - b) + n).symbol.startswith("$\\Delta$"), "Difference mark was lost."
+
+
+def test_fatband_collection():
+    import matplotlib.pyplot as plt
+    from aimstools.bandstructures.utilities import MullikenBandStructurePlot
+
+    ms = Path().cwd().joinpath("tests/multiple_species")
+    bs = MullikenBandStructure(ms, soc=True)
+    con = bs.spectrum.get_species_contribution("B")
+    x, y = bs.spectrum.kpoint_axis, bs.spectrum.eigenvalues[:, 0, :]
+    fig, ax = plt.subplots()
+    ax.set_ylim(y.min(), y.max())
+    mlk = MullikenBandStructurePlot(x=x, y=y, spin=0, con=con)
+    segments, _ = mlk.get_segments(x, y, con.contribution[:, 0, :])
+    assert len(segments) == (len(x) - 1) * y.shape[1], "Segments are missing."
+    mlk.draw()
+    assert len(ax.collections) == 1, "All bands should be drawn as one collection."
+    ax.set_ylim(-1, 1)
+    segments, _ = mlk.get_segments(x, y, con.contribution[:, 0, :])
+    assert len(segments) == (len(x) - 1) * y.shape[1], "Segments were culled."
+    mlk.cull = True
+    segments, _ = mlk.get_segments(x, y, con.contribution[:, 0, :])
+    assert len(segments) < (len(x) - 1) * y.shape[1], "Segments were not culled."
+    mlk.cull = False
+    mlk.min_weight = 0.5
+    _, weights = mlk.get_segments(x, y, con.contribution[:, 0, :])
+    assert np.all(weights >= 0.5), "Segments below min_weight were kept."
+    plt.close(fig)
+
+
+def test_interpolate_bands():
+    from aimstools.bandstructures.utilities import interpolate_bands
+
+    ms = Path().cwd().joinpath("tests/multiple_species")
+    bs = MullikenBandStructure(ms, soc=True)
+    x, y = bs.spectrum.kpoint_axis, bs.spectrum.eigenvalues[:, 0, :]
+    w = bs.spectrum.get_species_contribution("B").contribution[:, 0, :]
+    nx, ny, nw = interpolate_bands(x, y, w, density=4)
+    nsegments = np.sum(np.diff(x) <= 0) + 1
+    assert len(nx) == (len(x) - nsegments) * 4 + nsegments, "Wrong number of points."
+    assert np.sum(np.diff(nx) <= 0) == nsegments - 1, "Segment boundaries were lost."
+    index = np.searchsorted(nx, x)
+    knots = np.isclose(nx[index], x)
+    assert np.allclose(ny[index][knots], y[knots]), "Bands do not pass the k-points."
+    assert nw.min() >= w.min() and nw.max() <= w.max(), "Contributions overshoot."
+
+
+def test_band_connectivity():
+    from ase.build import bulk
+    from aimstools.bandstructures.mulliken_bandstructure import MullikenSpectrum
+
+    atoms = bulk("NaCl", "rocksalt", a=5.6)
+    nk, nb = 200, 20
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 5, nk)
+    # crossing bands with distinct characters
+    bands = np.linspace(-5, 5, nb)[None, :] + rng.normal(0, 2, nb) * np.sin(x)[:, None]
+    chars = rng.random((nb, 2, 7)).astype(np.float32)
+    order = np.argsort(bands, axis=1)
+    evs = np.take_along_axis(bands, order, axis=1)[:, None, :]
+    cons = chars[order].transpose(2, 0, 1, 3)[:, :, None, :, :]
+    spectrum = MullikenSpectrum(
+        atoms, np.zeros((nk, 3)), x, evs, evs, np.ascontiguousarray(cons), [], [], []
+    )
+    connectivity = spectrum.get_band_connectivity(by="atoms")
+    connected = spectrum.reorder_states(evs, connectivity)[:, 0, :]
+    assert np.allclose(connected, bands[:, order[0]]), "Bands were not disentangled."
+
+
+def test_effective_masses():
+    from aimstools.bandstructures.effective_masses import get_effective_masses
+
+    # X - G - Y and a jump to G - Z with anisotropic parabolic bands
+    points = [np.array(p, dtype=float) for p in ([0.5, 0, 0], [0, 0, 0])]
+    points += [np.array(p, dtype=float) for p in ([0, 0.5, 0], [0, 0, 0], [0, 0, 0.5])]
+    segments = [(0, 1), (1, 2), (3, 4)]
+    kpoints, axis, start = [], [], 0.0
+    for i, j in segments:
+        k = np.linspace(points[i], points[j], 21)
+        d = np.linalg.norm(k - k[0], axis=1) + start
+        kpoints.append(k)
+        axis.append(d)
+        start = d[-1]
+    k, axis = np.concatenate(kpoints), np.concatenate(axis)
+    cb = 1 + 3.80998 * (k[:, 0] ** 2 / 0.2 + k[:, 1] ** 2 / 0.5 + k[:, 2] ** 2 / 1.0)
+    vb = -1 - 3.80998 * np.sum(k ** 2, axis=1) / 0.3
+    evs = np.stack([vb, cb], axis=-1)[:, None, :]
+    occs = np.stack([np.ones(len(k)), np.zeros(len(k))], axis=-1)[:, None, :]
+    for model in ["parabolic", "hyperbolic"]:
+        masses = get_effective_masses(k, axis, evs, occs, npoints=3, model=model)
+        assert list(masses.kind) == ["VBM", "CBM"], "Band edges not found."
+        assert np.allclose(masses.masses[0], -0.3), "Wrong hole masses."
+        assert np.allclose(masses.masses[1], [0.2, 0.5, 1.0]), "Wrong electron masses."
+        assert np.allclose(np.abs(masses.directions[1]), np.eye(3)), "Wrong directions."
+
+
+def test_memoized_spectrum():
+    from aimstools.bandstructures import RegularBandStructure
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = RegularBandStructure(cs, soc=True)
+    bs.spectrum_cache_size = 2
+    s1, gaps = bs.get_memoized_spectrum(bs.get_spectrum, "GX")
+    s2, _ = bs.get_memoized_spectrum(bs.get_spectrum, "GX")
+    assert s1 is s2, "Spectrum was not reused."
+    assert gaps[:2] == bs.get_data_from_bandstructure(s1)[:2], "Wrong gap data."
+    with pytest.raises(ValueError):
+        s1.eigenvalues[0] = 0.0
+    s3, _ = bs.get_memoized_spectrum(bs.get_spectrum)
+    assert bs.spectrum.eigenvalues.flags.writeable, "Spectrum should stay writeable."
+    assert not s3.eigenvalues.flags.writeable, "Cached spectrum should be read-only."
+    for bandpath in ["XW", "GXW"]:
+        bs.get_memoized_spectrum(bs.get_spectrum, bandpath)
+    assert list(bs._spectrum_cache) == [("XW", 0), ("GXW", 0)], "Cache not bounded."
+
+
+def test_reversed_segments_are_views():
+    from aimstools.bandstructures import RegularBandStructure
+
+    os = Path().cwd().joinpath("tests/open_shell")
+    bs = RegularBandStructure(os, soc=False)
+    s = bs.band_sections[0]
+    forward, backward = (
+        bs.bands[(s.symbol1, s.symbol2)],
+        bs.bands[(s.symbol2, s.symbol1)],
+    )
+    assert forward.eigenvalues.shape[1] == 2, "Both spin channels should be read."
+    assert np.shares_memory(forward.eigenvalues, backward.eigenvalues), "Not a view."
+    assert np.array_equal(forward.eigenvalues[::-1], backward.eigenvalues)
+
+
+def test_mulliken_collinear_scalar():
+    from aimstools.bandstructures import RegularBandStructure
+
+    os = Path().cwd().joinpath("tests/no_soc_open_shell")
+    bs = MullikenBandStructure(os, soc=False)
+    rb = RegularBandStructure(os, soc=False)
+    evs = bs.spectrum.eigenvalues
+    assert bs.spectrum.contributions.shape[2] == 2, "Both spin channels should be read."
+    nstates = min(evs.shape[2], rb.spectrum.eigenvalues.shape[2])
+    assert np.allclose(
+        evs[..., :nstates], rb.spectrum.eigenvalues[..., :nstates], atol=1e-3
+    ), "Spin channels differ from the regular band structure."
+    cons = np.asarray(bs.spectrum.contributions)
+    assert np.allclose(cons[..., 0], cons[..., 1:].sum(axis=-1)), "Wrong total."
+
+
+def test_lazy_wrapper():
+    from concurrent.futures import ThreadPoolExecutor
+    from aimstools.bandstructures import BandStructure
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = BandStructure(cs)
+    assert not any(
+        bs._classes.is_constructed(k) for k in ["zora", "soc", "mulliken"]
+    ), "Band structures should not be read in eagerly."
+    with ThreadPoolExecutor(4) as pool:
+        objects = list(pool.map(lambda _: bs.bandstructure_soc, range(4)))
+    assert all(b is objects[0] for b in objects), "Band structure read in twice."
+    bs.get_properties()
+    assert not bs._classes.is_constructed("mulliken"), "Mulliken bands were parsed."
+    assert bs.bandstructure_mulliken.soc, "Wrong mulliken band structure."
+
+
+def test_brillouine_zone_polygons():
+    from ase.build import bulk
+    from aimstools.bandstructures.brillouinezone import get_bz_polygons
+
+    atoms = bulk("Si")
+    bz = get_bz_polygons(atoms.cell)
+    assert len(bz.facets) == 14, "The fcc Brillouine zone has 14 facets."
+    assert get_bz_polygons(atoms.cell + 1e-9) is bz, "Brillouine zone not cached."
+    for dim, tolerance in [(None, None), (np.int64(3), np.float64(1e-6))]:
+        assert get_bz_polygons(atoms.cell, dim, tolerance) is bz, "Defaults not cached."
+    # a skewed cell of the same lattice has the same Brillouine zone
+    cell = atoms.cell.copy()
+    cell[2] += 2 * cell[0] + cell[1]
+    skewed = get_bz_polygons(cell)
+    assert np.allclose(
+        np.sort(np.round(skewed.vertices, 6), axis=0),
+        np.sort(np.round(bz.vertices, 6), axis=0),
+    ), "Wrong Brillouine zone of skewed cell."
+    centers = np.array([bz.vertices[f[f >= 0]].mean(axis=0) for f in bz.facets])
+    assert np.all(np.sum(centers * bz.normals, axis=1) > 0), "Normals point inwards."
+
+
+def test_downsample_bands():
+    from aimstools.bandstructures.utilities import downsample_bands
+
+    nk = 4000
+    x = np.concatenate([np.linspace(0, 1, nk), np.linspace(1, 2, nk)])
+    y = np.stack([np.cos(5 * x * (i + 1)) + 3 * i for i in range(10)], axis=1)
+    w = np.abs(np.sin(x))[:, None] * np.ones(10)
+    nx, ny, nw = downsample_bands(x, y, w, npoints=400, window=(-1, 10))
+    assert len(nx) < 600, "Bands were not downsampled."
+    assert np.sum(np.diff(nx) <= 0) == 1, "Segment boundaries were lost."
+    assert np.allclose(ny.max(axis=0), y.max(axis=0)), "Maxima were lost."
+    assert np.allclose(ny.min(axis=0), y.min(axis=0)), "Minima were lost."
+    index = np.searchsorted(x[:nk], nx[nx < 1])
+    assert np.allclose(nw[nx < 1], w[index]), "Contributions do not match."
+
+
+def test_soc_comparison():
+    from collections import namedtuple
+    from aimstools.bandstructures import BandStructure
+    from aimstools.bandstructures.soc_comparison import (
+        compare_spectra,
+        pair_states_by_assignment,
+    )
+    from scipy.optimize import linear_sum_assignment
+
+    # Rashba-split band on a path from Gamma to X of a cubic cell
+    s = namedtuple("spectrum", ["kpoints", "kpoint_axis", "eigenvalues", "occupations"])
+    cell = np.eye(3) * 5.0
+    k = np.linspace(0, np.pi / 5.0, 51)
+    kpoints = np.stack([k, np.zeros_like(k), np.zeros_like(k)], axis=1)
+    zora = 2 * k ** 2 + 1
+    soc = np.stack([zora - 0.3 * k, zora + 0.3 * k], axis=1)
+    zs = s(kpoints, k, zora[:, None, None], np.zeros((51, 1, 1)))
+    ss = s(kpoints, k, soc[:, None, :], np.zeros((51, 1, 2)))
+    for pairing in ["order", "energy"]:
+        c = compare_spectra(zs, ss, pairing=pairing, cell=cell)
+        assert np.allclose(c.splitting[:, 0], 0.6 * k), "Wrong splitting."
+        assert np.allclose(c.shift, 0), "Wrong shift."
+        assert np.isclose(c.rashba[0], 0.3), "Wrong Rashba coefficient."
+
+    # random states, where many k-points have conflicting best matches
+    rng = np.random.default_rng(0)
+    ze, se = rng.random((50, 6)), rng.random((50, 12))
+    zc, sc = rng.random((50, 6, 3)), rng.random((50, 12, 3))
+    pairs = pair_states_by_assignment(ze, se, zc, sc, chunksize=7)
+    for k in range(50):
+        scores = np.dot(zc[k], sc[k].T) - np.abs(ze[k, :, None] - se[k, None, :])
+        rows, cols = linear_sum_assignment(np.repeat(scores, 2, axis=0), maximize=True)
+        best = np.sort(cols[np.argsort(rows)].reshape(6, 2), axis=1)
+        assert np.isclose(
+            np.take_along_axis(scores, pairs[k], axis=1).sum(),
+            np.take_along_axis(scores, best, axis=1).sum(),
+        ), "Pairing is not optimal."
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    c = BandStructure(cs).get_soc_comparison()
+    assert np.allclose(c.splitting, 0, atol=1e-3), "Silicon has Kramers doublets."
+    assert -0.05 < c.gap_change < 0, "Spin-orbit coupling should reduce the gap."
+
+
+def test_band_statistics():
+    from aimstools.bandstructures import RegularBandStructure
+    from aimstools.bandstructures.band_statistics import (
+        get_band_statistics,
+        get_band_statistics_table,
+    )
+
+    x = np.concatenate([np.linspace(0, 1, 21), np.linspace(1, 2, 21)])
+    flat = np.full_like(x, -0.5) + 0.01 * np.sin(x)
+    dispersive = 2 * x
+    evs = np.stack([flat, dispersive, dispersive + 1e-5], axis=1)[:, None, :]
+    table = get_band_statistics(x, evs, label_coords=[0, 1, 2], kpoint_labels="GXL")
+    assert list(table["flat"]) == [True, False, False], "Flat band not detected."
+    assert np.allclose(table["mean_velocity"][1:], 2.0), "Wrong velocities."
+    assert list(table["max_label"][1:]) == ["L", "L"], "Wrong location of maxima."
+    assert table["separation"][1] > 0.1, "Degenerate bands should be skipped."
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = RegularBandStructure(cs, soc=False)
+    table = get_band_statistics_table({"Si": bs}, window=3)
+    assert set(table["calculation"]) == {"Si"}, "Calculations are not labeled."
+    assert np.all(table["max_energy"] >= -3), "Bands outside of the window were kept."
+
+
+def test_projected_dos():
+    import matplotlib.pyplot as plt
+    from aimstools.density_of_states.utilities import DOSPlot
+
+    bs = MullikenBandStructure(Path().cwd().joinpath("tests/closed_shell"), soc=True)
+    spectrum = bs.get_mlk_spectrum()
+    window = (-5, 5)
+    pdos = spectrum.get_projected_dos(
+        by="atoms", window=window, broadening=0, spins=[0]
+    )
+    energies = pdos.energies[:, 0]
+    de = energies[1] - energies[0]
+    evs = np.asarray(spectrum.eigenvalues)[:, :1]
+    inside = (evs >= window[0] + de) & (evs <= window[1] - de)
+    weights = np.asarray(spectrum.contributions[:, :, :1, :, 0]).sum(axis=0)
+    expected = np.sum(weights * inside) / evs.shape[0]
+    total = sum([c.values[:, 0, 0] for c in pdos.contributions]).sum() * de
+    assert np.isclose(total, expected, rtol=1e-2), "States are not conserved."
+
+    species = bs.get_projected_dos(window=window, broadening=0.1)
+    assert species.type == "species", "Wrong spectrum type."
+    assert species.contributions[0].values.shape == (2001, 1, 7), "Wrong shape."
+    plt.figure()
+    DOSPlot(
+        x=species.energies,
+        con=species.get_species_contribution("Si"),
+        spin=0,
+        ref="fermi level",
+        shift=0,
+        window=3,
+        vbm=0,
+        cbm=0,
+        fermi_level=0,
+        show_total=species.get_total_dos(),
+    ).draw()
+    plt.close()
+
+
+def test_fermi_surface():
+    from aimstools.bandstructures import BandStructure
+    from aimstools.bandstructures.fermi_surface import get_fermi_surface
+
+    x = np.concatenate([np.linspace(0, 1, 11), np.linspace(1, 2, 11)])
+    kpoints = np.stack([x, np.zeros_like(x), np.zeros_like(x)], axis=1)
+    evs = np.stack([2 * x - 1, 0.1 * x - 0.05, np.full_like(x, 1.0)], axis=1)
+    fs = get_fermi_surface(kpoints, x, evs[:, None, :], pocket_depth=0.3)
+    assert fs.kind == "metal", "Metal not detected."
+    assert np.allclose(fs.crossings.axis_coord, 0.5), "Wrong crossing points."
+    assert np.allclose(fs.crossings.slope, [2.0, 0.1]), "Wrong slopes."
+    assert get_fermi_surface(kpoints, x, evs[:, None, 1:]).kind == "semimetal"
+    assert get_fermi_surface(kpoints, x, evs[:, None, 2:]).kind == "insulator"
+
+    bs = BandStructure(Path().cwd().joinpath("tests/no_soc_open_shell"))
+    bs.get_properties()
+    fs = bs.bandstructure_zora.get_fermi_surface()
+    assert fs.kind == "metal", "Iron should be a metal."
+    assert np.all(fs.crossings.velocity > 0), "Fermi velocities are missing."
+
+    from aimstools.bandstructures import RegularBandStructure
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    regular = RegularBandStructure(cs, soc=True)
+    mulliken = MullikenBandStructure(cs, soc=True)
+    assert mulliken.get_fermi_surface().kind == "insulator", "Silicon is an insulator."
+    # the valence band maximum lies 0.59 eV below the Fermi level with soc
+    bands = [
+        bs.get_band_statistics(window=(-0.3, 0.3)).query("spin == 0")["band"].tolist()
+        for bs in (regular, mulliken)
+    ]
+    assert bands[0] == bands[1], "Energy windows are not relative to the Fermi level."
+
+
+def test_lazy_segments():
+    from aimstools.bandstructures import RegularBandStructure
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    mbs = MullikenBandStructure(cs, soc=True)
+    rbs = RegularBandStructure(cs, soc=True)
+    for bs, get_spectrum in ((mbs, mbs.get_mlk_spectrum), (rbs, rbs.get_spectrum)):
+        assert not any(
+            bs.bands.is_constructed(k) for k in bs.bands.keys()
+        ), "Band files should not be read in eagerly."
+        spectrum = get_spectrum("XG")
+        constructed = [k for k in bs.bands.keys() if bs.bands.is_constructed(k)]
+        assert set(constructed) <= {("G", "X"), ("X", "G")}, "Too many files read in."
+        n = len(spectrum.kpoint_axis)
+        assert np.allclose(
+            spectrum.eigenvalues, bs.spectrum.eigenvalues[:n][::-1]
+        ), "Segments read in lazily differ from the full band path."
+
+
+def test_compact_contributions():
+    from aimstools.bandstructures.mulliken_storage import (
+        ContributionQuantizer,
+        QuantizedContributions,
+        quantize_contributions,
+    )
+
+    con = np.random.default_rng(0).random((3, 4, 1, 5, 7)).astype(np.float32)
+    con[..., 4:] = 0
+    q = quantize_contributions(con, np.uint8)
+    assert q.data.shape[-1] == 4, "Trailing zero channels were not trimmed."
+    assert q.shape == con.shape, "Shape should include trimmed channels."
+    assert np.allclose(np.asarray(q), con, atol=1 / 255), "Wrong dequantization."
+    assert np.allclose(q[[0, 2], :, :, :, 1], con[[0, 2], :, :, :, 1], atol=1 / 255)
+    assert np.all(q[..., 5] == 0), "Trimmed channels should be zero."
+    assert isinstance(q[:, ::-1], type(q)), "Slicing should not dequantize."
+    # quantizing one k-point block at a time, the last block exceeds the initial scale
+    con[:, -1, :, :, 1] *= 1.5
+    quantizer = ContributionQuantizer(con.shape, np.uint16)
+    for i in range(con.shape[1]):
+        quantizer[:, i] = con[:, i]
+    q = quantizer.quantized()
+    assert q.data.shape[-1] == 4, "Trailing zero channels were not trimmed."
+    assert np.allclose(
+        np.asarray(q), con, atol=2 * q.scale
+    ), "Wrong block quantization."
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = MullikenBandStructure(cs, soc=True)
+    bs_c = MullikenBandStructure(cs, soc=True, compact="uint16")
+    assert bs_c.spectrum.contributions.nbytes < bs.spectrum.contributions.nbytes / 2
+    assert all(
+        isinstance(b, QuantizedContributions)
+        for b in bs_c.spectrum.contributions.blocks
+    ), "Sections should be quantized while parsing."
+    assert np.allclose(
+        np.asarray(bs.spectrum.contributions),
+        np.asarray(bs_c.spectrum.contributions),
+        atol=1e-4,
+    ), "Compact contributions differ."
+    con = bs.spectrum.get_species_contribution("Si", l="p").contribution
+    con_c = bs_c.spectrum.get_species_contribution("Si", l="p").contribution
+    assert np.allclose(con, con_c, atol=1e-4), "Compact species contributions differ."
+
+
+def test_sparse_contributions():
+    from aimstools.bandstructures.mulliken_storage import (
+        ContributionBlocks,
+        sparsify_contributions,
+    )
+
+    rng = np.random.default_rng(0)
+    con = rng.random((6, 4, 1, 5, 7)).astype(np.float32)
+    con[rng.random((6, 4, 1, 5)) < 0.8] = 0
+    sparse = sparsify_contributions(con, tolerance=1e-6)
+    assert sparse.density < 0.5, "Zero contributions should not be stored."
+    assert np.allclose(np.asarray(sparse), con), "Wrong sparse contributions."
+    assert np.allclose(sparse[[4, 1], :, :, :, 2], con[[4, 1], :, :, :, 2])
+    assert np.allclose(np.asarray(sparse[:, ::-1]), con[:, ::-1]), "Wrong views."
+    groups = [[0, 2], [1, 3, 5], [4]]
+    dense = ContributionBlocks([con]).reduce_atoms(groups)
+    assert np.allclose(ContributionBlocks([sparse]).reduce_atoms(groups), dense)
+
+    cs = Path().cwd().joinpath("tests/multiple_species")
+    bs = MullikenBandStructure(cs, soc=True)
+    bs_s = MullikenBandStructure(cs, soc=True, sparse=1e-6)
+    assert np.array_equal(
+        bs.spectrum.get_majority_angular_momentum(),
+        bs_s.spectrum.get_majority_angular_momentum(),
+    ), "Majority classification differs on sparse contributions."
+
+
+def test_bandstructure_series():
+    from aimstools.bandstructures import BandStructureSeries, RegularBandStructure
+    from aimstools.bandstructures.series import interpolate_segment
+    from aimstools.bandstructures import series as series_module
+    from aimstools.bandstructures.effective_masses import get_path_segments
+
+    t = np.linspace(0, 1, 5)
+    values = np.stack([t, 2 * t], axis=1)
+    new = interpolate_segment(np.linspace(0, 1, 9), t, values)
+    assert np.allclose(new[:, 1], 2 * np.linspace(0, 1, 9)), "Wrong interpolation."
+    t = np.array([0, 0.5, 0.5, 1])
+    new = interpolate_segment(np.linspace(0, 1, 5), t, np.array([0, 1, 5, 2]))
+    assert np.allclose(new, [0, 0.5, 1, 1.5, 2]), "Repeated points are not skipped."
+    new = interpolate_segment(np.linspace(0, 1, 3), np.zeros(4), np.arange(4))
+    assert np.allclose(new, 0), "Segments of zero length are not handled."
+
+    cs = Path().cwd().joinpath("tests/closed_shell")
+    bs = RegularBandStructure(cs, soc=False)
+    bs_soc = RegularBandStructure(cs, soc=True)
+    series = BandStructureSeries(
+        {"zora": bs, "soc": bs_soc}, parameters=[0, 1], bandpath="GXW"
+    )
+    assert series.eigenvalues.shape[:3] == (2, 62, 1), "Wrong stacked shape."
+    edges = series.get_band_edges()
+    assert np.all(edges["gap"] > 0), "Silicon should have a band gap."
+    trends = series.get_trends()
+    slope = trends.loc[trends["quantity"] == "gap", "c1"].iloc[0]
+    assert np.isclose(slope, edges["gap"][1] - edges["gap"][0]), "Wrong trend."
+    masses = series.get_effective_masses()
+    assert set(masses["calculation"]) == {"zora", "soc"}, "Masses are missing."
+    cbm = masses[masses["kind"] == "CBM"].set_index("calculation")["mass"]
+    mass_trends = series.get_mass_trends()
+    slope = mass_trends.loc[mass_trends["kind"] == "CBM", "c1"].iloc[0]
+    assert np.isclose(slope, cbm["soc"] - cbm["zora"]), "Wrong mass trend."
+    pooled = BandStructureSeries(
+        {"a": cs, "b": cs}, soc=True, bandpath="GXW", max_workers=2
+    )
+    evs = bs_soc.get_spectrum("GXW").eigenvalues
+    assert np.allclose(
+        pooled.eigenvalues, evs[None, ..., pooled.state_offsets[0] :]
+    ), "Spectra read in worker processes differ."
+    assert np.allclose(
+        pooled.fermi_levels, bs_soc.fermi_level.soc
+    ), "Wrong Fermi level."
+    assert len(pooled.structures[1]) == len(bs_soc.structure), "Wrong structure."
+    # without workers, every output file is parsed once in the current process
+    parsed = []
+    reader = series_module.RegularBandStructure
+
+    def read(outputfile, **kwargs):
+        parsed.append(outputfile)
+        return reader(outputfile, **kwargs)
+
+    series_module.RegularBandStructure = read
+    try:
+        serial = BandStructureSeries(
+            {"a": cs, "b": cs}, soc=True, bandpath="GXW", max_workers=1
+        )
+    finally:
+        series_module.RegularBandStructure = reader
+    assert parsed == [cs, cs], "Output files were parsed more than once."
+    assert np.allclose(serial.eigenvalues, pooled.eigenvalues), "Serial spectra differ."
+
+    # the second segment of the coarse calculation only has every other k-point
+    full = bs_soc.get_spectrum("GXW")
+    first, second = get_path_segments(full.kpoint_axis)
+    keep = np.concatenate([first, second[::2]])
+    coarse = full._replace(
+        kpoints=full.kpoints[keep],
+        kpoint_axis=full.kpoint_axis[keep],
+        eigenvalues=full.eigenvalues[keep],
+        occupations=full.occupations[keep],
+    )
+    bs_coarse = RegularBandStructure(cs, soc=True)
+    bs_coarse.get_spectrum = lambda bandpath=None: coarse
+    series = BandStructureSeries({"full": bs_soc, "coarse": bs_coarse}, bandpath="GXW")
+    assert series.eigenvalues.shape[1] == len(full.kpoint_axis), "Wrong k-point axis."
+    evs = series.eigenvalues[:, :, 0]
+    assert np.allclose(evs[1, keep], evs[0, keep]), "Calculated k-points changed."
+    middle = second[1::2]
+    assert np.allclose(
+        evs[1, middle], (evs[0, middle - 1] + evs[0, middle + 1]) / 2
+    ), "Wrong interpolation between k-points."
+    edges = series.get_band_edges()
+    for column in ["vbm", "cbm", "gap"]:
+        assert np.isclose(edges[column][0], edges[column][1]), "Band edges differ."